@@ -0,0 +1,215 @@
+"""
+Analysis Context Loading
+Everything a prompt needs about a study, prior study and prior analysis, in a fixed number of queries
+"""
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.models import AnalysisStatus, MedGemmaAnalysis, Modality, Series, Study
+from app.config.settings import get_settings
+from app.medgemma import PromptBuilder
+
+
+class StudySummary(NamedTuple):
+    """Study columns used in prompts, with its series reduced to a count and a body part"""
+    id: str
+    patient_id: str
+    modality: Modality
+    study_date: datetime
+    study_description: Optional[str]
+    series_count: int
+    body_part: Optional[str]  # of the lowest-numbered series
+
+
+# Analyses usable as prior context; a radiologist-reviewed one is the most trustworthy
+PRIOR_CONTEXT_STATUSES = (AnalysisStatus.COMPLETED, AnalysisStatus.REVIEWED)
+
+
+class PriorAnalysis(NamedTuple):
+    """Latest completed or reviewed analysis of a prior study, summarised for comparison prompts"""
+    id: str
+    study_id: str
+    completed_at: Optional[datetime]
+    summary: str
+
+
+class AnalysisContext(NamedTuple):
+    """Inputs to one analysis prompt"""
+    study: Optional[StudySummary]
+    prior_study: Optional[StudySummary]
+    prior_analysis: Optional[PriorAnalysis]
+
+
+class PriorContextCache:
+    """
+    Summarised prior findings per prior study, in LRU order
+
+    An entry is only valid for the analysis version it was built from (id
+    and status): once a newer analysis of the prior study completes, or the
+    analysis is reviewed, the lookup misses and the entry is replaced.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        # prior study id -> (analysis version, summary)
+        self._entries: "OrderedDict[str, Tuple[Tuple, str]]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0}
+
+    def get(self, study_id: str, version: Tuple) -> Optional[str]:
+        entry = self._entries.get(study_id)
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+        if entry[0] != version:
+            self._stats["stale"] += 1
+            return None
+        self._entries.move_to_end(study_id)
+        self._stats["hits"] += 1
+        return entry[1]
+
+    def put(self, study_id: str, version: Tuple, summary: str):
+        self._entries[study_id] = (version, summary)
+        self._entries.move_to_end(study_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        return {**self._stats, "entries": len(self._entries), "max_entries": self.max_entries}
+
+
+_prior_context_cache: Optional[PriorContextCache] = None
+
+
+def get_prior_context_cache() -> PriorContextCache:
+    """Get or create the global prior context cache"""
+    global _prior_context_cache
+    if _prior_context_cache is None:
+        _prior_context_cache = PriorContextCache(get_settings().analysis_prior_context_cache_size)
+    return _prior_context_cache
+
+
+class AnalysisContextLoader:
+    """
+    Loads analysis context with column projections instead of ORM objects
+
+    Nothing is lazy-loaded afterwards, so there are no hidden queries (or
+    MissingGreenlet errors) under AsyncSession. However many studies are
+    requested:
+    - one query returns the studies and prior studies with their series summary
+    - one indexed query finds the latest completed or reviewed analysis of each prior study
+    - only for prior analyses not in the PriorContextCache, one more query
+      reads their structured findings to summarise
+    """
+
+    @staticmethod
+    async def load(db: AsyncSession, study_id: str, prior_study_id: Optional[str] = None) -> AnalysisContext:
+        """Context of a single analysis (one query, two with a prior study)"""
+        contexts = await AnalysisContextLoader.load_many(db, [(study_id, prior_study_id)])
+        return contexts[0]
+
+    @staticmethod
+    async def load_many(db: AsyncSession, pairs: Iterable[tuple]) -> List[AnalysisContext]:
+        """Context per (study_id, prior_study_id) pair, in order"""
+        pairs = list(pairs)
+        prior_ids = {prior_id for _, prior_id in pairs if prior_id}
+        summaries = await AnalysisContextLoader.study_summaries(
+            db, {study_id for study_id, _ in pairs} | prior_ids
+        )
+        prior_analyses = await AnalysisContextLoader.latest_analyses(db, prior_ids)
+
+        return [
+            AnalysisContext(
+                study=summaries.get(study_id),
+                prior_study=summaries.get(prior_id) if prior_id else None,
+                prior_analysis=prior_analyses.get(prior_id) if prior_id else None,
+            )
+            for study_id, prior_id in pairs
+        ]
+
+    @staticmethod
+    async def study_summaries(db: AsyncSession, study_ids: Iterable[str]) -> Dict[str, StudySummary]:
+        """StudySummary per found study id, in one query"""
+        study_ids = set(study_ids)
+        if not study_ids:
+            return {}
+
+        series_count = (
+            select(func.count(Series.id))
+            .where(Series.study_id == Study.id)
+            .correlate(Study)
+            .scalar_subquery()
+        )
+        body_part = (
+            select(Series.body_part_examined)
+            .where(Series.study_id == Study.id)
+            .order_by(Series.series_number, Series.created_at)
+            .limit(1)
+            .correlate(Study)
+            .scalar_subquery()
+        )
+        result = await db.execute(
+            select(
+                Study.id,
+                Study.patient_id,
+                Study.modality,
+                Study.study_date,
+                Study.study_description,
+                series_count,
+                body_part,
+            ).where(Study.id.in_(study_ids))
+        )
+        return {row[0]: StudySummary(*row) for row in result.all()}
+
+    @staticmethod
+    async def latest_analyses(db: AsyncSession, study_ids: Iterable[str]) -> Dict[str, PriorAnalysis]:
+        """Latest completed or reviewed analysis per study id, with its summarised findings"""
+        study_ids = set(study_ids)
+        if not study_ids:
+            return {}
+
+        # Served by ix_medgemma_analyses_study_status_completed; no JSON is read here
+        ranked = (
+            select(
+                MedGemmaAnalysis.id,
+                MedGemmaAnalysis.study_id,
+                MedGemmaAnalysis.completed_at,
+                MedGemmaAnalysis.status,
+                func.row_number().over(
+                    partition_by=MedGemmaAnalysis.study_id,
+                    order_by=MedGemmaAnalysis.completed_at.desc(),
+                ).label("rank"),
+            )
+            .where(
+                MedGemmaAnalysis.study_id.in_(study_ids),
+                MedGemmaAnalysis.status.in_(PRIOR_CONTEXT_STATUSES),
+            )
+            .subquery()
+        )
+        result = await db.execute(
+            select(ranked.c.id, ranked.c.study_id, ranked.c.completed_at, ranked.c.status)
+            .where(ranked.c.rank == 1)
+        )
+        latest = result.all()
+
+        cache = get_prior_context_cache()
+        summaries = {row.id: cache.get(row.study_id, (row.id, row.status)) for row in latest}
+        missing = [analysis_id for analysis_id, summary in summaries.items() if summary is None]
+        if missing:
+            result = await db.execute(
+                select(MedGemmaAnalysis.id, MedGemmaAnalysis.structured_findings)
+                .where(MedGemmaAnalysis.id.in_(missing))
+            )
+            for analysis_id, structured_findings in result.all():
+                summaries[analysis_id] = PromptBuilder.summarize_prior_findings(structured_findings)
+
+        analyses = {}
+        for row in latest:
+            summary = summaries[row.id]
+            if row.id in missing:
+                cache.put(row.study_id, (row.id, row.status), summary)
+            analyses[row.study_id] = PriorAnalysis(row.id, row.study_id, row.completed_at, summary)
+        return analyses
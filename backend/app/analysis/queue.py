@@ -0,0 +1,397 @@
+"""
+Analysis Job Queue
+Durable, database-backed queue that runs MedGemma analyses on a pool of workers
+"""
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import structlog
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.database import AsyncSessionLocal
+from app.config.models import (
+    AnalysisJob,
+    AnalysisPriority,
+    AnalysisStatus,
+    JOB_PRIORITY_RANKS,
+    MedGemmaAnalysis,
+)
+from app.config.settings import get_settings
+from app.medgemma import get_medgemma_engine, PromptBuilder
+from .service import AnalysisService
+
+logger = structlog.get_logger()
+
+
+class AnalysisJobQueue:
+    """
+    Priority job queue stored in the analysis_jobs table
+
+    - Jobs are claimed in (priority, available_at) order, so STAT studies
+      jump ahead of routine ones
+    - A claimed job holds a lease of visibility_timeout seconds, renewed
+      while inference runs; a job whose lease lapses (worker crashed or the
+      process died) becomes claimable again
+    - Failed attempts are retried with exponential backoff up to max_attempts
+    - Claims are conditional UPDATEs, so several processes can share a database
+    - A worker claims up to claim_batch_size jobs at once and runs them
+      concurrently, so the engine's dynamic batching can combine them
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        visibility_timeout: int = 120,
+        max_attempts: int = 3,
+        retry_backoff: int = 30,
+        poll_interval: float = 2.0,
+        claim_batch_size: int = 1,
+    ):
+        self.workers = workers
+        self.claim_batch_size = max(claim_batch_size, 1)
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+
+        self._instance = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def enqueue(
+        self,
+        db: AsyncSession,
+        analysis: MedGemmaAnalysis,
+        priority: AnalysisPriority = AnalysisPriority.ROUTINE,
+        payload: Optional[Dict] = None,
+    ) -> AnalysisJob:
+        """
+        Add a job for a QUEUED analysis
+
+        The job becomes visible to workers when the caller commits; call
+        notify() afterwards to wake an idle worker immediately.
+        """
+        jobs = await self.enqueue_many(db, [analysis], priority, payload)
+        return jobs[0]
+
+    async def enqueue_many(
+        self,
+        db: AsyncSession,
+        analyses: List[MedGemmaAnalysis],
+        priority: AnalysisPriority = AnalysisPriority.ROUTINE,
+        payload: Optional[Dict] = None,
+    ) -> List[AnalysisJob]:
+        """Add jobs for several QUEUED analyses with a single flush (see enqueue)"""
+        jobs = []
+        for analysis in analyses:
+            analysis.status = AnalysisStatus.QUEUED
+            job = AnalysisJob(
+                analysis_id=analysis.id,
+                priority=JOB_PRIORITY_RANKS[priority],
+                payload=payload or {},
+                max_attempts=self.max_attempts,
+            )
+            db.add(job)
+            jobs.append(job)
+        await db.flush()
+        return jobs
+
+    def notify(self):
+        """Wake idle workers to look for new jobs"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        """Recover jobs orphaned by a previous run and start the workers"""
+        if self._tasks:
+            return
+
+        recovered = await self.recover()
+        if recovered:
+            logger.info("analysis_jobs_recovered", count=recovered)
+
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(f"{self._instance}-{index}"))
+            for index in range(self.workers)
+        ]
+        logger.info("analysis_workers_started", workers=self.workers)
+
+    async def stop(self):
+        """Stop the workers; in-flight jobs are released back to the queue"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def recover(self) -> int:
+        """
+        Release jobs whose lease expired while marked running
+
+        Jobs that already used all their attempts are failed instead, so a
+        request that crashes the server can't loop forever.
+        """
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(AnalysisJob).where(
+                    AnalysisJob.status == "running",
+                    AnalysisJob.lease_expires_at < now,
+                )
+            )
+            jobs = result.scalars().all()
+
+            for job in jobs:
+                analysis = await db.get(MedGemmaAnalysis, job.analysis_id)
+                if job.attempts >= job.max_attempts:
+                    job.status = "failed"
+                    job.finished_at = now
+                    job.error_message = "Worker lost during final attempt"
+                    if analysis:
+                        analysis.status = AnalysisStatus.FAILED
+                        analysis.error_message = job.error_message
+                else:
+                    job.status = "pending"
+                    job.available_at = now
+                    if analysis:
+                        analysis.status = AnalysisStatus.QUEUED
+
+            await db.commit()
+            return len(jobs)
+
+    def _claimable(self, now: datetime):
+        """Pending jobs past their backoff, or running jobs whose lease lapsed"""
+        return or_(
+            and_(AnalysisJob.status == "pending", AnalysisJob.available_at <= now),
+            and_(AnalysisJob.status == "running", AnalysisJob.lease_expires_at < now),
+        )
+
+    async def _claim(self, worker_id: str, limit: int = 1) -> List[AnalysisJob]:
+        """Lease up to limit of the highest-priority available jobs"""
+        now = datetime.utcnow()
+        claimable = self._claimable(now)
+        jobs = []
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(AnalysisJob.id)
+                .where(claimable)
+                .order_by(AnalysisJob.priority, AnalysisJob.available_at)
+                .limit(self.workers * limit + 1)
+            )
+
+            for job_id in result.scalars().all():
+                if len(jobs) >= limit:
+                    break
+                # Conditional update - loses cleanly if another worker got there first
+                claimed = await db.execute(
+                    update(AnalysisJob)
+                    .where(AnalysisJob.id == job_id, claimable)
+                    .values(
+                        status="running",
+                        worker_id=worker_id,
+                        attempts=AnalysisJob.attempts + 1,
+                        lease_expires_at=now + timedelta(seconds=self.visibility_timeout),
+                        started_at=now,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                if claimed.rowcount != 1:
+                    continue
+
+                job = await db.get(AnalysisJob, job_id)
+                await db.execute(
+                    update(MedGemmaAnalysis)
+                    .where(MedGemmaAnalysis.id == job.analysis_id)
+                    .values(status=AnalysisStatus.PROCESSING)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+                jobs.append(job)
+
+        return jobs
+
+    async def _worker(self, worker_id: str):
+        """Claim and run jobs until cancelled"""
+        engine = get_medgemma_engine()
+        while True:
+            # Leave jobs queued until the model has loaded
+            try:
+                await engine.wait_until_ready()
+            except RuntimeError:
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            try:
+                jobs = await self._claim(worker_id, self.claim_batch_size)
+            except Exception as e:
+                logger.error("analysis_job_claim_failed", worker=worker_id, error=str(e))
+                jobs = []
+
+            if not jobs:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            # Run the claimed jobs together so their prompts can share a model batch
+            results = await asyncio.gather(
+                *(self._process(job, worker_id) for job in jobs),
+                return_exceptions=True,
+            )
+            for job, result in zip(jobs, results):
+                if isinstance(result, asyncio.CancelledError):
+                    raise result
+                if isinstance(result, Exception):
+                    # The lease will lapse and the job is retried
+                    logger.error("analysis_job_failed", job_id=job.id, worker=worker_id, error=str(result))
+
+    async def _heartbeat(self, job_id: str, worker_id: str):
+        """Extend the lease while inference is running"""
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(AnalysisJob)
+                    .where(AnalysisJob.id == job_id, AnalysisJob.worker_id == worker_id)
+                    .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=self.visibility_timeout))
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+
+    async def _process(self, job: AnalysisJob, worker_id: str):
+        """Run inference for a claimed job and record the outcome"""
+        if job.attempts > job.max_attempts:
+            await self._finish(job.id, worker_id, {"status": "error", "error": "Maximum attempts exceeded"})
+            return
+
+        async with AsyncSessionLocal() as db:
+            analysis = await db.get(MedGemmaAnalysis, job.analysis_id)
+        if analysis is None:
+            await self._finish(job.id, worker_id, {"status": "error", "error": "Analysis not found"})
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(job.id, worker_id))
+        try:
+            engine = get_medgemma_engine()
+            profile = PromptBuilder.generation_profile(analysis.analysis_type)
+            result = await engine.analyze(
+                analysis.prompt,
+                profile.max_tokens,
+                use_cache=(job.payload or {}).get("use_cache", True),
+                stop=profile.stop,
+            )
+        except asyncio.CancelledError:
+            await asyncio.shield(self._release(job.id, worker_id))
+            raise
+        except Exception as e:
+            result = {"status": "error", "error": str(e)}
+        finally:
+            heartbeat.cancel()
+
+        await self._finish(job.id, worker_id, result)
+
+    async def _finish(self, job_id: str, worker_id: str, result: Dict):
+        """Store a result, schedule a retry, or fail the job for good"""
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            job = await db.get(AnalysisJob, job_id)
+            if job is None or job.status != "running" or job.worker_id != worker_id:
+                # Lease lapsed and another worker took the job over
+                logger.warning("analysis_job_lease_lost", job_id=job_id, worker=worker_id)
+                return
+
+            analysis = await db.get(MedGemmaAnalysis, job.analysis_id)
+
+            if result["status"] == "success" and analysis is not None:
+                AnalysisService.store_results(db, analysis, result)
+                job.status = "completed"
+                job.finished_at = now
+                job.error_message = None
+            elif analysis is not None and job.attempts < job.max_attempts:
+                job.status = "pending"
+                job.available_at = now + timedelta(seconds=self.retry_backoff * 2 ** (job.attempts - 1))
+                job.error_message = result.get("error", "Unknown error")
+                analysis.status = AnalysisStatus.QUEUED
+            else:
+                job.status = "failed"
+                job.finished_at = now
+                job.error_message = result.get("error", "Unknown error")
+                if analysis is not None:
+                    analysis.status = AnalysisStatus.FAILED
+                    analysis.error_message = job.error_message
+
+            job.lease_expires_at = None
+            await db.commit()
+
+        logger.info("analysis_job_finished", job_id=job_id, status=job.status, attempts=job.attempts)
+
+    async def _release(self, job_id: str, worker_id: str):
+        """Hand an interrupted job back without charging it an attempt"""
+        async with AsyncSessionLocal() as db:
+            job = await db.get(AnalysisJob, job_id)
+            if job is None or job.status != "running" or job.worker_id != worker_id:
+                return
+            job.status = "pending"
+            job.attempts = max(job.attempts - 1, 0)
+            job.available_at = datetime.utcnow()
+            job.lease_expires_at = None
+
+            analysis = await db.get(MedGemmaAnalysis, job.analysis_id)
+            if analysis is not None:
+                analysis.status = AnalysisStatus.QUEUED
+            await db.commit()
+
+    async def get_position(self, db: AsyncSession, job: AnalysisJob) -> Optional[int]:
+        """Number of pending jobs that will be claimed before this one"""
+        if job.status != "pending":
+            return None
+        result = await db.execute(
+            select(func.count())
+            .select_from(AnalysisJob)
+            .where(
+                AnalysisJob.status == "pending",
+                or_(
+                    AnalysisJob.priority < job.priority,
+                    and_(
+                        AnalysisJob.priority == job.priority,
+                        AnalysisJob.available_at < job.available_at,
+                    ),
+                ),
+            )
+        )
+        return result.scalar()
+
+    async def get_stats(self) -> Dict:
+        """Job counts by status plus worker configuration"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(AnalysisJob.status, func.count()).group_by(AnalysisJob.status)
+            )
+            counts = dict(result.all())
+
+        return {
+            "workers": self.workers,
+            "claim_batch_size": self.claim_batch_size,
+            "running_workers": sum(1 for task in self._tasks if not task.done()),
+            "jobs": counts,
+        }
+
+
+# Global queue instance
+_queue: Optional[AnalysisJobQueue] = None
+
+
+def get_analysis_queue() -> AnalysisJobQueue:
+    """Get or create global analysis job queue"""
+    global _queue
+    if _queue is None:
+        settings = get_settings()
+        _queue = AnalysisJobQueue(**settings.analysis_queue_config)
+    return _queue
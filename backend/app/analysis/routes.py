@@ -1,26 +1,51 @@
 """
 AI Analysis API - MedGemma Integration
 """
+import asyncio
 import json
-from datetime import datetime
-from typing import Optional
+from contextlib import AsyncExitStack
+from typing import Dict, List, Optional
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.config.database import get_db
-from app.config.models import Study, MedGemmaAnalysis, Finding, Measurement, AnalysisStatus
+from app.config.database import AsyncSessionLocal, get_db
+from app.config.models import (
+    MedGemmaAnalysis,
+    Study,
+    AnalysisBatch,
+    AnalysisJob,
+    AnalysisPriority,
+    AnalysisStatus,
+    JOB_PRIORITY_RANKS,
+    generate_uuid,
+)
+from app.config.settings import get_settings
 from app.medgemma import get_medgemma_engine, PromptBuilder
+from .context import AnalysisContext, AnalysisContextLoader, PriorAnalysis, get_prior_context_cache
+from .queue import get_analysis_queue
+from .service import AnalysisService
+from .singleflight import SingleFlight
 
 router = APIRouter(prefix="/api/analysis", tags=["analysis"])
 
+# Identical analysis requests in flight in this process share one inference
+_in_flight = SingleFlight()
+
+# Streamed analyses keep running after their client disconnects
+_detached = set()
+
 
 class AnalysisRequest(BaseModel):
     """Request to analyze a study"""
     study_id: str
     clinical_indication: str
     analysis_type: str = "primary"  # primary, comparison, focused
-    prior_study_id: Optional[str] = None
+    prior_study_id: Optional[str] = None  # defaults to the study's prior for comparisons
+    use_cache: bool = True  # False forces a fresh inference
+    priority: AnalysisPriority = AnalysisPriority.ROUTINE  # queue order for /jobs
 
 
 class AnalysisResponse(BaseModel):
@@ -31,18 +56,590 @@ class AnalysisResponse(BaseModel):
     measurements_count: int
     confidence_score: Optional[float]
     processing_time: float
+    deduplicated: bool = False  # joined an identical analysis that was already running
+
+
+class AnalysisJobResponse(BaseModel):
+    """Queued analysis"""
+    analysis_id: str
+    job_id: Optional[str]  # None when joined to an analysis running outside the queue
+    status: str
+    priority: str
+    deduplicated: bool = False
+
+
+class BatchAnalysisItem(BaseModel):
+    """One study in a batch analysis request"""
+    study_id: str
+    clinical_indication: str
+    analysis_type: str = "primary"
+    prior_study_id: Optional[str] = None
+
+
+class BatchAnalysisRequest(BaseModel):
+    """Worklist of studies to analyze with one priority"""
+    items: List[BatchAnalysisItem]
+    priority: AnalysisPriority = AnalysisPriority.ROUTINE
+    use_cache: bool = True
 
 
-@router.post("", response_model=AnalysisResponse)
-async def create_analysis(
+class BatchItemResponse(BaseModel):
+    """Outcome of queueing one batch item"""
+    index: int
+    study_id: str
+    analysis_id: Optional[str]  # None when the item was rejected
+    status: str
+    deduplicated: bool = False
+    error: Optional[str] = None
+
+
+class BatchAnalysisResponse(BaseModel):
+    """Queued batch"""
+    batch_id: str
+    priority: str
+    total_items: int
+    queued: int
+    deduplicated: int
+    rejected: int
+    items: List[BatchItemResponse]
+
+
+def require_engine_ready():
+    """Reject synchronous analysis with 503 until the model has loaded"""
+    engine = get_medgemma_engine()
+    if engine.is_ready:
+        return
+
+    status = engine.get_status()
+    if status["state"] == "failed":
+        raise HTTPException(status_code=503, detail=f"MedGemma unavailable: {status['error']}")
+    raise HTTPException(
+        status_code=503,
+        detail=f"MedGemma is {status['state']}, retry shortly or use POST /api/analysis/jobs",
+        headers={"Retry-After": str(get_settings().medgemma_retry_after)}
+    )
+
+
+@router.post("", response_model=AnalysisResponse, dependencies=[Depends(require_engine_ready)])
+async def create_analysis(request: AnalysisRequest):
+    """
+    Trigger AI analysis on a study using MedGemma
+
+    Identical requests (same study, analysis type, indication and prior
+    study) that arrive while one is running share its inference and get the
+    same analysis back, marked deduplicated.
+    """
+    async with AsyncSessionLocal() as db:
+        await _resolve_prior_studies(db, [request])
+    request_key = _request_key(request)
+    response, shared = await _in_flight.run(request_key, lambda: _run_analysis(request, request_key))
+    if shared:
+        response = response.model_copy(update={"deduplicated": True})
+    return response
+
+
+async def _resolve_prior_studies(db: AsyncSession, requests) -> None:
+    """
+    Default prior_study_id of comparison requests to Study.prior_study_id
+
+    The prior is chosen when the study is ingested, so clients can request
+    a comparison without looking it up. One query for any number of requests.
+    """
+    unresolved = [r for r in requests if r.analysis_type == "comparison" and not r.prior_study_id]
+    if not unresolved:
+        return
+
+    result = await db.execute(
+        select(Study.id, Study.prior_study_id)
+        .where(Study.id.in_({r.study_id for r in unresolved}))
+    )
+    prior_study_ids = dict(result.all())
+    for request in unresolved:
+        request.prior_study_id = prior_study_ids.get(request.study_id)
+
+
+def _request_key(request) -> str:
+    """De-duplication key of an AnalysisRequest or BatchAnalysisItem"""
+    return AnalysisService.request_key(
+        request.study_id,
+        request.analysis_type,
+        request.clinical_indication,
+        request.prior_study_id
+    )
+
+
+async def _run_analysis(request: AnalysisRequest, request_key: str) -> AnalysisResponse:
+    """
+    Run one synchronous analysis (shared by coalesced callers)
+
+    Uses its own sessions: the work must outlive the request that started
+    it. None is open while waiting for an identical analysis or running
+    inference, so neither holds a pooled connection.
+    """
+    window = get_settings().analysis_dedup_window
+
+    async with AsyncSessionLocal() as db:
+        async with _in_flight.lock(request_key):
+            existing = await AnalysisService.find_in_flight(db, request_key, window)
+            if existing is None:
+                prompt = await _build_prompt(request, db)
+
+                # Create analysis record - committed so identical requests elsewhere can find it
+                analysis = MedGemmaAnalysis(
+                    study_id=request.study_id,
+                    analysis_type=request.analysis_type,
+                    request_key=request_key,
+                    prompt=prompt,
+                    raw_response="",
+                    status=AnalysisStatus.PROCESSING
+                )
+                db.add(analysis)
+                await db.commit()
+
+    if existing is not None:
+        # Already queued or streaming - wait for that analysis instead
+        return await _await_analysis(existing.id, window)
+
+    async with AsyncSessionLocal() as db:
+        db.add(analysis)
+        try:
+            # Run MedGemma inference
+            engine = get_medgemma_engine()
+            profile = PromptBuilder.generation_profile(request.analysis_type)
+            result = await engine.analyze(prompt, profile.max_tokens, use_cache=request.use_cache, stop=profile.stop)
+
+            if result["status"] == "error":
+                analysis.status = AnalysisStatus.FAILED
+                analysis.error_message = result.get("error", "Unknown error")
+                await db.commit()
+                raise HTTPException(status_code=500, detail="Analysis failed")
+
+            findings_count, measurements_count = AnalysisService.store_results(db, analysis, result)
+            await db.commit()
+
+            return AnalysisResponse(
+                analysis_id=analysis.id,
+                status=analysis.status.value,
+                findings_count=findings_count,
+                measurements_count=measurements_count,
+                confidence_score=analysis.confidence_score,
+                processing_time=analysis.processing_time_seconds
+            )
+
+        except Exception as e:
+            analysis.status = AnalysisStatus.FAILED
+            analysis.error_message = str(e)
+            await db.commit()
+            raise HTTPException(status_code=500, detail=f"Analysis error: {str(e)}")
+
+
+async def _await_analysis(analysis_id: str, timeout: float) -> AnalysisResponse:
+    """Wait for an in-flight analysis started by another request and return its result"""
+    analysis = await AnalysisService.wait_for_analysis(analysis_id, timeout)
+    if analysis is None:
+        raise HTTPException(status_code=504, detail=f"Timed out waiting for identical analysis {analysis_id}")
+    if analysis.status == AnalysisStatus.FAILED:
+        raise HTTPException(status_code=500, detail=f"Analysis error: {analysis.error_message}")
+
+    async with AsyncSessionLocal() as db:
+        findings_count, measurements_count = await AnalysisService.count_results(db, analysis_id)
+    return AnalysisResponse(
+        analysis_id=analysis.id,
+        status=analysis.status.value,
+        findings_count=findings_count,
+        measurements_count=measurements_count,
+        confidence_score=analysis.confidence_score,
+        processing_time=analysis.processing_time_seconds or 0.0,
+        deduplicated=True
+    )
+
+
+@router.post("/jobs", response_model=AnalysisJobResponse, status_code=202)
+async def enqueue_analysis(
     request: AnalysisRequest,
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Trigger AI analysis on a study using MedGemma
+    Queue AI analysis on a study and return immediately
+
+    Poll GET /{analysis_id}/status or subscribe to GET /{analysis_id}/events
+    for progress. STAT jobs are run before urgent and routine ones. If an
+    identical analysis is already queued or running, it is returned instead.
+    """
+    await _resolve_prior_studies(db, [request])
+    request_key = _request_key(request)
+    window = get_settings().analysis_dedup_window
+
+    async with _in_flight.lock(request_key):
+        existing = await AnalysisService.find_in_flight(db, request_key, window)
+        if existing is not None:
+            result = await db.execute(select(AnalysisJob).where(AnalysisJob.analysis_id == existing.id))
+            job = result.scalar_one_or_none()
+            priorities = {rank: priority.value for priority, rank in JOB_PRIORITY_RANKS.items()}
+            return AnalysisJobResponse(
+                analysis_id=existing.id,
+                job_id=job.id if job else None,
+                status=existing.status.value,
+                priority=priorities.get(job.priority, request.priority.value) if job else request.priority.value,
+                deduplicated=True
+            )
+
+        prompt = await _build_prompt(request, db)
+
+        analysis = MedGemmaAnalysis(
+            study_id=request.study_id,
+            analysis_type=request.analysis_type,
+            request_key=request_key,
+            prompt=prompt,
+            raw_response="",
+            status=AnalysisStatus.QUEUED
+        )
+        db.add(analysis)
+        await db.flush()
+
+        queue = get_analysis_queue()
+        job = await queue.enqueue(db, analysis, request.priority, {"use_cache": request.use_cache})
+        await db.commit()
+    queue.notify()
+
+    return AnalysisJobResponse(
+        analysis_id=analysis.id,
+        job_id=job.id,
+        status=analysis.status.value,
+        priority=request.priority.value
+    )
+
+
+@router.post("/batch", response_model=BatchAnalysisResponse, status_code=202)
+async def enqueue_analysis_batch(
+    request: BatchAnalysisRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Queue AI analysis for a worklist of studies and return a batch id
+
+    All studies, prior studies and prior analyses are loaded in a fixed
+    number of queries whatever the batch size (see AnalysisContextLoader),
+    and the jobs are enqueued together so queue workers claim them together
+    and the engine can batch their inference. Items that
+    can't be analyzed (unknown study, invalid analysis type) are reported
+    per item without failing the batch; items identical to an analysis
+    already in flight, or to an earlier item, join it. Poll
+    GET /batch/{batch_id} for progress.
+    """
+    settings = get_settings()
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch has no items")
+    if len(request.items) > settings.analysis_batch_max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch has {len(request.items)} items, the limit is {settings.analysis_batch_max_items}"
+        )
+
+    await _resolve_prior_studies(db, request.items)
+    contexts = await AnalysisContextLoader.load_many(
+        db, [(item.study_id, _prior_study_id(item)) for item in request.items]
+    )
+    request_keys = [_request_key(item) for item in request.items]
+    items: List[BatchItemResponse] = []
+    new_analyses: List[MedGemmaAnalysis] = []
+    queue = get_analysis_queue()
+
+    async with AsyncExitStack() as stack:
+        # Sorted, so two overlapping batches can't deadlock on each other's keys
+        for key in sorted(set(request_keys)):
+            await stack.enter_async_context(_in_flight.lock(key))
+
+        in_flight = await AnalysisService.find_in_flight_many(db, request_keys, settings.analysis_dedup_window)
+        batch = AnalysisBatch(priority=request.priority.value, total_items=len(request.items), items=[])
+        db.add(batch)
+        await db.flush()
+
+        for index, (item, request_key, context) in enumerate(zip(request.items, request_keys, contexts)):
+            existing = in_flight.get(request_key)
+            if existing is not None:
+                items.append(BatchItemResponse(
+                    index=index,
+                    study_id=item.study_id,
+                    analysis_id=existing.id,
+                    status=existing.status.value,
+                    deduplicated=True
+                ))
+                continue
+
+            try:
+                prompt = _prompt_from_context(item, context)
+            except HTTPException as e:
+                items.append(BatchItemResponse(
+                    index=index, study_id=item.study_id, analysis_id=None, status="rejected", error=e.detail
+                ))
+                continue
+
+            analysis = MedGemmaAnalysis(
+                id=generate_uuid(),  # set now so later identical items can reference it before the flush
+                study_id=item.study_id,
+                analysis_type=item.analysis_type,
+                request_key=request_key,
+                batch_id=batch.id,
+                prompt=prompt,
+                raw_response="",
+                status=AnalysisStatus.QUEUED
+            )
+            db.add(analysis)
+            new_analyses.append(analysis)
+            # Later identical items in this batch join this analysis
+            in_flight[request_key] = analysis
+            items.append(BatchItemResponse(
+                index=index, study_id=item.study_id, analysis_id=analysis.id, status=AnalysisStatus.QUEUED.value
+            ))
+
+        await queue.enqueue_many(db, new_analyses, request.priority, {"use_cache": request.use_cache})
+        batch.items = [
+            {
+                "study_id": response.study_id,
+                "analysis_id": response.analysis_id,
+                "deduplicated": response.deduplicated,
+                "error": response.error
+            }
+            for response in items
+        ]
+        await db.commit()
+    queue.notify()
+
+    deduplicated = sum(1 for response in items if response.deduplicated)
+    rejected = sum(1 for response in items if response.error is not None)
+    return BatchAnalysisResponse(
+        batch_id=batch.id,
+        priority=request.priority.value,
+        total_items=len(items),
+        queued=len(items) - deduplicated - rejected,
+        deduplicated=deduplicated,
+        rejected=rejected,
+        items=items
+    )
+
+
+@router.get("/batch/{batch_id}")
+async def get_batch_status(batch_id: str, db: AsyncSession = Depends(get_db)):
+    """Progress of a batch: counts by status and the status of every item"""
+    batch = await db.get(AnalysisBatch, batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    analysis_ids = {item["analysis_id"] for item in batch.items if item["analysis_id"]}
+    analyses: Dict[str, MedGemmaAnalysis] = {}
+    if analysis_ids:
+        result = await db.execute(select(MedGemmaAnalysis).where(MedGemmaAnalysis.id.in_(analysis_ids)))
+        analyses = {analysis.id: analysis for analysis in result.scalars().all()}
+
+    counts = {status.value: 0 for status in AnalysisStatus}
+    counts["rejected"] = 0
+    items = []
+    for index, item in enumerate(batch.items):
+        analysis = analyses.get(item["analysis_id"])
+        if analysis is not None:
+            status = analysis.status.value
+        else:
+            status = "rejected" if item["error"] else "missing"
+        counts[status] = counts.get(status, 0) + 1
+        items.append({
+            "index": index,
+            "study_id": item["study_id"],
+            "analysis_id": item["analysis_id"],
+            "status": status,
+            "deduplicated": item["deduplicated"],
+            "confidence_score": analysis.confidence_score if analysis else None,
+            "error": item["error"] or (analysis.error_message if analysis else None)
+        })
+
+    final_states = {AnalysisStatus.COMPLETED.value, AnalysisStatus.FAILED.value, AnalysisStatus.REVIEWED.value}
+    pending = sum(1 for item in items if item["status"] not in final_states | {"rejected", "missing"})
+    return {
+        "batch_id": batch.id,
+        "priority": batch.priority,
+        "total_items": batch.total_items,
+        "counts": counts,
+        "done": pending == 0,
+        "progress": (batch.total_items - pending) / batch.total_items if batch.total_items else 1.0,
+        "created_at": batch.created_at,
+        "items": items
+    }
+
+
+@router.post("/stream", dependencies=[Depends(require_engine_ready)])
+async def create_analysis_stream(
+    request: AnalysisRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Trigger AI analysis and stream generated text as Server-Sent Events
+
+    Events:
+        token: {"text": "..."} for each generated chunk
+        done:  AnalysisResponse fields plus time_to_first_token, once stored
+        error: {"analysis_id": "...", "error": "..."}
+
+    If an identical analysis is already running, no tokens are sent: the
+    stream waits for it and sends its done (or error) event.
+    """
+    await _resolve_prior_studies(db, [request])
+    request_key = _request_key(request)
+    window = get_settings().analysis_dedup_window
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+    async with _in_flight.lock(request_key):
+        existing = await AnalysisService.find_in_flight(db, request_key, window)
+        if existing is None:
+            prompt = await _build_prompt(request, db)
+
+            analysis = MedGemmaAnalysis(
+                study_id=request.study_id,
+                analysis_type=request.analysis_type,
+                request_key=request_key,
+                prompt=prompt,
+                raw_response="",
+                status=AnalysisStatus.PROCESSING
+            )
+            db.add(analysis)
+            await db.commit()
+
+    # Don't hold a pooled connection while the stream waits or generates
+    await db.close()
+
+    if existing is not None:
+        return StreamingResponse(
+            _stream_joined_events(existing.id, window),
+            media_type="text/event-stream",
+            headers=headers
+        )
+
+    return StreamingResponse(
+        _stream_analysis_events(analysis.id, prompt, request.analysis_type, request.use_cache),
+        media_type="text/event-stream",
+        headers=headers
+    )
+
+
+async def _stream_joined_events(analysis_id: str, timeout: float):
+    """Wait for an identical in-flight analysis and send its outcome"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    analysis = None
+
+    while analysis is None:
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            yield _sse("error", {"analysis_id": analysis_id, "error": "Timed out waiting for identical analysis"})
+            return
+        analysis = await AnalysisService.wait_for_analysis(analysis_id, min(remaining, 15.0))
+        if analysis is None:
+            yield ": keep-alive\n\n"
+
+    if analysis.status == AnalysisStatus.FAILED:
+        yield _sse("error", {"analysis_id": analysis_id, "error": analysis.error_message})
+        return
+
+    async with AsyncSessionLocal() as db:
+        findings_count, measurements_count = await AnalysisService.count_results(db, analysis_id)
+
+    yield _sse("done", {
+        "analysis_id": analysis_id,
+        "status": analysis.status.value,
+        "findings_count": findings_count,
+        "measurements_count": measurements_count,
+        "confidence_score": analysis.confidence_score,
+        "processing_time": analysis.processing_time_seconds,
+        "time_to_first_token": None,
+        "deduplicated": True,
+    })
+
+
+async def _stream_analysis_events(analysis_id: str, prompt: str, analysis_type: str, use_cache: bool = True):
     """
-    # Get study
-    study = await db.get(Study, request.study_id)
+    Forward engine tokens as SSE and send the stored result
+
+    Generation and persistence run in a detached task that this generator
+    only reads from. A client disconnecting stops the reading, not the
+    analysis, so the row is still completed (or failed) rather than left
+    PROCESSING for identical requests to join.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    task = asyncio.create_task(_generate_analysis(analysis_id, prompt, analysis_type, use_cache, events))
+    _detached.add(task)
+    task.add_done_callback(_detached.discard)
+
+    while (event := await events.get()) is not None:
+        yield event
+
+
+async def _generate_analysis(
+    analysis_id: str,
+    prompt: str,
+    analysis_type: str,
+    use_cache: bool,
+    events: asyncio.Queue
+):
+    """Run a streamed analysis to completion, putting SSE strings on events (None when done)"""
+    engine = get_medgemma_engine()
+    profile = PromptBuilder.generation_profile(analysis_type)
+    result = None
+
+    try:
+        try:
+            async for event in engine.analyze_stream(prompt, profile.max_tokens, use_cache=use_cache, stop=profile.stop):
+                if event["type"] == "token":
+                    events.put_nowait(_sse("token", {"text": event["text"]}))
+                else:
+                    result = event
+        except Exception as e:
+            result = {"status": "error", "error": str(e)}
+
+        # The request-scoped session is gone once streaming starts; use a fresh one
+        async with AsyncSessionLocal() as db:
+            analysis = await db.get(MedGemmaAnalysis, analysis_id)
+
+            if result is None or result["status"] == "error":
+                error = result.get("error", "Unknown error") if result else "Stream ended unexpectedly"
+                analysis.status = AnalysisStatus.FAILED
+                analysis.error_message = error
+                await db.commit()
+                events.put_nowait(_sse("error", {"analysis_id": analysis_id, "error": error}))
+                return
+
+            findings_count, measurements_count = AnalysisService.store_results(db, analysis, result)
+            await db.commit()
+
+        events.put_nowait(_sse("done", {
+            "analysis_id": analysis_id,
+            "status": AnalysisStatus.COMPLETED.value,
+            "findings_count": findings_count,
+            "measurements_count": measurements_count,
+            "confidence_score": analysis.confidence_score,
+            "processing_time": analysis.processing_time_seconds,
+            "time_to_first_token": result.get("time_to_first_token"),
+        }))
+    finally:
+        events.put_nowait(None)
+
+
+def _sse(event: str, data: dict) -> str:
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _build_prompt(request: AnalysisRequest, db: AsyncSession) -> str:
+    """Load the analysis context and build the MedGemma prompt"""
+    context = await AnalysisContextLoader.load(db, request.study_id, _prior_study_id(request))
+    return _prompt_from_context(request, context)
+
+
+def _prior_study_id(request) -> Optional[str]:
+    """Prior study an AnalysisRequest or BatchAnalysisItem needs loaded, if any"""
+    return request.prior_study_id if request.analysis_type == "comparison" else None
+
+
+def _prompt_from_context(request, context: AnalysisContext) -> str:
+    """Build the MedGemma prompt for an AnalysisRequest or BatchAnalysisItem"""
+    study = context.study
     if not study:
         raise HTTPException(status_code=404, detail="Study not found")
 
@@ -50,121 +647,142 @@ async def create_analysis(
     prompt_builder = PromptBuilder()
 
     if request.analysis_type == "primary":
-        prompt = prompt_builder.build_primary_analysis_prompt(
+        return prompt_builder.build_primary_analysis_prompt(
             modality=study.modality.value,
-            body_part=study.series[0].body_part_examined if study.series else "Unknown",
+            body_part=study.body_part or "Unknown",
             clinical_indication=request.clinical_indication,
             technical_params={
                 "study_description": study.study_description,
-                "series_count": len(study.series)
+                "series_count": study.series_count
             }
         )
     elif request.analysis_type == "comparison" and request.prior_study_id:
-        # Get prior study
-        prior_study = await db.get(Study, request.prior_study_id)
+        prior_study = context.prior_study
         if not prior_study:
             raise HTTPException(status_code=404, detail="Prior study not found")
 
-        # Get prior findings (simplified - would pull from actual prior analysis)
-        prior_findings = "No significant abnormalities noted in prior study."
-
-        prompt = prompt_builder.build_comparison_analysis_prompt(
+        return prompt_builder.build_comparison_analysis_prompt(
             modality=study.modality.value,
-            body_part=study.series[0].body_part_examined if study.series else "Unknown",
+            body_part=study.body_part or "Unknown",
             clinical_indication=request.clinical_indication,
             prior_study_date=prior_study.study_date.strftime("%Y-%m-%d"),
-            prior_findings=prior_findings
+            prior_findings=_prior_findings(context.prior_analysis)
         )
     else:
         raise HTTPException(status_code=400, detail="Invalid analysis type or missing prior study")
 
-    # Create analysis record
-    analysis = MedGemmaAnalysis(
-        study_id=request.study_id,
-        analysis_type=request.analysis_type,
-        prompt=prompt,
-        raw_response="",
-        status=AnalysisStatus.PROCESSING
-    )
-    db.add(analysis)
-    await db.flush()
 
-    try:
-        # Run MedGemma inference
-        engine = get_medgemma_engine()
-        result = await engine.analyze(prompt)
+def _prior_findings(prior_analysis: Optional[PriorAnalysis]) -> str:
+    """Summarised findings of the prior study's latest analysis"""
+    if prior_analysis is None:
+        return "No prior AI analysis is available for this study."
+    return prior_analysis.summary
 
-        if result["status"] == "error":
-            analysis.status = AnalysisStatus.FAILED
-            analysis.error_message = result.get("error", "Unknown error")
-            await db.commit()
-            raise HTTPException(status_code=500, detail="Analysis failed")
-
-        # Update analysis with results
-        analysis.raw_response = result["response"]
-        analysis.processing_time_seconds = result["processing_time"]
-        analysis.model_version = result["model_info"].get("model_name", "MedGemma-1.5")
-        analysis.status = AnalysisStatus.COMPLETED
-        analysis.completed_at = datetime.utcnow()
-
-        # Parse structured findings (simplified - would use more sophisticated parsing)
-        findings_data = _parse_findings(result["response"])
-        analysis.structured_findings = findings_data
-
-        # Extract confidence score
-        confidence_text = result["response"].lower()
-        if "high confidence" in confidence_text:
-            analysis.confidence_score = 0.9
-        elif "moderate confidence" in confidence_text:
-            analysis.confidence_score = 0.7
-        elif "low confidence" in confidence_text:
-            analysis.confidence_score = 0.5
-        else:
-            analysis.confidence_score = 0.7  # default
 
-        # Create findings and measurements (simplified)
-        findings_count = 0
-        measurements_count = 0
+async def _get_analysis_status(db: AsyncSession, analysis_id: str) -> dict:
+    """Current status of an analysis and its queue job, if any"""
+    analysis = await db.get(MedGemmaAnalysis, analysis_id)
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Analysis not found")
 
-        for finding_data in findings_data.get("findings", []):
-            finding = Finding(
-                analysis_id=analysis.id,
-                finding_type=finding_data.get("type", "general"),
-                anatomical_location=finding_data.get("location", ""),
-                description=finding_data.get("description", ""),
-                severity=finding_data.get("severity", ""),
-                confidence_score=finding_data.get("confidence", 0.7)
-            )
-            db.add(finding)
-            findings_count += 1
+    result = await db.execute(select(AnalysisJob).where(AnalysisJob.analysis_id == analysis_id))
+    job = result.scalar_one_or_none()
 
-        for measurement_data in findings_data.get("measurements", []):
-            measurement = Measurement(
-                analysis_id=analysis.id,
-                measurement_type=measurement_data.get("type", "size"),
-                value=measurement_data.get("value", 0.0),
-                unit=measurement_data.get("unit", "mm"),
-                location=measurement_data.get("location", "")
-            )
-            db.add(measurement)
-            measurements_count += 1
+    status = {
+        "analysis_id": analysis.id,
+        "status": analysis.status.value,
+        "error": analysis.error_message,
+        "created_at": analysis.created_at,
+        "completed_at": analysis.completed_at,
+        "job": None
+    }
+    if job is not None:
+        priorities = {rank: priority.value for priority, rank in JOB_PRIORITY_RANKS.items()}
+        status["job"] = {
+            "id": job.id,
+            "status": job.status,
+            "priority": priorities.get(job.priority),
+            "attempts": job.attempts,
+            "max_attempts": job.max_attempts,
+            "queue_position": await get_analysis_queue().get_position(db, job),
+            "last_error": job.error_message,
+            "started_at": job.started_at
+        }
+    return status
+
+
+@router.get("/queue/status")
+async def get_queue_status():
+    """Analysis job counts by status, worker pool size, request coalescing and prior context caching"""
+    return {
+        **await get_analysis_queue().get_stats(),
+        "coalescing": _in_flight.get_stats(),
+        "prior_context_cache": get_prior_context_cache().get_stats()
+    }
 
-        await db.commit()
 
-        return AnalysisResponse(
-            analysis_id=analysis.id,
-            status=analysis.status.value,
-            findings_count=findings_count,
-            measurements_count=measurements_count,
-            confidence_score=analysis.confidence_score,
-            processing_time=analysis.processing_time_seconds
-        )
+@router.get("/engine/status")
+async def get_engine_status():
+    """MedGemma engine information and runtime metrics (queue depth, batching)"""
+    engine = get_medgemma_engine()
+    return engine.get_info()
 
-    except Exception as e:
-        analysis.status = AnalysisStatus.FAILED
-        analysis.error_message = str(e)
-        await db.commit()
-        raise HTTPException(status_code=500, detail=f"Analysis error: {str(e)}")
+
+@router.delete("/cache")
+async def clear_result_cache():
+    """Invalidate all cached MedGemma responses"""
+    engine = get_medgemma_engine()
+    removed = await engine.invalidate_cache()
+    return {"removed": removed}
+
+
+@router.get("/{analysis_id}/status")
+async def get_analysis_status(analysis_id: str, db: AsyncSession = Depends(get_db)):
+    """Lightweight status for polling queued analyses"""
+    return await _get_analysis_status(db, analysis_id)
+
+
+@router.get("/{analysis_id}/events")
+async def subscribe_analysis_status(analysis_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Stream status changes of an analysis as Server-Sent Events
+
+    Events:
+        status: the status payload whenever it changes
+        done:   final status once the analysis completed or failed
+    """
+    initial = await _get_analysis_status(db, analysis_id)
+
+    return StreamingResponse(
+        _stream_status_events(analysis_id, initial),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _stream_status_events(analysis_id: str, status: dict, interval: float = 1.0):
+    """Poll the analysis status and emit an event whenever it changes"""
+    final_states = {AnalysisStatus.COMPLETED.value, AnalysisStatus.FAILED.value, AnalysisStatus.REVIEWED.value}
+    last = None
+    idle_polls = 0
+
+    while True:
+        payload = json.loads(json.dumps(status, default=str))
+        if status["status"] in final_states:
+            yield _sse("done", payload)
+            return
+        if payload != last:
+            yield _sse("status", payload)
+            last = payload
+            idle_polls = 0
+        else:
+            idle_polls += 1
+            if idle_polls % 15 == 0:
+                yield ": keep-alive\n\n"  # Stops idle proxies from closing the stream
+
+        await asyncio.sleep(interval)
+        async with AsyncSessionLocal() as db:
+            status = await _get_analysis_status(db, analysis_id)
 
 
 @router.get("/{analysis_id}")
@@ -195,6 +813,11 @@ async def get_analysis(analysis_id: str, db: AsyncSession = Depends(get_db)):
         "structured_findings": analysis.structured_findings,
         "confidence_score": analysis.confidence_score,
         "processing_time": analysis.processing_time_seconds,
+        "generation": {
+            "max_tokens": analysis.max_tokens,
+            "tokens_generated": analysis.tokens_generated,
+            "stop_reason": analysis.stop_reason
+        },
         "findings": [
             {
                 "type": f.finding_type,
@@ -231,51 +854,3 @@ async def list_study_analyses(study_id: str, db: AsyncSession = Depends(get_db))
     )
     analyses = result.scalars().all()
     return list(analyses)
-
-
-def _parse_findings(response_text: str) -> dict:
-    """
-    Parse MedGemma response into structured findings
-    This is a simplified version - production would use more sophisticated NLP
-    """
-    # Simple keyword-based parsing
-    findings = []
-    measurements = []
-
-    # Look for common patterns (this is simplified)
-    if "nodule" in response_text.lower():
-        findings.append({
-            "type": "nodule",
-            "location": "lung",
-            "description": "Nodular opacity",
-            "severity": "moderate",
-            "confidence": 0.8
-        })
-
-    if "fracture" in response_text.lower():
-        findings.append({
-            "type": "fracture",
-            "location": "bone",
-            "description": "Fracture identified",
-            "severity": "significant",
-            "confidence": 0.9
-        })
-
-    # Extract measurements (simplified pattern matching)
-    import re
-    measurement_pattern = r'(\d+(?:\.\d+)?)\s*(mm|cm|HU)'
-    matches = re.findall(measurement_pattern, response_text)
-
-    for value, unit in matches:
-        measurements.append({
-            "type": "size",
-            "value": float(value),
-            "unit": unit,
-            "location": "unspecified"
-        })
-
-    return {
-        "findings": findings,
-        "measurements": measurements,
-        "summary": response_text[:500]  # First 500 chars
-    }
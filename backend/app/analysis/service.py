@@ -0,0 +1,167 @@
+"""
+Analysis service layer
+Persists MedGemma results as analyses, findings and measurements
+"""
+import asyncio
+import hashlib
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.database import AsyncSessionLocal
+from app.config.models import MedGemmaAnalysis, Finding, Measurement, AnalysisStatus
+from app.medgemma import parse_response
+
+IN_FLIGHT_STATUSES = (AnalysisStatus.QUEUED, AnalysisStatus.PROCESSING)
+
+
+class AnalysisService:
+    """Service for analysis result handling"""
+
+    @staticmethod
+    def request_key(
+        study_id: str,
+        analysis_type: str,
+        clinical_indication: str,
+        prior_study_id: Optional[str] = None,
+    ) -> str:
+        """
+        Identity of an analysis request, for coalescing duplicates
+
+        The indication is compared case- and whitespace-insensitively, so a
+        retried request with reformatted text still matches.
+        """
+        indication = " ".join(clinical_indication.split()).casefold()
+        indication_hash = hashlib.sha256(indication.encode()).hexdigest()
+        material = "|".join([study_id, analysis_type, indication_hash, prior_study_id or ""])
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    @staticmethod
+    async def find_in_flight(db: AsyncSession, request_key: str, window: int) -> Optional[MedGemmaAnalysis]:
+        """
+        Latest queued or processing analysis for request_key started within window seconds
+
+        The window keeps a row orphaned by a crashed synchronous request
+        from swallowing every later identical request.
+        """
+        result = await db.execute(
+            select(MedGemmaAnalysis)
+            .where(
+                MedGemmaAnalysis.request_key == request_key,
+                MedGemmaAnalysis.status.in_(IN_FLIGHT_STATUSES),
+                MedGemmaAnalysis.created_at >= datetime.utcnow() - timedelta(seconds=window),
+            )
+            .order_by(MedGemmaAnalysis.created_at.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+    @staticmethod
+    async def find_in_flight_many(
+        db: AsyncSession,
+        request_keys: Iterable[str],
+        window: int,
+    ) -> Dict[str, MedGemmaAnalysis]:
+        """find_in_flight for several request keys in one query, keyed by request_key"""
+        request_keys = set(request_keys)
+        if not request_keys:
+            return {}
+
+        result = await db.execute(
+            select(MedGemmaAnalysis)
+            .where(
+                MedGemmaAnalysis.request_key.in_(request_keys),
+                MedGemmaAnalysis.status.in_(IN_FLIGHT_STATUSES),
+                MedGemmaAnalysis.created_at >= datetime.utcnow() - timedelta(seconds=window),
+            )
+            .order_by(MedGemmaAnalysis.created_at.desc())
+        )
+        in_flight = {}
+        for analysis in result.scalars().all():
+            in_flight.setdefault(analysis.request_key, analysis)
+        return in_flight
+
+    @staticmethod
+    async def wait_for_analysis(
+        analysis_id: str,
+        timeout: float,
+        poll_interval: float = 1.0,
+    ) -> Optional[MedGemmaAnalysis]:
+        """Poll until the analysis is no longer queued or processing; None on timeout"""
+        deadline = time.monotonic() + timeout
+        while True:
+            async with AsyncSessionLocal() as db:
+                analysis = await db.get(MedGemmaAnalysis, analysis_id)
+            if analysis is None or analysis.status not in IN_FLIGHT_STATUSES:
+                return analysis
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(min(poll_interval, max(deadline - time.monotonic(), 0)))
+
+    @staticmethod
+    async def count_results(db: AsyncSession, analysis_id: str) -> Tuple[int, int]:
+        """(findings_count, measurements_count) of a stored analysis"""
+        findings = await db.execute(
+            select(func.count()).select_from(Finding).where(Finding.analysis_id == analysis_id)
+        )
+        measurements = await db.execute(
+            select(func.count()).select_from(Measurement).where(Measurement.analysis_id == analysis_id)
+        )
+        return findings.scalar(), measurements.scalar()
+
+    @staticmethod
+    def store_results(db: AsyncSession, analysis: MedGemmaAnalysis, result: dict) -> Tuple[int, int]:
+        """
+        Copy a successful engine result onto the analysis and add findings/measurements
+
+        Returns:
+            (findings_count, measurements_count)
+        """
+        # Update analysis with results
+        analysis.raw_response = result["response"]
+        analysis.processing_time_seconds = result["processing_time"]
+        analysis.model_version = result["model_info"].get("model_name", "MedGemma-1.5")
+
+        # Token budget usage
+        generation = result.get("generation") or {}
+        analysis.max_tokens = generation.get("max_tokens")
+        analysis.tokens_generated = generation.get("tokens_generated")
+        analysis.stop_reason = generation.get("stop_reason")
+        analysis.status = AnalysisStatus.COMPLETED
+        analysis.completed_at = datetime.utcnow()
+
+        # Parse sections, findings, measurements and confidence once; reports read them from here
+        findings_data = parse_response(result["response"])
+        analysis.structured_findings = findings_data
+        analysis.confidence_score = findings_data["confidence"]["score"]
+
+        # Create findings and measurements
+        findings_count = 0
+        measurements_count = 0
+
+        for finding_data in findings_data.get("findings", []):
+            finding = Finding(
+                analysis_id=analysis.id,
+                finding_type=finding_data.get("type", "general"),
+                anatomical_location=finding_data.get("location", ""),
+                description=finding_data.get("description", ""),
+                severity=finding_data.get("severity", ""),
+                confidence_score=finding_data.get("confidence", 0.7)
+            )
+            db.add(finding)
+            findings_count += 1
+
+        for measurement_data in findings_data.get("measurements", []):
+            measurement = Measurement(
+                analysis_id=analysis.id,
+                measurement_type=measurement_data.get("type", "size"),
+                value=measurement_data.get("value", 0.0),
+                unit=measurement_data.get("unit", "mm"),
+                location=measurement_data.get("location", "")
+            )
+            db.add(measurement)
+            measurements_count += 1
+
+        return findings_count, measurements_count
@@ -0,0 +1,62 @@
+"""
+Single-flight Request Coalescing
+Identical concurrent requests share one execution instead of each repeating it
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    """
+    Per-key coalescing of concurrent work
+
+    run(): the first caller starts the work; callers arriving while it is
+    still running await the same result (or exception). The work is
+    shielded, so one caller disconnecting doesn't cancel it for the others.
+
+    lock(): serialises a check-then-insert section per key, so two
+    identical requests can't both decide they are first.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+        self._stats = {"calls": 0, "shared": 0}
+
+    async def run(self, key: str, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return (result, shared) - shared is True when another caller's run was joined"""
+        self._stats["calls"] += 1
+        call = self._calls.get(key)
+        shared = call is not None
+
+        if shared:
+            self._stats["shared"] += 1
+        else:
+            call = asyncio.ensure_future(func())
+            self._calls[key] = call
+            call.add_done_callback(lambda _: self._calls.pop(key, None))
+            # Nobody may await a failed call after the last caller gave up
+            call.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+        return await asyncio.shield(call), shared
+
+    @asynccontextmanager
+    async def lock(self, key: str):
+        """Hold the lock for key; unused locks are dropped"""
+        lock, holders = self._locks.get(key, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._locks[key] = (lock, holders + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, holders = self._locks[key]
+            if holders <= 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, holders - 1)
+
+    def get_stats(self) -> Dict:
+        return {**self._stats, "in_flight": len(self._calls)}
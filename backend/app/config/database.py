@@ -5,6 +5,7 @@ Supports both SQLite (offline) and PostgreSQL (online)
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
+from sqlalchemy import inspect, text
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
     async_sessionmaker,
@@ -17,12 +18,12 @@ from .settings import get_settings
 settings = get_settings()
 
 # Create async engine based on mode
+# SQLite (offline) keeps aiosqlite's default pool, which takes no sizing arguments
 engine = create_async_engine(
     settings.database_url,
     echo=settings.debug,
     pool_pre_ping=True,
-    pool_size=5 if settings.is_online_mode else 1,
-    max_overflow=10 if settings.is_online_mode else 0,
+    **({"pool_size": 5, "max_overflow": 10} if settings.is_online_mode else {}),
 )
 
 # Create session factory
@@ -59,9 +60,41 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
 
 
 async def init_db():
-    """Initialize database - create all tables"""
+    """Initialize database - create all tables, then add columns and indexes they lack"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_upgrade_schema)
+
+
+def _upgrade_schema(conn):
+    """
+    Bring tables created by an older version up to the models
+
+    create_all only creates missing tables, so columns and indexes added to
+    an existing model are added here. Idempotent; only nullable columns can
+    be added this way, anything else needs the database rebuilt.
+    """
+    inspector = inspect(conn)
+    ddl = conn.dialect.ddl_compiler(conn.dialect, None)
+
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable and column.server_default is None:
+                raise RuntimeError(
+                    f"Column {table.name}.{column.name} is missing and is NOT NULL; rebuild the database"
+                )
+            spec = ddl.get_column_specification(column)
+            for foreign_key in column.foreign_keys:
+                spec += f" REFERENCES {foreign_key.column.table.name} ({foreign_key.column.name})"
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {spec}"))
+
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(conn)
 
 
 async def close_db():
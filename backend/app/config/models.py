@@ -12,6 +12,7 @@ from sqlalchemy import (
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
     JSON,
     String,
@@ -64,6 +65,12 @@ class AnalysisStatus(str, Enum):
     REVIEWED = "reviewed"
 
 
+class AnalysisPriority(str, Enum):
+    STAT = "stat"
+    URGENT = "urgent"
+    ROUTINE = "routine"
+
+
 class ReportStatus(str, Enum):
     DRAFT = "draft"
     FINAL = "final"
@@ -147,6 +154,11 @@ class Study(Base):
     reports = relationship("Report", back_populates="study", cascade="all, delete-orphan")
     prior_study = relationship("Study", remote_side=[id], backref="follow_up_studies")
 
+    __table_args__ = (
+        # Prior study selection: a patient's earlier studies of one modality
+        Index("ix_studies_patient_modality_date", "patient_id", "modality", "study_date"),
+    )
+
 
 class Series(Base):
     """DICOM series within a study"""
@@ -220,16 +232,26 @@ class Volume(Base):
 class MedGemmaAnalysis(Base):
     """AI analysis results from MedGemma"""
     __tablename__ = "medgemma_analyses"
+    __table_args__ = (
+        Index("ix_medgemma_analyses_request_key", "request_key", "status"),
+        # Latest completed or reviewed analysis of a study (prior findings for comparisons)
+        Index("ix_medgemma_analyses_study_status_completed", "study_id", "status", "completed_at"),
+    )
 
     id = Column(String(36), primary_key=True, default=generate_uuid)
     study_id = Column(String(36), ForeignKey("studies.id", ondelete="CASCADE"), nullable=False)
     analysis_type = Column(String(100), nullable=False)  # e.g., "primary", "comparison", "follow-up"
+    request_key = Column(String(64))  # Hash of study, type, indication and prior study, for de-duplication
+    batch_id = Column(String(36), ForeignKey("analysis_batches.id", ondelete="SET NULL"), index=True)
     prompt = Column(Text, nullable=False)  # Prompt sent to MedGemma
     raw_response = Column(Text, nullable=False)  # Raw model response
     structured_findings = Column(JSON)  # Parsed structured findings
     confidence_score = Column(Float)  # Overall confidence
     processing_time_seconds = Column(Float)
     model_version = Column(String(100))
+    max_tokens = Column(Integer)  # Token budget for the analysis type
+    tokens_generated = Column(Integer)
+    stop_reason = Column(String(20))  # stop, eos, max_tokens, cached
     status = Column(SQLEnum(AnalysisStatus), default=AnalysisStatus.QUEUED, nullable=False)
     error_message = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -241,6 +263,61 @@ class MedGemmaAnalysis(Base):
     measurements = relationship("Measurement", back_populates="analysis", cascade="all, delete-orphan")
 
 
+class InferenceCacheEntry(Base):
+    """Cached MedGemma responses keyed by prompt, model and generation parameters"""
+    __tablename__ = "inference_cache"
+
+    cache_key = Column(String(64), primary_key=True)  # SHA-256 hex
+    model_name = Column(String(100))
+    response = Column(Text, nullable=False)
+    hit_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class AnalysisJob(Base):
+    """Durable queue entry for an analysis waiting on (or running) inference"""
+    __tablename__ = "analysis_jobs"
+    __table_args__ = (
+        Index("ix_analysis_jobs_claim", "status", "priority", "available_at"),
+    )
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    analysis_id = Column(
+        String(36), ForeignKey("medgemma_analyses.id", ondelete="CASCADE"), nullable=False, unique=True
+    )
+    priority = Column(Integer, nullable=False)  # lower runs first, see JOB_PRIORITY_RANKS
+    payload = Column(JSON)  # generation options, e.g. use_cache
+    status = Column(String(50), default="pending", nullable=False)  # pending, running, completed, failed
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=3, nullable=False)
+    worker_id = Column(String(100))
+    available_at = Column(DateTime, default=datetime.utcnow, nullable=False)  # retry backoff
+    lease_expires_at = Column(DateTime)  # visibility timeout while running
+    error_message = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+
+class AnalysisBatch(Base):
+    """Worklist of analyses submitted together through POST /api/analysis/batch"""
+    __tablename__ = "analysis_batches"
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    priority = Column(String(20), nullable=False)
+    total_items = Column(Integer, nullable=False)
+    items = Column(JSON, nullable=False)  # per item: study_id, analysis_id (or null) and error
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+JOB_PRIORITY_RANKS = {
+    AnalysisPriority.STAT: 0,
+    AnalysisPriority.URGENT: 1,
+    AnalysisPriority.ROUTINE: 2,
+}
+
+
 class Finding(Base):
     """Individual findings identified by MedGemma"""
     __tablename__ = "findings"
@@ -3,7 +3,7 @@ Configuration Management for RadiantAI
 Supports both OFFLINE (local) and ONLINE (cloud) deployment modes
 """
 from functools import lru_cache
-from typing import Literal
+from typing import Literal, Optional
 from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -38,18 +38,83 @@ class Settings(BaseSettings):
     medgemma_model_path: str = "./models/medgemma-1.5"
     medgemma_device: Literal["cuda", "cpu"] = "cuda"
     medgemma_quantization: Literal["4bit", "8bit", "none"] = "4bit"
+    medgemma_inference_timeout: float = 600.0  # seconds
+    medgemma_max_queue_size: int = 16  # pending local generations (0 = unbounded)
+    medgemma_max_batch_size: int = 4  # prompts per batched generate call (1 = no batching)
+    medgemma_batch_window_ms: int = 50  # wait for more prompts before running a batch
+    medgemma_prefix_cache: bool = True  # reuse KV cache of static prompt prefixes
+    medgemma_cpu_threads: int = 0  # intra-op threads on CPU (0 = torch default, one per core)
+    medgemma_cpu_interop_threads: int = 0  # inter-op threads on CPU (0 = torch default)
+    medgemma_mmap_weights: bool = True  # memory-map weights instead of copying them into RAM
+    medgemma_draft_model_path: str = ""  # small same-tokenizer model for speculative decoding ("" = off)
+    medgemma_draft_num_tokens: int = 5  # draft tokens verified per main-model pass (adapted at runtime)
+    medgemma_retry_after: int = 30  # Retry-After seconds sent while the model is loading
+    medgemma_cache_enabled: bool = True  # reuse responses for identical prompts/parameters
+    medgemma_cache_ttl_seconds: int = 2592000  # 30 days (0 = no expiry)
+    medgemma_cache_max_entries: int = 10000
     medgemma_api_endpoint: str = ""
     medgemma_api_key: str = ""
+    medgemma_api_endpoints: str = ""  # comma-separated "url|weight" pool, overrides medgemma_api_endpoint
+    medgemma_api_routing: Literal["least_outstanding", "latency"] = "least_outstanding"
+    medgemma_api_health_check_path: str = "/health"  # "" disables active health checks
+    medgemma_api_health_check_interval: float = 15.0  # seconds
+    medgemma_api_timeout: float = 300.0  # seconds to wait for a response
+    medgemma_api_connect_timeout: float = 10.0
+    medgemma_api_max_connections: int = 20
+    medgemma_api_max_keepalive: int = 10
+    medgemma_api_keepalive_expiry: float = 30.0  # seconds an idle connection is kept
+    medgemma_api_http2: bool = True
+    medgemma_api_max_concurrency: int = 8  # requests in flight; the rest wait
+    medgemma_api_max_retries: int = 3  # on 429/5xx and connection errors
+    medgemma_api_backoff_base: float = 0.5  # seconds, doubled per retry (with jitter)
+    medgemma_api_backoff_max: float = 30.0
+    medgemma_api_circuit_failure_threshold: int = 5  # consecutive failures before failing fast
+    medgemma_api_circuit_reset_timeout: float = 30.0  # seconds before probing again
+
+    # Analysis Job Queue
+    analysis_workers: int = 2  # queued analyses run concurrently
+    analysis_visibility_timeout: int = 120  # seconds a claimed job stays leased between heartbeats
+    analysis_max_attempts: int = 3
+    analysis_retry_backoff: int = 30  # seconds, doubled after each failed attempt
+    analysis_poll_interval: float = 2.0  # seconds between idle queue polls
+    analysis_dedup_window: int = 900  # seconds an in-flight analysis can be joined by identical requests
+    analysis_claim_batch_size: int = 4  # jobs a worker claims and runs together, so inference can batch them
+    analysis_batch_max_items: int = 500  # studies per POST /api/analysis/batch
+    analysis_prior_context_cache_size: int = 1024  # prior studies whose summarised findings are kept in memory
+
+    # Mock MedGemma (used when no model weights are found, or forced for load tests)
+    medgemma_use_mock: bool = False
+    medgemma_mock_ttft: float = 0.5  # seconds to first token
+    medgemma_mock_tokens_per_second: float = 200.0
+    medgemma_mock_latency_distribution: Literal["fixed", "normal", "lognormal"] = "fixed"
+    medgemma_mock_latency_jitter: float = 0.25
+    medgemma_mock_error_rate: float = 0.0
+    medgemma_mock_timeout_rate: float = 0.0
+    medgemma_mock_timeout_seconds: float = 30.0
+    medgemma_mock_max_concurrency: int = 1  # like a single GPU (0 = unlimited)
+    medgemma_mock_seed: Optional[int] = None
 
     # Storage Configuration
     storage_type: Literal["local", "s3", "azure"] = "local"
     local_storage_path: str = "./data/storage"
+    local_storage_batch_concurrency: int = 4
     s3_bucket: str = ""
     s3_region: str = "us-east-1"
     s3_access_key: str = ""
     s3_secret_key: str = ""
+    s3_batch_concurrency: int = 32
     azure_storage_connection_string: str = ""
     azure_container_name: str = ""
+    azure_block_size: int = 4194304  # 4MB blocks for staged uploads
+    azure_max_concurrency: int = 8  # Parallel block uploads/download ranges
+    azure_batch_concurrency: int = 32
+
+    # Local disk cache in front of S3/Azure
+    storage_cache_enabled: bool = False
+    storage_cache_path: str = "./data/cache"
+    storage_cache_max_bytes: int = 21474836480  # 20GB
+    storage_cache_ttl_seconds: int = 604800  # 7 days (0 = no expiry)
+    storage_cache_write_through: bool = False
 
     # Security
     secret_key: str = Field(..., min_length=32)
@@ -108,22 +173,86 @@ class Settings(BaseSettings):
                 "type": "local",
                 "model_path": self.medgemma_model_path,
                 "device": self.medgemma_device,
-                "quantization": self.medgemma_quantization
+                "quantization": self.medgemma_quantization,
+                "inference_timeout": self.medgemma_inference_timeout,
+                "max_queue_size": self.medgemma_max_queue_size,
+                "max_batch_size": self.medgemma_max_batch_size,
+                "batch_window_ms": self.medgemma_batch_window_ms,
+                "prefix_cache": self.medgemma_prefix_cache,
+                "cpu_threads": self.medgemma_cpu_threads,
+                "cpu_interop_threads": self.medgemma_cpu_interop_threads,
+                "mmap_weights": self.medgemma_mmap_weights,
+                "draft_model_path": self.medgemma_draft_model_path,
+                "draft_num_tokens": self.medgemma_draft_num_tokens
             }
         else:
             return {
                 "type": "api",
                 "endpoint": self.medgemma_api_endpoint,
-                "api_key": self.medgemma_api_key
+                "endpoints": self.medgemma_api_endpoints_list,
+                "routing": self.medgemma_api_routing,
+                "health_check_path": self.medgemma_api_health_check_path,
+                "health_check_interval": self.medgemma_api_health_check_interval,
+                "api_key": self.medgemma_api_key,
+                "client": {
+                    "timeout": self.medgemma_api_timeout,
+                    "connect_timeout": self.medgemma_api_connect_timeout,
+                    "max_connections": self.medgemma_api_max_connections,
+                    "max_keepalive_connections": self.medgemma_api_max_keepalive,
+                    "keepalive_expiry": self.medgemma_api_keepalive_expiry,
+                    "http2": self.medgemma_api_http2,
+                    "max_concurrency": self.medgemma_api_max_concurrency,
+                    "max_retries": self.medgemma_api_max_retries,
+                    "backoff_base": self.medgemma_api_backoff_base,
+                    "backoff_max": self.medgemma_api_backoff_max,
+                    "circuit_failure_threshold": self.medgemma_api_circuit_failure_threshold,
+                    "circuit_reset_timeout": self.medgemma_api_circuit_reset_timeout
+                }
             }
 
+    @property
+    def medgemma_mock_config(self) -> dict:
+        """Get Mock MedGemma simulation parameters"""
+        return {
+            "ttft": self.medgemma_mock_ttft,
+            "tokens_per_second": self.medgemma_mock_tokens_per_second,
+            "latency_distribution": self.medgemma_mock_latency_distribution,
+            "latency_jitter": self.medgemma_mock_latency_jitter,
+            "error_rate": self.medgemma_mock_error_rate,
+            "timeout_rate": self.medgemma_mock_timeout_rate,
+            "timeout_seconds": self.medgemma_mock_timeout_seconds,
+            "max_concurrency": self.medgemma_mock_max_concurrency,
+            "seed": self.medgemma_mock_seed
+        }
+
+    @property
+    def analysis_queue_config(self) -> dict:
+        """Get analysis job queue configuration"""
+        return {
+            "workers": self.analysis_workers,
+            "visibility_timeout": self.analysis_visibility_timeout,
+            "max_attempts": self.analysis_max_attempts,
+            "retry_backoff": self.analysis_retry_backoff,
+            "poll_interval": self.analysis_poll_interval,
+            "claim_batch_size": self.analysis_claim_batch_size
+        }
+
     @property
     def storage_config(self) -> dict:
         """Get storage configuration"""
+        cache = {
+            "enabled": self.storage_cache_enabled,
+            "path": self.storage_cache_path,
+            "max_bytes": self.storage_cache_max_bytes,
+            "ttl_seconds": self.storage_cache_ttl_seconds,
+            "write_through": self.storage_cache_write_through
+        }
+
         if self.storage_type == "local":
             return {
                 "type": "local",
-                "path": self.local_storage_path
+                "path": self.local_storage_path,
+                "batch_concurrency": self.local_storage_batch_concurrency
             }
         elif self.storage_type == "s3":
             return {
@@ -131,13 +260,19 @@ class Settings(BaseSettings):
                 "bucket": self.s3_bucket,
                 "region": self.s3_region,
                 "access_key": self.s3_access_key,
-                "secret_key": self.s3_secret_key
+                "secret_key": self.s3_secret_key,
+                "batch_concurrency": self.s3_batch_concurrency,
+                "cache": cache
             }
         else:  # azure
             return {
                 "type": "azure",
                 "connection_string": self.azure_storage_connection_string,
-                "container": self.azure_container_name
+                "container": self.azure_container_name,
+                "block_size": self.azure_block_size,
+                "max_concurrency": self.azure_max_concurrency,
+                "batch_concurrency": self.azure_batch_concurrency,
+                "cache": cache
             }
 
     @property
@@ -145,6 +280,17 @@ class Settings(BaseSettings):
         """Parse CORS origins as list"""
         return [origin.strip() for origin in self.cors_origins.split(",")]
 
+    @property
+    def medgemma_api_endpoints_list(self) -> list[tuple[str, int]]:
+        """Parse the endpoint pool as (url, weight) pairs, falling back to the single endpoint"""
+        endpoints = []
+        for entry in self.medgemma_api_endpoints.split(","):
+            if not entry.strip():
+                continue
+            url, _, weight = entry.strip().partition("|")
+            endpoints.append((url.strip(), int(weight) if weight.strip() else 1))
+        return endpoints or [(self.medgemma_api_endpoint, 1)]
+
 
 @lru_cache()
 def get_settings() -> Settings:
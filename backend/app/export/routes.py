@@ -1,7 +1,9 @@
 """
 Report Export API - PDF, JSON, DICOM-SR
 """
+import io
 import json
+import zipfile
 from datetime import datetime
 from io import BytesIO
 from fastapi import APIRouter, Depends, HTTPException
@@ -12,7 +14,8 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table
 from reportlab.lib.styles import getSampleStyleSheet
 
 from app.config.database import get_db
-from app.config.models import Report, Study, Patient
+from app.config.models import Report, Study, Patient, Series, Image
+from app.storage import get_storage_manager
 
 router = APIRouter(prefix="/api/export", tags=["export"])
 
@@ -198,3 +201,67 @@ async def export_dicom_sr(study_id: str, db: AsyncSession = Depends(get_db)):
         "study_id": study_id,
         "note": "Production implementation would use pydicom to create proper DICOM-SR files"
     }
+
+
+@router.get("/study/{study_id}/dicom")
+async def export_study_dicom(study_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Export all stored DICOM instances of a study as a ZIP archive
+    The archive is streamed from storage; no instance is held fully in memory
+    """
+    from sqlalchemy import select
+
+    study = await db.get(Study, study_id)
+    if not study:
+        raise HTTPException(status_code=404, detail="Study not found")
+
+    result = await db.execute(
+        select(Series.series_instance_uid, Image.sop_instance_uid, Image.storage_path)
+        .join(Image, Image.series_id == Series.id)
+        .where(Series.study_id == study_id)
+        .order_by(Series.series_number, Image.instance_number)
+    )
+    entries = result.all()
+
+    return StreamingResponse(
+        _stream_dicom_zip(entries),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename=study_{study_id}.zip"
+        }
+    )
+
+
+class _ZipStreamBuffer(io.RawIOBase):
+    """Write-only sink that lets zipfile output be drained chunk by chunk"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def _stream_dicom_zip(entries):
+    """Yield a ZIP archive of (series_uid, sop_uid, storage_path) entries"""
+    storage = get_storage_manager()
+    buffer = _ZipStreamBuffer()
+
+    # ZIP_STORED: DICOM pixel data compresses poorly and deflate would cost CPU
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for series_uid, sop_uid, storage_path in entries:
+            with archive.open(f"{series_uid}/{sop_uid}.dcm", mode="w", force_zip64=True) as member:
+                async for chunk in storage.open_file(storage_path):
+                    member.write(chunk)
+                    yield buffer.drain()
+            yield buffer.drain()
+    yield buffer.drain()
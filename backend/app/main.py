@@ -10,6 +10,8 @@ import structlog
 from app.config.database import init_db, close_db
 from app.config.settings import get_settings
 from app.medgemma import get_medgemma_engine
+from app.storage import get_storage_manager
+from app.analysis.queue import get_analysis_queue
 
 # Import routers
 from app.patients.routes import router as patients_router
@@ -43,17 +45,26 @@ async def lifespan(app: FastAPI):
     await init_db()
     logger.info("database_initialized")
 
-    # Initialize MedGemma engine
+    # Initialize MedGemma engine; weights load in the background so the rest
+    # of the API is available immediately (see /health for progress)
     try:
         engine = get_medgemma_engine()
-        logger.info("medgemma_initialized", engine_info=engine.get_info())
+        engine.start_loading()
+        logger.info("medgemma_loading_started", engine_info=engine.get_info())
     except Exception as e:
         logger.error("medgemma_initialization_failed", error=str(e))
 
+    # Start analysis workers (re-queues jobs left running by a crash)
+    await get_analysis_queue().start()
+
     yield
 
     # Cleanup
     logger.info("shutting_down_radiantai")
+
+    # Stop workers before the database goes away; in-flight jobs are re-queued
+    await get_analysis_queue().stop()
+
     await close_db()
 
     # Close MedGemma engine
@@ -63,6 +74,12 @@ async def lifespan(app: FastAPI):
     except Exception:
         pass
 
+    # Close storage backend clients
+    try:
+        await get_storage_manager().close()
+    except Exception:
+        pass
+
 
 # Create FastAPI app
 settings = get_settings()
@@ -106,11 +123,27 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    # Check MedGemma status
+    # Check MedGemma status (loading, warming, ready or failed)
     medgemma_available = False
+    medgemma_status = {"state": "failed"}
     try:
         engine = get_medgemma_engine()
-        medgemma_available = True
+        medgemma_status = engine.get_status()
+        medgemma_available = engine.is_ready
+    except Exception as e:
+        medgemma_status["error"] = str(e)
+
+    # Storage statistics (cache hit/miss counters when caching is enabled)
+    storage_stats = {}
+    try:
+        storage_stats = get_storage_manager().get_stats()
+    except Exception:
+        pass
+
+    # Analysis job queue depth
+    analysis_queue = {}
+    try:
+        analysis_queue = await get_analysis_queue().get_stats()
     except Exception:
         pass
 
@@ -121,7 +154,10 @@ async def health_check():
             "medgemma": medgemma_available,
             "database": True,  # If we got this far, DB is working
             "storage": True,   # Basic storage is always available in offline mode
-        }
+        },
+        "medgemma": medgemma_status,
+        "storage_stats": storage_stats,
+        "analysis_queue": analysis_queue
     }
 
 
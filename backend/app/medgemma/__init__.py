@@ -1,4 +1,13 @@
 from .engine import MedGemmaEngine, get_medgemma_engine
-from .prompts import PromptBuilder
+from .parser import parse_response
+from .prompts import GenerationProfile, PromptBuilder
+from .stopping import StopCondition
 
-__all__ = ["MedGemmaEngine", "get_medgemma_engine", "PromptBuilder"]
+__all__ = [
+    "MedGemmaEngine",
+    "get_medgemma_engine",
+    "parse_response",
+    "GenerationProfile",
+    "PromptBuilder",
+    "StopCondition",
+]
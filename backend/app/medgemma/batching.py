@@ -0,0 +1,214 @@
+"""
+Dynamic Request Batching
+Collects concurrent generation requests and runs them as one batched model call
+"""
+import asyncio
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from .executor import InferenceQueueFull
+from .stopping import StopCondition
+
+# run_batch(prompts, max_tokens per prompt, temperature, stop condition per prompt,
+#           cancelled event per prompt) -> [(text, generated token count)]
+BatchRunner = Callable[
+    [List[str], List[int], float, List[Optional[StopCondition]], List[threading.Event]],
+    Awaitable[List[Tuple[str, int]]],
+]
+
+
+class PendingRequest(NamedTuple):
+    """A prompt waiting for a batch slot"""
+    prompt: str
+    max_tokens: int
+    temperature: float
+    stop: Optional[StopCondition]
+    future: asyncio.Future
+    enqueued_at: float
+
+
+class BatchScheduler:
+    """
+    Groups pending prompts into batches
+
+    A batch is dispatched once max_batch_size requests are waiting or
+    batch_window seconds have passed since the first one arrived. Requests
+    with different temperatures are run as separate batches.
+
+    Like InferenceExecutor, the queue holds at most max_queue_size requests
+    (0 = unbounded) and timeout counts from submission, so time spent
+    waiting here for a batch slot is part of the inference timeout.
+
+    Batches run as tasks, so new requests are collected while one decodes.
+    At most max_running_batches are in flight; further requests wait in
+    the queue, where they fill the next batch.
+    """
+
+    def __init__(
+        self,
+        run_batch: BatchRunner,
+        max_batch_size: int = 4,
+        batch_window: float = 0.05,
+        max_queue_size: int = 0,
+        timeout: Optional[float] = None,
+        max_running_batches: int = 2,
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.max_queue_size = max_queue_size
+        self.timeout = timeout
+        self.max_running_batches = max_running_batches
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self._metrics = {
+            "batches": 0,
+            "requests": 0,
+            "generated_tokens": 0,
+            "busy_seconds": 0.0,
+            "queue_wait_seconds": 0.0,
+            "max_queue_wait_seconds": 0.0,
+            "max_batch_size_seen": 0,
+        }
+
+    async def submit(
+        self,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        stop: Optional[StopCondition] = None,
+    ) -> str:
+        """
+        Queue a prompt and wait for its generated text
+
+        Raises:
+            InferenceQueueFull: if the queue is at capacity
+            TimeoutError: if no result arrives within timeout seconds
+        """
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._task = asyncio.create_task(self._dispatch_loop())
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait(PendingRequest(prompt, max_tokens, temperature, stop, future, time.monotonic()))
+        except asyncio.QueueFull:
+            raise InferenceQueueFull("Inference queue is full, try again later")
+
+        try:
+            # A timed-out request's future is cancelled, so it is skipped if not yet dispatched
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Inference timed out after {self.timeout:g}s")
+
+    async def _collect(self) -> List[PendingRequest]:
+        """Wait for one request, then gather more until the window closes or the batch is full"""
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.batch_window
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _dispatch_loop(self):
+        """Form and run batches forever"""
+        while True:
+            if len(self._running) >= self.max_running_batches:
+                await asyncio.wait(self._running, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            batch = await self._collect()
+
+            groups: Dict[float, list] = {}
+            for request in batch:
+                if not request.future.done():  # Skip callers that already gave up
+                    groups.setdefault(request.temperature, []).append(request)
+
+            for temperature, requests in groups.items():
+                task = asyncio.create_task(self._run(requests, temperature))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+    async def _run(self, requests: List[PendingRequest], temperature: float):
+        """
+        Run one batch and hand each caller its result
+
+        Each request gets an event that is set once its caller stops waiting
+        (timed out, cancelled or disconnected), so generation can drop it;
+        the batch ends early once every caller has gone.
+        """
+        started = time.monotonic()
+        cancelled = []
+        for request in requests:
+            wait = started - request.enqueued_at
+            self._metrics["queue_wait_seconds"] += wait
+            self._metrics["max_queue_wait_seconds"] = max(self._metrics["max_queue_wait_seconds"], wait)
+
+            event = threading.Event()
+            request.future.add_done_callback(lambda _, event=event: event.set())
+            cancelled.append(event)
+
+        try:
+            outputs = await self.run_batch(
+                [request.prompt for request in requests],
+                [request.max_tokens for request in requests],
+                temperature,
+                [request.stop for request in requests],
+                cancelled,
+            )
+        except asyncio.CancelledError:
+            for request in requests:
+                request.future.cancel()
+            raise
+        except Exception as e:
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+        finally:
+            self._metrics["busy_seconds"] += time.monotonic() - started
+            self._metrics["batches"] += 1
+            self._metrics["requests"] += len(requests)
+            self._metrics["max_batch_size_seen"] = max(self._metrics["max_batch_size_seen"], len(requests))
+
+        for request, (text, token_count) in zip(requests, outputs):
+            self._metrics["generated_tokens"] += token_count
+            if not request.future.done():
+                request.future.set_result(text)
+
+    @property
+    def pending(self) -> int:
+        """Requests waiting for a batch slot"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def get_metrics(self) -> Dict:
+        """Batch size, queue wait and throughput statistics"""
+        m = self._metrics
+        return {
+            "batches": m["batches"],
+            "requests": m["requests"],
+            "pending": self.pending,
+            "avg_batch_size": m["requests"] / m["batches"] if m["batches"] else 0.0,
+            "max_batch_size_seen": m["max_batch_size_seen"],
+            "avg_queue_wait_seconds": m["queue_wait_seconds"] / m["requests"] if m["requests"] else 0.0,
+            "max_queue_wait_seconds": m["max_queue_wait_seconds"],
+            "generated_tokens": m["generated_tokens"],
+            "tokens_per_second": m["generated_tokens"] / m["busy_seconds"] if m["busy_seconds"] else 0.0,
+        }
+
+    async def close(self):
+        """Stop dispatching and cancel running batches"""
+        if self._task is not None:
+            self._task.cancel()
+        for task in list(self._running):
+            task.cancel()
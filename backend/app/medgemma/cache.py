@@ -0,0 +1,120 @@
+"""
+MedGemma Result Cache
+Persists responses in the database so identical analyses skip inference
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import delete, func, select
+
+from app.config.database import AsyncSessionLocal
+from app.config.models import InferenceCacheEntry
+from .stopping import StopCondition
+
+# Model info fields that identify the model (runtime metrics are excluded)
+_MODEL_KEY_FIELDS = ("type", "model_name", "model_path", "quantization", "endpoint")
+
+
+class ResultCache:
+    """Database-backed response cache with TTL and entry-count limits"""
+
+    def __init__(self, ttl_seconds: int = 2592000, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._stats = {"hits": 0, "misses": 0, "stores": 0}
+
+    @staticmethod
+    def make_key(
+        prompt: str,
+        model_info: Dict,
+        max_tokens: int,
+        temperature: float,
+        stop: Optional[StopCondition] = None,
+    ) -> str:
+        """Hash of the normalised prompt, model identity and generation parameters"""
+        normalised_prompt = "\n".join(" ".join(line.split()) for line in prompt.strip().splitlines())
+        material = {
+            "prompt": normalised_prompt,
+            "model": {field: model_info.get(field) for field in _MODEL_KEY_FIELDS},
+            "max_tokens": max_tokens,
+            "temperature": round(temperature, 4),
+        }
+        if stop is not None:
+            material["stop"] = stop.to_dict()
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return cached response, or None on miss/expiry"""
+        async with AsyncSessionLocal() as db:
+            entry = await db.get(InferenceCacheEntry, key)
+
+            if entry is not None and self._is_expired(entry):
+                await db.delete(entry)
+                await db.commit()
+                entry = None
+
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+
+            entry.hit_count += 1
+            entry.last_accessed_at = datetime.utcnow()
+            await db.commit()
+
+        self._stats["hits"] += 1
+        return entry.response
+
+    async def put(self, key: str, response: str, model_name: Optional[str] = None):
+        """Store a response and prune the cache to its limits"""
+        async with AsyncSessionLocal() as db:
+            entry = await db.get(InferenceCacheEntry, key)
+            if entry is None:
+                db.add(InferenceCacheEntry(cache_key=key, model_name=model_name, response=response))
+            else:
+                entry.response = response
+                entry.created_at = datetime.utcnow()
+                entry.last_accessed_at = datetime.utcnow()
+            await db.commit()
+            await self._prune(db)
+
+        self._stats["stores"] += 1
+
+    async def invalidate(self, key: Optional[str] = None) -> int:
+        """Remove one entry, or every entry when key is None; returns count removed"""
+        async with AsyncSessionLocal() as db:
+            statement = delete(InferenceCacheEntry)
+            if key is not None:
+                statement = statement.where(InferenceCacheEntry.cache_key == key)
+            result = await db.execute(statement)
+            await db.commit()
+            return result.rowcount
+
+    async def _prune(self, db):
+        """Drop expired entries, then least recently used ones beyond max_entries"""
+        if self.ttl_seconds:
+            cutoff = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+            await db.execute(delete(InferenceCacheEntry).where(InferenceCacheEntry.created_at < cutoff))
+
+        count = (await db.execute(select(func.count()).select_from(InferenceCacheEntry))).scalar()
+        if count > self.max_entries:
+            stale_keys = (
+                select(InferenceCacheEntry.cache_key)
+                .order_by(InferenceCacheEntry.last_accessed_at.desc())
+                .offset(self.max_entries)
+            )
+            await db.execute(
+                delete(InferenceCacheEntry).where(InferenceCacheEntry.cache_key.in_(stale_keys))
+            )
+
+        await db.commit()
+
+    def _is_expired(self, entry: InferenceCacheEntry) -> bool:
+        return bool(self.ttl_seconds) and (
+            datetime.utcnow() - entry.created_at > timedelta(seconds=self.ttl_seconds)
+        )
+
+    def get_stats(self) -> Dict:
+        """Hit/miss counters since startup"""
+        return dict(self._stats)
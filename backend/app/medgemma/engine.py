@@ -2,33 +2,110 @@
 MedGemma Inference Engine
 Supports both local (offline) and API-based (online) inference
 """
+import asyncio
+import copy
 import json
+import re
+import threading
 import time
-from typing import Dict, List, Optional
+from contextlib import aclosing
+from enum import Enum
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from abc import ABC, abstractmethod
 
-import httpx
 from app.config.settings import get_settings
 
+from .batching import BatchScheduler
+from .executor import InferenceExecutor
+from .http_client import ResilientHTTPClient
+from .load_balancer import Endpoint, EndpointPool
+from .stopping import StopCondition
+
+# Whitespace-delimited pieces approximate tokens when there is no tokenizer
+_TOKEN_PATTERN = re.compile(r"\s*\S+")
+
+
+class EngineState(str, Enum):
+    LOADING = "loading"
+    WARMING = "warming"
+    READY = "ready"
+    FAILED = "failed"
+
 
 class MedGemmaBase(ABC):
     """Abstract base class for MedGemma inference"""
 
+    async def load(self):
+        """Load weights or open connections (called once, in the background)"""
+        pass
+
+    async def warmup(self):
+        """Run a throwaway request so the first real one isn't slow"""
+        pass
+
     @abstractmethod
-    async def generate(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.3) -> str:
-        """Generate response from MedGemma"""
+    async def generate(
+        self,
+        prompt: str,
+        max_tokens: int = 2048,
+        temperature: float = 0.3,
+        stop: Optional[StopCondition] = None,
+    ) -> str:
+        """
+        Generate response from MedGemma
+
+        stop lets the backend end generation early; MedGemmaEngine cuts the
+        response at the stop point either way.
+        """
         pass
 
+    async def generate_stream(
+        self,
+        prompt: str,
+        max_tokens: int = 2048,
+        temperature: float = 0.3,
+        stop: Optional[StopCondition] = None,
+    ) -> AsyncIterator[str]:
+        """Yield response text incrementally (default: one chunk once complete)"""
+        yield await self.generate(prompt, max_tokens, temperature, stop)
+
+    def count_tokens(self, text: str) -> int:
+        """Tokens in generated text (approximated without a tokenizer)"""
+        return len(_TOKEN_PATTERN.findall(text))
+
     @abstractmethod
     def get_model_info(self) -> Dict:
         """Get model information"""
         pass
 
+    async def close(self):
+        """Release resources"""
+        pass
+
+
+# Generated tokens decoded together before the stop-condition text is extended
+DECODE_FLUSH_TOKENS = 32
+
 
 class LocalMedGemma(MedGemmaBase):
     """Local MedGemma inference using transformers"""
 
-    def __init__(self, model_path: str, device: str = "cuda", quantization: str = "4bit"):
+    def __init__(
+        self,
+        model_path: str,
+        device: str = "cuda",
+        quantization: str = "4bit",
+        inference_timeout: float = 600.0,
+        max_queue_size: int = 16,
+        max_batch_size: int = 4,
+        batch_window: float = 0.05,
+        prefix_cache: bool = True,
+        cpu_threads: int = 0,
+        cpu_interop_threads: int = 0,
+        mmap_weights: bool = True,
+        draft_model_path: Optional[str] = None,
+        draft_num_tokens: int = 5,
+    ):
         """
         Initialize local MedGemma model
 
@@ -36,13 +113,112 @@ class LocalMedGemma(MedGemmaBase):
             model_path: Path to local model files
             device: Device to use (cuda/cpu)
             quantization: Quantization level (4bit/8bit/none)
+            inference_timeout: Seconds before a queued/running generation is abandoned
+            max_queue_size: Max pending generations (0 = unbounded)
+            max_batch_size: Max prompts per batched generate call (1 disables batching)
+            batch_window: Seconds to wait for more prompts before running a batch
+            prefix_cache: Precompute KV cache for the static prompt template prefixes
+            cpu_threads: Intra-op threads for CPU inference (0 = torch default)
+            cpu_interop_threads: Inter-op threads for CPU inference (0 = torch default)
+            mmap_weights: Memory-map weight files instead of reading them into RAM
+            draft_model_path: Small model sharing the tokenizer, used for speculative decoding
+            draft_num_tokens: Tokens the draft proposes per verification step (adapted as it runs)
         """
         self.model_path = model_path
         self.device = device
         self.quantization = quantization
+        self.cpu_threads = cpu_threads
+        self.cpu_interop_threads = cpu_interop_threads
+        self.mmap_weights = mmap_weights
+        self.inference_timeout = inference_timeout
         self.model = None
         self.tokenizer = None
+
+        # (prefix token ids, past_key_values) per prompt template, built by load()
+        self.prefix_cache_enabled = prefix_cache
+        self._prefix_cache = []
+        self._prefix_stats = {"hits": 0, "misses": 0, "reused_tokens": 0}
+
+        # Speculative decoding - the draft proposes tokens, the main model
+        # verifies a whole run of them in one forward pass
+        self.draft_model_path = draft_model_path or None
+        self.draft_num_tokens = draft_num_tokens
+        self.draft_model = None
+        self._forward_calls = {"target": 0, "draft": 0}
+        self._draft_stats = {
+            "generations": 0,
+            "generated_tokens": 0,
+            "draft_tokens": 0,
+            "accepted_tokens": 0,
+            "target_passes": 0,
+            "seconds": 0.0,
+        }
+        self._baseline_seconds_per_token: Optional[float] = None
+
+        # Generation runs on its own thread so the event loop keeps serving requests
+        self.executor = InferenceExecutor(max_queue_size=max_queue_size)
+
+        # Concurrent prompts are combined into one generate call
+        self.batcher = None
+        if max_batch_size > 1:
+            self.batcher = BatchScheduler(
+                self._run_batch,
+                max_batch_size=max_batch_size,
+                batch_window=batch_window,
+                max_queue_size=max_queue_size,
+                timeout=inference_timeout,
+            )
+
+    async def load(self):
+        """Load weights and the prefix KV cache on the inference thread"""
+        await self.executor.submit(self._load_sync)
+
+    def _load_sync(self, cancel_event=None):
+        if self.device == "cpu":
+            self._configure_cpu_threads()
         self._load_model()
+        if self.draft_model_path:
+            self._load_draft_model()
+        if self.prefix_cache_enabled:
+            self._build_prefix_cache()
+
+    async def warmup(self):
+        """Generate a few tokens to initialise CUDA kernels and allocator pools"""
+        prompts = ["Describe a normal chest radiograph."]
+        await self._run_batch(prompts, [8], 0.3)
+
+        if self.draft_model is not None:
+            # Unassisted reference timing, so get_model_info can report the speedup
+            await self.executor.submit(
+                self._generate_batch_sync,
+                prompts,
+                [32],
+                0.3,
+                None,
+                timeout=self.inference_timeout,
+                use_draft=False,
+            )
+
+    def _configure_cpu_threads(self):
+        """
+        Apply the CPU thread settings
+
+        Runs on the inference thread, which is where generation happens, so
+        the intra-op setting applies to every later generate call.
+        """
+        import torch
+
+        if self.cpu_threads > 0:
+            torch.set_num_threads(self.cpu_threads)
+        if self.cpu_interop_threads > 0:
+            try:
+                torch.set_num_interop_threads(self.cpu_interop_threads)
+            except RuntimeError as e:
+                # Only allowed before the first inter-op parallel work in the process
+                print(f"⚠️  Could not set inter-op threads: {e}")
+
+        print(f"CPU inference using {torch.get_num_threads()} intra-op / "
+              f"{torch.get_num_interop_threads()} inter-op threads")
 
     def _load_model(self):
         """Load model and tokenizer"""
@@ -52,16 +228,16 @@ class LocalMedGemma(MedGemmaBase):
 
             print(f"Loading MedGemma from {self.model_path}...")
 
-            # Configure quantization
+            # Configure quantization (bitsandbytes needs CUDA; CPU uses dynamic int8 below)
             quantization_config = None
-            if self.quantization == "4bit":
+            if self.device == "cuda" and self.quantization == "4bit":
                 quantization_config = BitsAndBytesConfig(
                     load_in_4bit=True,
                     bnb_4bit_compute_dtype=torch.float16,
                     bnb_4bit_use_double_quant=True,
                     bnb_4bit_quant_type="nf4"
                 )
-            elif self.quantization == "8bit":
+            elif self.device == "cuda" and self.quantization == "8bit":
                 quantization_config = BitsAndBytesConfig(load_in_8bit=True)
 
             # Load tokenizer
@@ -70,50 +246,399 @@ class LocalMedGemma(MedGemmaBase):
                 trust_remote_code=True
             )
 
-            # Load model
+            # Load model - safetensors weights are memory-mapped, and
+            # low_cpu_mem_usage skips the randomly initialised copy
             self.model = AutoModelForCausalLM.from_pretrained(
                 self.model_path,
                 quantization_config=quantization_config,
                 device_map="auto" if self.device == "cuda" else None,
                 trust_remote_code=True,
                 torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
+                low_cpu_mem_usage=self.mmap_weights,
             )
 
+            if self.device == "cpu" and self.quantization != "none":
+                self._quantize_for_cpu()
+
+            self.model.eval()
             print("MedGemma loaded successfully")
 
         except Exception as e:
             print(f"Error loading MedGemma: {e}")
             raise
 
-    async def generate(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.3) -> str:
-        """Generate response from local model"""
+    def _quantize_for_cpu(self):
+        """
+        Dynamic int8 quantisation of the linear layers
+
+        Weights are stored as int8 and activations are quantised on the fly,
+        so matmuls run on the int8 CPU kernels (fbgemm/onednn) at roughly a
+        quarter of the float32 weight memory. There is no 4-bit CPU kernel,
+        so "4bit" gets int8 too.
+        """
+        import torch
+
+        if self.quantization == "4bit":
+            print("⚠️  4bit quantization needs CUDA, using dynamic int8 on CPU")
+
+        # In place, so the float32 copy isn't kept alongside the int8 one
+        torch.ao.quantization.quantize_dynamic(
+            self.model,
+            {torch.nn.Linear},
+            dtype=torch.qint8,
+            inplace=True,
+        )
+        print("Applied dynamic int8 quantization to linear layers")
+
+    def _load_draft_model(self):
+        """
+        Load the draft model for assisted generation
+
+        Speculative decoding compares token ids, so the draft must use the
+        main model's vocabulary; otherwise it is disabled.
+        """
+        from transformers import AutoTokenizer, AutoModelForCausalLM
         import torch
 
+        try:
+            print(f"Loading draft model from {self.draft_model_path}...")
+            draft_tokenizer = AutoTokenizer.from_pretrained(self.draft_model_path, trust_remote_code=True)
+            if draft_tokenizer.get_vocab() != self.tokenizer.get_vocab():
+                raise ValueError("draft model tokenizer differs from the main model's")
+
+            draft = AutoModelForCausalLM.from_pretrained(
+                self.draft_model_path,
+                device_map="auto" if self.device == "cuda" else None,
+                trust_remote_code=True,
+                torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
+                low_cpu_mem_usage=self.mmap_weights,
+            )
+            if self.device == "cpu" and self.quantization != "none":
+                torch.ao.quantization.quantize_dynamic(draft, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+            draft.eval()
+
+            # Count forward passes to work out how many draft tokens were accepted
+            self.model.register_forward_hook(lambda *_: self._count_forward("target"))
+            draft.register_forward_hook(lambda *_: self._count_forward("draft"))
+
+            self.draft_model = draft
+            print(f"Speculative decoding enabled ({self.draft_num_tokens} draft tokens per step)")
+        except Exception as e:
+            print(f"⚠️  Speculative decoding disabled: {e}")
+            self.draft_model = None
+
+    def _count_forward(self, model: str):
+        self._forward_calls[model] += 1
+
+    def _record_assisted(self, generated_tokens: int, target_passes: int, draft_passes: int, seconds: float):
+        """
+        Update speculative decoding counters for one assisted generation
+
+        Every draft forward pass proposes one token and every target pass
+        emits exactly one token of its own (the correction or bonus token),
+        so whatever else was generated came from accepted draft tokens.
+        """
+        accepted = min(max(generated_tokens - target_passes, 0), draft_passes)
+        stats = self._draft_stats
+        stats["generations"] += 1
+        stats["generated_tokens"] += generated_tokens
+        stats["draft_tokens"] += draft_passes
+        stats["accepted_tokens"] += accepted
+        stats["target_passes"] += target_passes
+        stats["seconds"] += seconds
+
+    def _speculative_info(self) -> Optional[Dict]:
+        """Acceptance rate and measured speedup of speculative decoding"""
+        if self.draft_model_path is None:
+            return None
+
+        stats = self._draft_stats
+        info = {
+            "draft_model_path": self.draft_model_path,
+            "enabled": self.draft_model is not None,
+            "draft_num_tokens": self.draft_num_tokens,
+            **stats,
+            "acceptance_rate": None,
+            "tokens_per_target_pass": None,
+            "speedup": None,
+        }
+        if stats["draft_tokens"]:
+            info["acceptance_rate"] = stats["accepted_tokens"] / stats["draft_tokens"]
+        if stats["target_passes"]:
+            info["tokens_per_target_pass"] = stats["generated_tokens"] / stats["target_passes"]
+        if stats["generated_tokens"] and self._baseline_seconds_per_token:
+            # Versus the unassisted warmup run - per-token time, so prompt mix matters
+            info["speedup"] = self._baseline_seconds_per_token / (stats["seconds"] / stats["generated_tokens"])
+        return info
+
+    def _build_prefix_cache(self):
+        """Prefill each template's static prefix once and keep its past_key_values"""
+        import torch
+        from .prompts import PromptBuilder
+
+        try:
+            for prefix in PromptBuilder.static_prefixes():
+                prefix_ids = self.tokenizer(prefix, return_tensors="pt").input_ids.to(self.model.device)
+                with torch.no_grad():
+                    outputs = self.model(input_ids=prefix_ids, use_cache=True)
+                self._prefix_cache.append((prefix_ids[0], outputs.past_key_values))
+            print(f"Prefix KV cache ready for {len(self._prefix_cache)} prompt templates")
+        except Exception as e:
+            print(f"Prefix KV cache disabled: {e}")
+            self._prefix_cache = []
+
+    def _match_prefix(self, input_ids):
+        """
+        Return a private copy of the cached KV for the longest template prefix
+        that input_ids starts with, or None
+
+        Matching is done on token ids, so a prefix whose tokenisation differs
+        at the boundary simply isn't reused.
+        """
+        import torch
+
+        best = None
+        for prefix_ids, past_key_values in self._prefix_cache:
+            length = prefix_ids.shape[0]
+            if input_ids.shape[0] > length and torch.equal(input_ids[:length], prefix_ids):
+                if best is None or length > best[0]:
+                    best = (length, past_key_values)
+
+        if best is None:
+            self._prefix_stats["misses"] += 1
+            return None
+
+        self._prefix_stats["hits"] += 1
+        self._prefix_stats["reused_tokens"] += best[0]
+        # generate() extends the cache in place, so never hand out the original
+        return copy.deepcopy(best[1])
+
+    async def generate(
+        self,
+        prompt: str,
+        max_tokens: int = 2048,
+        temperature: float = 0.3,
+        stop: Optional[StopCondition] = None,
+    ) -> str:
+        """Generate response from local model (batched, on the inference worker thread)"""
+        if self.batcher is not None:
+            return await self.batcher.submit(prompt, max_tokens, temperature, stop)
+
+        outputs = await self._run_batch([prompt], [max_tokens], temperature, [stop])
+        return outputs[0][0]
+
+    async def _run_batch(
+        self,
+        prompts: List[str],
+        max_tokens: List[int],
+        temperature: float,
+        stops: Optional[List[Optional[StopCondition]]] = None,
+        cancelled: Optional[List[Optional[threading.Event]]] = None,
+    ) -> List[Tuple[str, int]]:
+        """Run one batched generation on the worker thread"""
+        return await self.executor.submit(
+            self._generate_batch_sync,
+            prompts,
+            max_tokens,
+            temperature,
+            stops,
+            timeout=self.inference_timeout,
+            cancelled=cancelled,
+        )
+
+    def count_tokens(self, text: str) -> int:
+        """Tokens in generated text, by the model tokenizer"""
+        if self.tokenizer is None:
+            return super().count_tokens(text)
+        return len(self.tokenizer(text, add_special_tokens=False).input_ids)
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        max_tokens: int = 2048,
+        temperature: float = 0.3,
+        stop: Optional[StopCondition] = None,
+    ) -> AsyncIterator[str]:
+        """Yield decoded text as the model generates it (bypasses batching)"""
+        from transformers import TextIteratorStreamer
+
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        job = asyncio.ensure_future(self.executor.submit(
+            self._generate_batch_sync,
+            [prompt],
+            [max_tokens],
+            temperature,
+            [stop],
+            timeout=self.inference_timeout,
+            streamer=streamer,
+        ))
+        # Unblock the reader if the job fails, times out or never starts
+        job.add_done_callback(lambda _: streamer.text_queue.put(streamer.stop_signal))
+
+        try:
+            while True:
+                text = await asyncio.to_thread(next, streamer, None)
+                if text is None:
+                    break
+                if text:
+                    yield text
+            await job
+        finally:
+            if not job.done():
+                job.cancel()
+
+    def _generate_batch_sync(
+        self,
+        prompts: List[str],
+        max_tokens: List[int],
+        temperature: float,
+        stops: Optional[List[Optional[StopCondition]]],
+        cancel_event,
+        cancelled: Optional[List[Optional[threading.Event]]] = None,
+        streamer=None,
+        use_draft: bool = True,
+    ) -> List[Tuple[str, int]]:
+        """
+        Blocking batched generation; stops early once cancel_event is set
+
+        cancelled holds an optional event per prompt, set when that caller
+        gives up; the batch ends as soon as every prompt is finished or
+        cancelled.
+
+        Prompts are left-padded so every sequence ends at the same position
+        and generation continues from the real last token of each prompt.
+        Each sequence finishes at its own token budget or stop condition, so
+        a short request in a batch doesn't decode up to the longest budget.
+        Single prompts use speculative decoding when a draft model is loaded
+        (assisted generation only supports a batch of one).
+
+        Returns:
+            (text, generated token count) per prompt
+        """
+        import torch
+        from transformers import StoppingCriteria, StoppingCriteriaList
+
+        tokenizer = self.tokenizer
+        stops = stops or [None] * len(prompts)
+        cancelled = cancelled or [None] * len(prompts)
+        eos_token_ids = self.model.generation_config.eos_token_id
+        if not isinstance(eos_token_ids, (list, tuple)):
+            eos_token_ids = [eos_token_ids]
+        eos_token_ids = {token_id for token_id in [*eos_token_ids, tokenizer.eos_token_id] if token_id is not None}
+
+        class CancelledCriteria(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs) -> bool:
+                return cancel_event.is_set()
+
+        class BudgetCriteria(StoppingCriteria):
+            """
+            Track where each sequence finishes: token budget, stop condition or EOS
+
+            generate() takes one bool for the whole batch (transformers 4.37),
+            so this returns True once every sequence has finished; sequences
+            that finish earlier keep decoding and are cut to their own length
+            afterwards. Stop conditions are checked on text decoded
+            incrementally - each step only re-decodes the tokens since the last
+            completed line (or the last DECODE_FLUSH_TOKENS tokens ending on a
+            whole character), not the whole generation.
+            """
+
+            def __init__(self):
+                self.finished = [False] * len(prompts)
+                self.lengths = list(max_tokens)  # generated tokens when each sequence finished
+                self.text = [""] * len(prompts)  # decoded generation up to line_start
+                self.line_start = [0] * len(prompts)
+
+            def __call__(self, input_ids, scores, **kwargs) -> bool:
+                for index, (row, limit, stop) in enumerate(zip(input_ids, max_tokens, stops)):
+                    if self.finished[index]:
+                        continue
+                    generated = row[prompt_length:]
+                    count = generated.shape[0]
+                    if count >= limit or (count and int(generated[-1]) in eos_token_ids):
+                        self.finished[index] = True
+                    elif cancelled[index] is not None and cancelled[index].is_set():
+                        self.finished[index] = True  # Caller gave up; free the batch sooner
+                    elif stop is not None:
+                        line = tokenizer.decode(generated[self.line_start[index]:], skip_special_tokens=True)
+                        if stop.find(self.text[index] + line) is not None:
+                            self.finished[index] = True
+                        elif line.endswith("\n") or (
+                            count - self.line_start[index] >= DECODE_FLUSH_TOKENS and not line.endswith("\ufffd")
+                        ):
+                            self.text[index] += line
+                            self.line_start[index] = count
+                    if self.finished[index]:
+                        self.lengths[index] = min(count, limit)
+                return all(self.finished)
+
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.tokenizer.padding_side = "left"
+
         # Tokenize input
-        inputs = self.tokenizer(prompt, return_tensors="pt")
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True)
+        prompt_length = inputs["input_ids"].shape[1]
 
         if self.device == "cuda":
             inputs = inputs.to("cuda")
 
+        assisted = use_draft and self.draft_model is not None and len(prompts) == 1
+        generate_options = {}
+        if assisted:
+            generate_options = {
+                "assistant_model": self.draft_model,
+                "num_assistant_tokens": self.draft_num_tokens,
+            }
+
+        # Single prompts start from the cached template prefix, so only the
+        # variable suffix is prefilled (left padding breaks alignment for batches).
+        # The draft model has no copy of that cache, so assisted runs prefill in full.
+        past_key_values = None
+        if len(prompts) == 1 and self._prefix_cache and not assisted:
+            past_key_values = self._match_prefix(inputs["input_ids"][0])
+
+        budget = BudgetCriteria()
+        calls_before = dict(self._forward_calls)
+        started = time.perf_counter()
+
         # Generate
         with torch.no_grad():
             outputs = self.model.generate(
                 **inputs,
-                max_new_tokens=max_tokens,
+                **generate_options,
+                past_key_values=past_key_values,
+                max_new_tokens=max(max_tokens),
                 temperature=temperature,
                 do_sample=True,
                 top_p=0.9,
                 repetition_penalty=1.1,
+                pad_token_id=self.tokenizer.pad_token_id,
+                stopping_criteria=StoppingCriteriaList([CancelledCriteria(), budget]),
+                streamer=streamer,
             )
 
-        # Decode response
-        response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+        # Decode only the newly generated tokens, up to where each sequence finished
+        # (finished rows keep decoding alongside the others when there is no EOS padding)
+        results = []
+        for sequence, length in zip(outputs, budget.lengths):
+            new_tokens = sequence[prompt_length:prompt_length + length]
+            token_count = int((new_tokens != self.tokenizer.pad_token_id).sum())
+            text = self.tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
+            results.append((text, token_count))
 
-        # Remove the prompt from response
-        if response.startswith(prompt):
-            response = response[len(prompt):].strip()
+        elapsed = time.perf_counter() - started
+        if assisted:
+            self._record_assisted(
+                results[0][1],
+                self._forward_calls["target"] - calls_before["target"],
+                self._forward_calls["draft"] - calls_before["draft"],
+                elapsed,
+            )
+        elif self.draft_model is not None and len(prompts) == 1 and results[0][1]:
+            self._baseline_seconds_per_token = elapsed / results[0][1]
 
-        return response
+        return results
 
     def get_model_info(self) -> Dict:
         """Get model information"""
@@ -122,61 +647,177 @@ class LocalMedGemma(MedGemmaBase):
             "model_path": self.model_path,
             "device": self.device,
             "quantization": self.quantization,
-            "model_name": "MedGemma-1.5"
+            "model_name": "MedGemma-1.5",
+            "cpu_profile": self._cpu_profile(),
+            "speculative_decoding": self._speculative_info(),
+            "queue_depth": self.executor.queue_depth + (self.batcher.pending if self.batcher else 0),
+            "batching": self.batcher.get_metrics() if self.batcher else None,
+            "prefix_cache": {"templates": len(self._prefix_cache), **self._prefix_stats}
         }
 
+    def _cpu_profile(self) -> Optional[Dict]:
+        """Effective CPU inference settings (None on CUDA)"""
+        if self.device != "cpu":
+            return None
+
+        profile = {
+            "quantization": "none" if self.quantization == "none" else "dynamic_int8",
+            "mmap_weights": self.mmap_weights,
+            "intra_op_threads": self.cpu_threads or None,
+            "inter_op_threads": self.cpu_interop_threads or None,
+        }
+        if self.model is not None:
+            import torch
+            profile["intra_op_threads"] = torch.get_num_threads()
+            profile["inter_op_threads"] = torch.get_num_interop_threads()
+        return profile
+
+    async def close(self):
+        """Stop the batch scheduler and inference worker"""
+        if self.batcher is not None:
+            await self.batcher.close()
+        self.executor.shutdown()
+
 
 class APIMedGemma(MedGemmaBase):
     """Remote MedGemma inference via API"""
 
-    def __init__(self, endpoint: str, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        endpoint: Optional[str] = None,
+        endpoints: Optional[List[Tuple[str, int]]] = None,
+        routing: str = "least_outstanding",
+        health_check_path: str = "/health",
+        health_check_interval: float = 15.0,
+        client: Optional[ResilientHTTPClient] = None,
+        **client_options,
+    ):
         """
         Initialize API-based MedGemma
 
         Args:
-            endpoint: API endpoint URL
             api_key: API authentication key
+            endpoint: Single API endpoint URL
+            endpoints: Pool of (url, weight) pairs; takes precedence over endpoint
+            routing: "least_outstanding" or "latency"
+            health_check_path: Path probed on each endpoint ("" disables active checks)
+            client: Pre-built HTTP client for a single endpoint (e.g. wired to a stub transport)
+            client_options: ResilientHTTPClient settings (pool limits, retries, circuit breaker)
         """
-        self.endpoint = endpoint
+        endpoints = endpoints or [(endpoint, 1)]
+        self.endpoint = endpoints[0][0]
         self.api_key = api_key
-        self.client = httpx.AsyncClient(timeout=300.0)  # 5 minute timeout
 
-    async def generate(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.3) -> str:
-        """Generate response from API"""
-        try:
-            response = await self.client.post(
-                self.endpoint,
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "prompt": prompt,
-                    "max_tokens": max_tokens,
-                    "temperature": temperature,
-                    "model": "medgemma-1.5",
-                }
-            )
+        # One client per endpoint so concurrency limits and circuit breakers are per server
+        if client is not None and len(endpoints) == 1:
+            clients = [client]
+        else:
+            clients = [ResilientHTTPClient(**client_options) for _ in endpoints]
+
+        self.pool = EndpointPool(
+            [Endpoint(url, weight, c) for (url, weight), c in zip(endpoints, clients)],
+            routing=routing,
+            health_check_path=health_check_path,
+            health_check_interval=health_check_interval,
+        )
 
-            response.raise_for_status()
-            data = response.json()
+    async def generate(
+        self,
+        prompt: str,
+        max_tokens: int = 2048,
+        temperature: float = 0.3,
+        stop: Optional[StopCondition] = None,
+    ) -> str:
+        """
+        Generate response from API, failing over between endpoints
 
-            return data.get("response", data.get("text", ""))
+        Raises:
+            MedGemmaAPIError: (or a subclass) once every endpoint has failed or the request was rejected
+        """
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+        payload = {
+            "prompt": prompt,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "model": "medgemma-1.5",
+        }
+        if stop is not None and stop.stop_sequences:
+            payload["stop"] = list(stop.stop_sequences)
 
-        except httpx.HTTPError as e:
-            raise Exception(f"MedGemma API error: {str(e)}")
+        data = await self.pool.call(
+            lambda endpoint: endpoint.client.post_json(endpoint.url, headers, payload)
+        )
+
+        return data.get("response", data.get("text", ""))
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        max_tokens: int = 2048,
+        temperature: float = 0.3,
+        stop: Optional[StopCondition] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Stream response from API (SSE "data:" events or plain chunked text)
+
+        Fails over to another endpoint only before the response starts.
+        Closing the generator early (e.g. at a stop point) closes the stream.
+        """
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+        }
+        payload = {
+            "prompt": prompt,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "model": "medgemma-1.5",
+            "stream": True,
+        }
+        if stop is not None and stop.stop_sequences:
+            payload["stop"] = list(stop.stop_sequences)
+
+        async with self.pool.open(
+            lambda endpoint: endpoint.client.stream(endpoint.url, headers, payload)
+        ) as response:
+            if not response.headers.get("content-type", "").startswith("text/event-stream"):
+                async for text in response.aiter_text():
+                    if text:
+                        yield text
+                return
+
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                try:
+                    data = json.loads(payload)
+                except ValueError:
+                    yield payload
+                    continue
+                text = data.get("token", data.get("text", data.get("response", "")))
+                if text:
+                    yield text
 
     def get_model_info(self) -> Dict:
         """Get model information"""
         return {
             "type": "api",
             "endpoint": self.endpoint,
-            "model_name": "MedGemma-1.5"
+            "model_name": "MedGemma-1.5",
+            "load_balancing": self.pool.get_stats()
         }
 
     async def close(self):
-        """Close HTTP client"""
-        await self.client.aclose()
+        """Stop health checks and close HTTP clients"""
+        await self.pool.close()
 
 
 class MedGemmaEngine:
@@ -185,56 +826,213 @@ class MedGemmaEngine:
     Automatically switches based on configuration
     """
 
-    def __init__(self):
-        """Initialize MedGemma engine based on settings"""
+    def __init__(self, engine: Optional[MedGemmaBase] = None):
+        """
+        Initialize MedGemma engine based on settings
+
+        Args:
+            engine: Pre-built inference backend (benchmarks, stubs); chosen from settings when omitted
+        """
         self.settings = get_settings()
-        self.engine: Optional[MedGemmaBase] = None
-        self._initialize_engine()
+        self.engine: Optional[MedGemmaBase] = engine
+        if self.engine is None:
+            self._initialize_engine()
+
+        # Model lifecycle - weights load in the background after start_loading()
+        self.state = EngineState.LOADING
+        self.state_error: Optional[str] = None
+        self._state_changed_at = time.time()
+        self._load_seconds: Optional[float] = None
+        self._load_task: Optional[asyncio.Task] = None
+        self._settled: Optional[asyncio.Event] = None
+
+        # Persistent prompt/response cache
+        self.result_cache = None
+        if self.settings.medgemma_cache_enabled:
+            from .cache import ResultCache
+            self.result_cache = ResultCache(
+                ttl_seconds=self.settings.medgemma_cache_ttl_seconds,
+                max_entries=self.settings.medgemma_cache_max_entries
+            )
 
     def _initialize_engine(self):
         """Initialize appropriate engine based on mode"""
         import os
         config = self.settings.medgemma_config
 
-        if config["type"] == "local":
+        if self.settings.medgemma_use_mock:
+            print("Using Mock MedGemma (MEDGEMMA_USE_MOCK)...")
+            from .mock_engine import MockMedGemma
+            self.engine = MockMedGemma(**self.settings.medgemma_mock_config)
+        elif config["type"] == "local":
             # Check if model files exist, otherwise use mock
             model_path = config["model_path"]
             if not os.path.exists(model_path):
                 print(f"⚠️  Model path {model_path} not found. Using Mock MedGemma for development...")
                 from .mock_engine import MockMedGemma
-                self.engine = MockMedGemma()
+                self.engine = MockMedGemma(**self.settings.medgemma_mock_config)
             else:
                 print("Initializing local MedGemma engine...")
                 self.engine = LocalMedGemma(
                     model_path=config["model_path"],
                     device=config["device"],
-                    quantization=config["quantization"]
+                    quantization=config["quantization"],
+                    inference_timeout=config["inference_timeout"],
+                    max_queue_size=config["max_queue_size"],
+                    max_batch_size=config["max_batch_size"],
+                    batch_window=config["batch_window_ms"] / 1000,
+                    prefix_cache=config["prefix_cache"],
+                    cpu_threads=config["cpu_threads"],
+                    cpu_interop_threads=config["cpu_interop_threads"],
+                    mmap_weights=config["mmap_weights"],
+                    draft_model_path=config["draft_model_path"],
+                    draft_num_tokens=config["draft_num_tokens"]
                 )
         elif config["type"] == "api":
             print("Initializing API MedGemma engine...")
             self.engine = APIMedGemma(
-                endpoint=config["endpoint"],
-                api_key=config["api_key"]
+                api_key=config["api_key"],
+                endpoints=config["endpoints"],
+                routing=config["routing"],
+                health_check_path=config["health_check_path"],
+                health_check_interval=config["health_check_interval"],
+                **config["client"]
             )
         else:
             raise ValueError(f"Unknown MedGemma type: {config['type']}")
 
+    def _set_state(self, state: EngineState):
+        self.state = state
+        self._state_changed_at = time.time()
+
+    def start_loading(self):
+        """Load and warm up the model in the background; safe to call repeatedly"""
+        if self._load_task is None:
+            self._settled = asyncio.Event()
+            self._load_task = asyncio.create_task(self._load())
+
+    async def _load(self):
+        started = time.time()
+        try:
+            if isinstance(self.engine, MedGemmaBase):
+                self._set_state(EngineState.LOADING)
+                await self.engine.load()
+                self._set_state(EngineState.WARMING)
+                await self.engine.warmup()
+            self._load_seconds = time.time() - started
+            self._set_state(EngineState.READY)
+            print(f"MedGemma ready after {self._load_seconds:.1f}s")
+        except Exception as e:
+            self.state_error = str(e)
+            self._set_state(EngineState.FAILED)
+            print(f"Error loading MedGemma: {e}")
+        finally:
+            self._settled.set()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == EngineState.READY
+
+    async def wait_until_ready(self):
+        """
+        Wait for the model to finish loading (starting the load if needed)
+
+        Raises:
+            RuntimeError: if loading failed
+        """
+        self.start_loading()
+        await self._settled.wait()
+        if self.state == EngineState.FAILED:
+            raise RuntimeError(f"MedGemma failed to load: {self.state_error}")
+
+    def get_status(self) -> Dict:
+        """Lifecycle state for health and readiness checks"""
+        return {
+            "state": self.state.value,
+            "since": self._state_changed_at,
+            "load_seconds": self._load_seconds,
+            "error": self.state_error,
+        }
+
+    async def _cache_lookup(
+        self,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        use_cache: bool,
+        stop: Optional[StopCondition] = None,
+    ):
+        """
+        Return (cache key, cached response); the key is None when caching is off
+
+        With use_cache=False the lookup is skipped but the key is still returned,
+        so the fresh response replaces any cached one.
+        """
+        if self.result_cache is None:
+            return None, None
+
+        key = self.result_cache.make_key(prompt, self.engine.get_model_info(), max_tokens, temperature, stop)
+        if not use_cache:
+            return key, None
+        try:
+            return key, await self.result_cache.get(key)
+        except Exception as e:
+            print(f"Result cache lookup failed: {e}")
+            return key, None
+
+    async def _cache_store(self, key: Optional[str], response: str):
+        """Store a successful response; cache failures never fail the analysis"""
+        if key is None or not response:
+            return
+        try:
+            await self.result_cache.put(key, response, self.engine.get_model_info().get("model_name"))
+        except Exception as e:
+            print(f"Result cache store failed: {e}")
+
+    def _generation_usage(self, response: str, max_tokens: int, stopped: bool, cached: bool) -> Dict:
+        """Token budget usage of a response and why generation ended"""
+        tokens = self.engine.count_tokens(response)
+        if cached:
+            reason = "cached"
+        elif stopped:
+            reason = "stop"
+        elif tokens >= max_tokens:
+            reason = "max_tokens"
+        else:
+            reason = "eos"
+        return {"max_tokens": max_tokens, "tokens_generated": tokens, "stop_reason": reason}
+
     async def analyze(
         self,
         prompt: str,
         max_tokens: int = 2048,
         temperature: float = 0.3,
+        use_cache: bool = True,
+        stop: Optional[StopCondition] = None,
     ) -> Dict:
         """
         Perform analysis using MedGemma
 
+        Args:
+            use_cache: Return a cached response for an identical request, if any
+            stop: End generation once the report is complete (see PromptBuilder.generation_profile)
+
         Returns:
-            Dict with response, metadata, and timing
+            Dict with response, metadata, timing and token budget usage ("generation")
         """
         start_time = time.time()
 
         try:
-            response = await self.engine.generate(prompt, max_tokens, temperature)
+            cache_key, response = await self._cache_lookup(prompt, max_tokens, temperature, use_cache, stop)
+            cached = response is not None
+            stopped = False
+
+            if not cached:
+                await self.wait_until_ready()
+                response = await self.engine.generate(prompt, max_tokens, temperature, stop)
+                if stop is not None:
+                    response, stopped = stop.truncate(response)
+                await self._cache_store(cache_key, response)
 
             processing_time = time.time() - start_time
 
@@ -243,6 +1041,8 @@ class MedGemmaEngine:
                 "prompt": prompt,
                 "processing_time": processing_time,
                 "model_info": self.engine.get_model_info(),
+                "generation": self._generation_usage(response, max_tokens, stopped, cached),
+                "cached": cached,
                 "status": "success"
             }
 
@@ -254,19 +1054,122 @@ class MedGemmaEngine:
                 "processing_time": processing_time,
                 "model_info": self.engine.get_model_info(),
                 "status": "error",
-                "error": str(e)
+                "error": str(e),
+                "error_type": type(e).__name__
             }
 
+    async def analyze_stream(
+        self,
+        prompt: str,
+        max_tokens: int = 2048,
+        temperature: float = 0.3,
+        use_cache: bool = True,
+        stop: Optional[StopCondition] = None,
+    ) -> AsyncIterator[Dict]:
+        """
+        Perform analysis, yielding text as it is generated
+
+        With a stop condition, the last stop.holdback characters are held
+        back until it is clear they don't start a stop point, and the stream
+        is closed as soon as one is found.
+
+        Yields:
+            {"type": "token", "text": ...} per chunk, then one final event with
+            type "result" and the same fields as analyze() plus time_to_first_token
+        """
+        start_time = time.time()
+        time_to_first_token = None
+        stopped = False
+
+        try:
+            cache_key, response = await self._cache_lookup(prompt, max_tokens, temperature, use_cache, stop)
+            cached = response is not None
+
+            if cached:
+                time_to_first_token = time.time() - start_time
+                yield {"type": "token", "text": response}
+            else:
+                await self.wait_until_ready()
+                generated = ""
+                emitted = 0
+                holdback = stop.holdback if stop is not None else 0
+
+                stream = self.engine.generate_stream(prompt, max_tokens, temperature, stop)
+                async with aclosing(stream):
+                    async for text in stream:
+                        generated += text
+                        cut = stop.find(generated) if stop is not None else None
+                        end = cut if cut is not None else len(generated) - holdback
+                        if end > emitted:
+                            if time_to_first_token is None:
+                                time_to_first_token = time.time() - start_time
+                            yield {"type": "token", "text": generated[emitted:end]}
+                            emitted = end
+                        if cut is not None:
+                            stopped = True
+                            generated = generated[:cut]
+                            break
+
+                if emitted < len(generated):
+                    yield {"type": "token", "text": generated[emitted:]}
+
+                response = generated.strip()
+                await self._cache_store(cache_key, response)
+
+            yield {
+                "type": "result",
+                "response": response,
+                "prompt": prompt,
+                "processing_time": time.time() - start_time,
+                "time_to_first_token": time_to_first_token,
+                "model_info": self.engine.get_model_info(),
+                "generation": self._generation_usage(response, max_tokens, stopped, cached),
+                "cached": cached,
+                "status": "success"
+            }
+
+        except Exception as e:
+            yield {
+                "type": "result",
+                "response": "",
+                "prompt": prompt,
+                "processing_time": time.time() - start_time,
+                "time_to_first_token": time_to_first_token,
+                "model_info": self.engine.get_model_info(),
+                "status": "error",
+                "error": str(e),
+                "error_type": type(e).__name__
+            }
+
+    async def invalidate_cache(
+        self,
+        prompt: Optional[str] = None,
+        max_tokens: int = 2048,
+        temperature: float = 0.3,
+        stop: Optional[StopCondition] = None,
+    ) -> int:
+        """Drop the cached response for one request, or the whole cache when prompt is None"""
+        if self.result_cache is None:
+            return 0
+        key = None
+        if prompt is not None:
+            key = self.result_cache.make_key(prompt, self.engine.get_model_info(), max_tokens, temperature, stop)
+        return await self.result_cache.invalidate(key)
+
     def get_info(self) -> Dict:
         """Get engine information"""
         return {
             "mode": self.settings.mode,
-            **self.engine.get_model_info()
+            "lifecycle": self.get_status(),
+            **self.engine.get_model_info(),
+            "result_cache": self.result_cache.get_stats() if self.result_cache else None
         }
 
     async def close(self):
         """Cleanup resources"""
-        if isinstance(self.engine, APIMedGemma):
+        if self._load_task is not None:
+            self._load_task.cancel()
+        if isinstance(self.engine, MedGemmaBase):
             await self.engine.close()
 
 
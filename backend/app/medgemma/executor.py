@@ -0,0 +1,100 @@
+"""
+Inference Executor
+Runs blocking model calls on a dedicated worker thread so the event loop stays responsive
+"""
+import asyncio
+import queue
+import threading
+from typing import Any, Callable, Optional
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the inference request queue is at capacity"""
+
+
+def _resolve(future: asyncio.Future, result: Any = None, error: Optional[BaseException] = None):
+    """Complete a future from the loop thread unless it was already cancelled"""
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class InferenceExecutor:
+    """
+    Single worker thread with a FIFO request queue
+
+    Each submitted callable receives a `cancel_event` keyword argument; it is
+    set when the caller is cancelled or times out, and long-running work
+    (e.g. token generation) should poll it and stop early.
+    """
+
+    def __init__(self, name: str = "medgemma-inference", max_queue_size: int = 0):
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._busy = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        """Worker loop - executes jobs one at a time"""
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+
+            func, args, kwargs, cancel_event, loop, future = job
+            if cancel_event.is_set():
+                continue  # Caller gave up while the job was queued
+
+            self._busy = True
+            try:
+                result = func(*args, cancel_event=cancel_event, **kwargs)
+            except BaseException as e:
+                loop.call_soon_threadsafe(_resolve, future, None, e)
+            else:
+                loop.call_soon_threadsafe(_resolve, future, result)
+            finally:
+                self._busy = False
+
+    async def submit(
+        self,
+        func: Callable[..., Any],
+        *args,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ) -> Any:
+        """
+        Queue func for the worker thread and await its result
+
+        Raises:
+            InferenceQueueFull: if the queue is at capacity
+            TimeoutError: if the job doesn't finish within timeout seconds
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        cancel_event = threading.Event()
+
+        try:
+            self._queue.put_nowait((func, args, kwargs, cancel_event, loop, future))
+        except queue.Full:
+            raise InferenceQueueFull("Inference queue is full, try again later")
+
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            cancel_event.set()
+            raise TimeoutError(f"Inference timed out after {timeout:g}s")
+        except asyncio.CancelledError:
+            cancel_event.set()
+            raise
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of jobs waiting or running"""
+        return self._queue.qsize() + (1 if self._busy else 0)
+
+    def shutdown(self):
+        """Stop the worker after queued jobs finish"""
+        self._queue.put(None)
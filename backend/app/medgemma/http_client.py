@@ -0,0 +1,328 @@
+"""
+Resilient HTTP Client
+Pooled, concurrency-limited httpx client with retries and a circuit breaker for the MedGemma API
+"""
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+
+# Status codes worth retrying - rate limiting and transient server failures
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class MedGemmaAPIError(Exception):
+    """Base error for MedGemma API requests"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class MedGemmaAPIRateLimited(MedGemmaAPIError):
+    """The API kept answering 429 after all retries"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message, status_code=429)
+        self.retry_after = retry_after
+
+
+class MedGemmaAPIUnavailable(MedGemmaAPIError):
+    """Server errors or connection failures persisted after all retries"""
+
+
+class MedGemmaAPITimeout(MedGemmaAPIError):
+    """The API did not respond within the read timeout"""
+
+
+class MedGemmaAPICircuitOpen(MedGemmaAPIError):
+    """Requests are being rejected locally while the API recovers"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message, status_code=503)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    closed:    requests flow; failure_threshold consecutive failures open it
+    open:      requests fail fast until reset_timeout has passed
+    half_open: a single probe request is let through; success closes the
+               circuit, failure opens it again
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._stats = {"opened": 0, "rejected": 0}
+
+    def before_request(self):
+        """Raise MedGemmaAPICircuitOpen if the request must not be sent"""
+        if self.state == "open":
+            remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+            if remaining > 0:
+                self._stats["rejected"] += 1
+                raise MedGemmaAPICircuitOpen(
+                    f"MedGemma API circuit open, retry in {remaining:.0f}s", retry_after=remaining
+                )
+            self.state = "half_open"
+
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                self._stats["rejected"] += 1
+                raise MedGemmaAPICircuitOpen(
+                    "MedGemma API circuit half-open, probe in progress", retry_after=1.0
+                )
+            self._probe_in_flight = True
+
+    @property
+    def rejecting(self) -> bool:
+        """True while open and still inside reset_timeout"""
+        return self.state == "open" and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def record_success(self):
+        self.state = "closed"
+        self._failures = 0
+        self._probe_in_flight = False
+
+    def abandon_probe(self):
+        """Forget a probe that ended without an outcome (e.g. cancelled)"""
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self._failures += 1
+        self._probe_in_flight = False
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                self._stats["opened"] += 1
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def get_stats(self) -> Dict:
+        return {"state": self.state, "consecutive_failures": self._failures, **self._stats}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class ResilientHTTPClient:
+    """
+    httpx.AsyncClient wrapper for the MedGemma API
+
+    - Connection pool with keep-alive and optional HTTP/2
+    - At most max_concurrency requests in flight; the rest wait for a slot
+    - Retries on 429/5xx and connection errors with full-jitter exponential
+      backoff, honouring Retry-After
+    - Circuit breaker so a failing endpoint is rejected fast instead of
+      tying up every caller for the full timeout
+
+    Pass `transport` (e.g. httpx.MockTransport) to run against a local stub.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 300.0,
+        connect_timeout: float = 10.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        http2: bool = True,
+        max_concurrency: int = 8,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        circuit_failure_threshold: int = 5,
+        circuit_reset_timeout: float = 30.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("⚠️  h2 not installed, MedGemma API client falling back to HTTP/1.1")
+                http2 = False
+
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            http2=http2,
+            transport=transport,
+        )
+        self.http2 = http2
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(circuit_failure_threshold, circuit_reset_timeout)
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = 0
+        self._stats = {"requests": 0, "retries": 0, "failures": 0}
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        """Delay before retry number attempt (0-based)"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    @asynccontextmanager
+    async def _slot(self):
+        """Hold one of the max_concurrency request slots"""
+        async with self._semaphore:
+            self._in_flight += 1
+            try:
+                yield
+            finally:
+                self._in_flight -= 1
+
+    @asynccontextmanager
+    async def _attempt(self, acquire: bool = True):
+        """Gate one request attempt on the circuit breaker (and a slot, if acquire)"""
+        self.breaker.before_request()
+        try:
+            if acquire:
+                async with self._slot():
+                    yield
+            else:
+                yield
+        except BaseException:
+            self.breaker.abandon_probe()
+            raise
+
+    def _classify(self, response: Optional[httpx.Response], error: Optional[Exception]) -> MedGemmaAPIError:
+        """Map a final failed attempt to a typed error"""
+        if isinstance(error, httpx.TimeoutException) and not isinstance(error, httpx.ConnectTimeout):
+            return MedGemmaAPITimeout(f"MedGemma API timed out: {error}")
+        if error is not None:
+            return MedGemmaAPIUnavailable(f"MedGemma API unreachable: {error}")
+        if response.status_code == 429:
+            return MedGemmaAPIRateLimited(
+                "MedGemma API rate limit exceeded",
+                retry_after=parse_retry_after(response.headers.get("retry-after")),
+            )
+        if response.status_code >= 500:
+            return MedGemmaAPIUnavailable(
+                f"MedGemma API error {response.status_code}", status_code=response.status_code
+            )
+        return MedGemmaAPIError(
+            f"MedGemma API rejected request ({response.status_code}): {response.text[:200]}",
+            status_code=response.status_code,
+        )
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        stream: bool = False,
+        acquire: bool = True,
+        **kwargs,
+    ) -> httpx.Response:
+        """
+        Send with retries; returns the first successful (2xx-3xx) response
+
+        Streamed responses are returned open - the caller must close them.
+        Pass acquire=False when the caller already holds a slot.
+        """
+        self._stats["requests"] += 1
+
+        for attempt in range(self.max_retries + 1):
+            response, error = None, None
+            async with self._attempt(acquire):
+                try:
+                    request = self.client.build_request(method, url, **kwargs)
+                    response = await self.client.send(request, stream=stream)
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    error = e
+
+            if error is None and response.status_code < 400:
+                self.breaker.record_success()
+                return response
+
+            if response is not None and stream:
+                await response.aread()
+                await response.aclose()
+
+            # Read timeouts mean the model is slow, not down - don't multiply the wait
+            read_timeout = isinstance(error, httpx.TimeoutException) and not isinstance(error, httpx.ConnectTimeout)
+            server_side = error is not None or response.status_code >= 500
+            if server_side:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()  # 4xx - the endpoint itself is up
+
+            retryable = not read_timeout and (error is not None or response.status_code in RETRYABLE_STATUS_CODES)
+            retry_after = parse_retry_after(response.headers.get("retry-after")) if response is not None else None
+            if not retryable or attempt == self.max_retries or (retry_after or 0) > self.backoff_max:
+                self._stats["failures"] += 1
+                raise self._classify(response, error)
+
+            self._stats["retries"] += 1
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+
+    async def post_json(self, url: str, headers: Dict, payload: Dict) -> Dict:
+        """POST a JSON body and return the decoded JSON response"""
+        response = await self._send("POST", url, headers=headers, json=payload)
+        try:
+            return response.json()
+        except ValueError:
+            raise MedGemmaAPIError("MedGemma API returned invalid JSON", status_code=response.status_code)
+
+    @asynccontextmanager
+    async def stream(self, url: str, headers: Dict, payload: Dict) -> AsyncIterator[httpx.Response]:
+        """
+        POST and yield the open streaming response
+
+        Retries only happen before the response starts; a stream that breaks
+        midway raises MedGemmaAPIUnavailable. Holds a concurrency slot for
+        the whole stream.
+        """
+        async with self._slot():
+            response = await self._send(
+                "POST", url, stream=True, acquire=False, headers=headers, json=payload
+            )
+            try:
+                yield response
+            except httpx.HTTPError as e:
+                raise MedGemmaAPIUnavailable(f"MedGemma API stream interrupted: {e}")
+            finally:
+                await response.aclose()
+
+    def get_stats(self) -> Dict:
+        """Request, retry and circuit breaker statistics"""
+        return {
+            **self._stats,
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "http2": self.http2,
+            "circuit": self.breaker.get_stats(),
+        }
+
+    async def aclose(self):
+        await self.client.aclose()
+
@@ -0,0 +1,228 @@
+"""
+Endpoint Load Balancing
+Routes online inference across a weighted pool of MedGemma endpoints with health checks and failover
+"""
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncContextManager, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Set, TypeVar
+from urllib.parse import urljoin
+
+import httpx
+
+from .http_client import (
+    MedGemmaAPICircuitOpen,
+    MedGemmaAPIRateLimited,
+    MedGemmaAPIUnavailable,
+    ResilientHTTPClient,
+)
+
+# Errors that mean "this endpoint can't serve the request right now" - try another.
+# Timeouts and 4xx rejections are not retried elsewhere: the request itself is the problem.
+FAILOVER_ERRORS = (MedGemmaAPIUnavailable, MedGemmaAPICircuitOpen, MedGemmaAPIRateLimited)
+
+T = TypeVar("T")
+
+
+class Endpoint:
+    """One inference server and its routing state"""
+
+    def __init__(self, url: str, weight: int, client: ResilientHTTPClient):
+        self.url = url
+        self.weight = max(weight, 1)
+        self.client = client
+        self.outstanding = 0
+        self.latency: Optional[float] = None  # EWMA of successful request durations
+        self.healthy = True  # Last active health check result
+        self._stats = {"requests": 0, "failures": 0}
+
+    @property
+    def available(self) -> bool:
+        """Healthy and not rejected by its circuit breaker"""
+        return self.healthy and not self.client.breaker.rejecting
+
+    def record_latency(self, seconds: float, alpha: float = 0.3):
+        self.latency = seconds if self.latency is None else alpha * seconds + (1 - alpha) * self.latency
+
+    def get_stats(self) -> Dict:
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "healthy": self.healthy,
+            "available": self.available,
+            "outstanding": self.outstanding,
+            "latency_seconds": self.latency,
+            **self._stats,
+            "http": self.client.get_stats(),
+        }
+
+
+class EndpointPool:
+    """
+    Weighted endpoint pool
+
+    Routing:
+        least_outstanding - fewest in-flight requests per unit of weight
+        latency           - lowest measured latency, scaled by load and weight
+
+    Endpoints are taken out of rotation when their circuit breaker opens
+    (passive) or a health check fails (active), and put back once the
+    breaker's probe or a later health check succeeds. call() fails over to
+    the next best endpoint on FAILOVER_ERRORS.
+    """
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        routing: str = "least_outstanding",
+        health_check_path: str = "/health",
+        health_check_interval: float = 15.0,
+        health_check_timeout: float = 5.0,
+    ):
+        if not endpoints:
+            raise ValueError("At least one MedGemma API endpoint is required")
+        if routing not in ("least_outstanding", "latency"):
+            raise ValueError(f"Unknown routing strategy: {routing}")
+
+        self.endpoints = endpoints
+        self.routing = routing
+        self.health_check_path = health_check_path
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+
+        self._health_task: Optional[asyncio.Task] = None
+        self._stats = {"failovers": 0, "exhausted": 0}
+
+    def _score(self, endpoint: Endpoint) -> float:
+        load = (endpoint.outstanding + 1) / endpoint.weight
+        if self.routing == "latency":
+            # Unmeasured endpoints score as the fastest so they get sampled
+            return (endpoint.latency or 0.0) * load
+        return load
+
+    def choose(self, exclude: Optional[Set[str]] = None) -> Optional[Endpoint]:
+        """Best available endpoint not in exclude; ties are broken by weighted random choice"""
+        exclude = exclude or set()
+        candidates = [e for e in self.endpoints if e.url not in exclude and e.available]
+        if not candidates:
+            # Everything is out of rotation - health checks may be stale, so
+            # still try endpoints whose circuit breaker would let a request through
+            candidates = [e for e in self.endpoints if e.url not in exclude and not e.client.breaker.rejecting]
+        if not candidates:
+            return None
+
+        best = min(self._score(e) for e in candidates)
+        tied = [e for e in candidates if self._score(e) == best]
+        return random.choices(tied, weights=[e.weight for e in tied])[0]
+
+    @asynccontextmanager
+    async def track(self, endpoint: Endpoint):
+        """Count a request against an endpoint and record its outcome"""
+        endpoint.outstanding += 1
+        endpoint._stats["requests"] += 1
+        started = time.monotonic()
+        try:
+            yield endpoint
+        except BaseException:
+            endpoint._stats["failures"] += 1
+            raise
+        else:
+            endpoint.record_latency(time.monotonic() - started)
+        finally:
+            endpoint.outstanding -= 1
+
+    def _route(self) -> Iterator[Endpoint]:
+        """Yield endpoints best-first, each at most once"""
+        self._ensure_health_checks()
+        tried: Set[str] = set()
+
+        while True:
+            endpoint = self.choose(exclude=tried)
+            if endpoint is None:
+                return
+            if tried:
+                self._stats["failovers"] += 1
+            tried.add(endpoint.url)
+            yield endpoint
+
+    def _exhausted(self, last_error: Optional[Exception]) -> Exception:
+        self._stats["exhausted"] += 1
+        return last_error or MedGemmaAPIUnavailable("No healthy MedGemma API endpoints")
+
+    async def call(self, func: Callable[[Endpoint], Awaitable[T]]) -> T:
+        """Run func against the best endpoint, failing over to the others on FAILOVER_ERRORS"""
+        last_error: Optional[Exception] = None
+
+        for endpoint in self._route():
+            try:
+                async with self.track(endpoint):
+                    return await func(endpoint)
+            except FAILOVER_ERRORS as e:
+                last_error = e
+
+        raise self._exhausted(last_error)
+
+    @asynccontextmanager
+    async def open(self, func: Callable[[Endpoint], AsyncContextManager[T]]) -> AsyncIterator[T]:
+        """
+        Enter func's context on the best endpoint (e.g. a streaming response)
+
+        Fails over like call() until the context is entered; errors after
+        that (a stream breaking midway) propagate, since output was already used.
+        """
+        last_error: Optional[Exception] = None
+
+        for endpoint in self._route():
+            entered = False
+            try:
+                async with self.track(endpoint):
+                    async with func(endpoint) as value:
+                        entered = True
+                        yield value
+                return
+            except FAILOVER_ERRORS as e:
+                if entered:
+                    raise
+                last_error = e
+
+        raise self._exhausted(last_error)
+
+    def _ensure_health_checks(self):
+        """Start the background health checker on first use"""
+        if self._health_task is None and self.health_check_path and self.health_check_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.gather(*(self._check(e) for e in self.endpoints))
+            await asyncio.sleep(self.health_check_interval)
+
+    async def _check(self, endpoint: Endpoint):
+        """GET the endpoint's health URL; any 2xx/3xx counts as healthy"""
+        url = urljoin(endpoint.url, self.health_check_path)
+        try:
+            response = await endpoint.client.client.get(url, timeout=self.health_check_timeout)
+            healthy = response.status_code < 400
+        except httpx.HTTPError:
+            healthy = False
+
+        if healthy and not endpoint.healthy:
+            print(f"MedGemma endpoint {endpoint.url} passed health check, back in rotation")
+        elif not healthy and endpoint.healthy:
+            print(f"⚠️  MedGemma endpoint {endpoint.url} failed health check, ejected")
+        endpoint.healthy = healthy
+
+    def get_stats(self) -> Dict:
+        """Routing counters and per-endpoint state"""
+        return {
+            "routing": self.routing,
+            **self._stats,
+            "endpoints": [e.get_stats() for e in self.endpoints],
+        }
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+        for endpoint in self.endpoints:
+            await endpoint.client.aclose()
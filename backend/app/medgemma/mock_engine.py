@@ -2,22 +2,102 @@
 Mock MedGemma Engine for Local Development
 Simulates AI responses without requiring actual model files
 """
+import asyncio
+import random
+import re
 import time
-from typing import Dict
+from typing import AsyncIterator, Dict, List, Optional
+
+from .stopping import StopCondition
+
+# Whitespace-delimited pieces stand in for model tokens
+_TOKEN_PATTERN = re.compile(r"\s*\S+")
 
 
 class MockMedGemma:
-    """Mock MedGemma for development/testing"""
+    """
+    Mock MedGemma for development/testing
+
+    Simulates inference timing so the API, queueing and batching layers can
+    be load-tested without a GPU:
+
+    - time to first token (ttft) and a decode rate in tokens/sec
+    - per-request latency drawn from a fixed, normal or lognormal distribution
+    - injected errors and timeouts at configurable rates
+    - a concurrency cap that makes excess requests wait, like a single GPU
+    """
+
+    def __init__(
+        self,
+        ttft: float = 0.5,
+        tokens_per_second: float = 200.0,
+        latency_distribution: str = "fixed",
+        latency_jitter: float = 0.25,
+        error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        timeout_seconds: float = 30.0,
+        max_concurrency: int = 1,
+        seed: Optional[int] = None,
+    ):
+        """
+        Args:
+            ttft: Seconds before the first token
+            tokens_per_second: Decode rate after the first token
+            latency_distribution: "fixed", "normal" or "lognormal" (heavy tail)
+            latency_jitter: Spread of the latency multiplier (std dev / sigma)
+            error_rate: Fraction of requests that fail with RuntimeError
+            timeout_rate: Fraction of requests that hang for timeout_seconds, then raise TimeoutError
+            max_concurrency: Requests generating at once; the rest wait (0 = unlimited)
+            seed: Seed for reproducible runs
+        """
+        if latency_distribution not in ("fixed", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {latency_distribution}")
+
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.latency_distribution = latency_distribution
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.max_concurrency = max_concurrency
+
+        self._random = random.Random(seed)
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self._in_flight = 0
+        self._waiting = 0
+        self._stats = {"requests": 0, "errors": 0, "timeouts": 0, "generated_tokens": 0}
 
-    def __init__(self):
         print("🤖 Mock MedGemma initialized (Development Mode)")
 
-    async def generate(self, prompt: str, max_tokens: int = 2048, temperature: float = 0.3) -> str:
+    async def generate(
+        self,
+        prompt: str,
+        max_tokens: int = 2048,
+        temperature: float = 0.3,
+        stop: Optional[StopCondition] = None,
+    ) -> str:
         """Generate mock response"""
-        # Simulate processing time
-        await self._simulate_processing()
-
-        # Generate mock response based on prompt content
+        chunks = [chunk async for chunk in self._simulate(prompt, max_tokens, stream=False, stop=stop)]
+        return "".join(chunks).strip()
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        max_tokens: int = 2048,
+        temperature: float = 0.3,
+        stop: Optional[StopCondition] = None,
+    ) -> AsyncIterator[str]:
+        """Stream mock response token by token at the simulated rate"""
+        async for chunk in self._simulate(prompt, max_tokens, stream=True, stop=stop):
+            yield chunk
+
+    def count_tokens(self, text: str) -> int:
+        """Tokens in generated text, as the mock splits them"""
+        return len(_TOKEN_PATTERN.findall(text))
+
+    def _select_response(self, prompt: str) -> str:
+        """Pick mock response based on prompt content"""
         if "COMPARISON" in prompt.upper():
             return self._mock_comparison_response()
         elif "FOCUSED" in prompt.upper() or "FINDING" in prompt.upper():
@@ -25,10 +105,89 @@ class MockMedGemma:
         else:
             return self._mock_primary_response()
 
-    async def _simulate_processing(self):
-        """Simulate AI processing time"""
-        import asyncio
-        await asyncio.sleep(2)  # 2 second delay to simulate inference
+    def _latency_multiplier(self) -> float:
+        """Per-request slowdown factor drawn from the configured distribution"""
+        if self.latency_distribution == "normal":
+            return max(0.1, self._random.gauss(1.0, self.latency_jitter))
+        if self.latency_distribution == "lognormal":
+            return self._random.lognormvariate(0.0, self.latency_jitter)
+        return 1.0
+
+    async def _acquire_slot(self):
+        self._waiting += 1
+        try:
+            if self._semaphore is not None:
+                await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        self._in_flight += 1
+
+    def _release_slot(self):
+        self._in_flight -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    async def _simulate(
+        self,
+        prompt: str,
+        max_tokens: int,
+        stream: bool,
+        stop: Optional[StopCondition] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Yield response tokens on the simulated schedule
+
+        Token i is due at ttft + i / tokens_per_second (scaled by the latency
+        multiplier); non-streaming callers sleep once for the whole response.
+        A stop condition ends the simulated generation at its stop point.
+        """
+        tokens: List[str] = _TOKEN_PATTERN.findall(self._select_response(prompt))[:max_tokens]
+        if stop is not None:
+            tokens = self._stop_early(tokens, stop)
+        self._stats["requests"] += 1
+
+        await self._acquire_slot()
+        try:
+            roll = self._random.random()
+            if roll < self.timeout_rate:
+                self._stats["timeouts"] += 1
+                await asyncio.sleep(self.timeout_seconds)
+                raise TimeoutError(f"Inference timed out after {self.timeout_seconds:g}s")
+
+            multiplier = self._latency_multiplier()
+            ttft = self.ttft * multiplier
+            per_token = multiplier / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+            if roll < self.timeout_rate + self.error_rate:
+                await asyncio.sleep(ttft)
+                self._stats["errors"] += 1
+                raise RuntimeError("Simulated inference failure")
+
+            if not stream:
+                await asyncio.sleep(ttft + per_token * max(len(tokens) - 1, 0))
+                self._stats["generated_tokens"] += len(tokens)
+                yield "".join(tokens)
+                return
+
+            started = time.monotonic()
+            for index, token in enumerate(tokens):
+                delay = started + ttft + per_token * index - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self._stats["generated_tokens"] += 1
+                yield token
+        finally:
+            self._release_slot()
+
+    @staticmethod
+    def _stop_early(tokens: List[str], stop: StopCondition) -> List[str]:
+        """Tokens up to the one that completes a stop point, as a real decoder would stop"""
+        text = ""
+        for index, token in enumerate(tokens):
+            text += token
+            if stop.find(text) is not None:
+                return tokens[:index + 1]
+        return tokens
 
     def _mock_primary_response(self) -> str:
         """Mock primary analysis response"""
@@ -163,5 +322,16 @@ CONFIDENCE LEVEL: Moderate-High for benign etiology based on imaging characteris
         return {
             "type": "mock",
             "model_name": "Mock-MedGemma-1.5-DEV",
-            "note": "Development mode - simulated responses"
+            "note": "Development mode - simulated responses",
+            "simulation": {
+                "ttft": self.ttft,
+                "tokens_per_second": self.tokens_per_second,
+                "latency_distribution": self.latency_distribution,
+                "error_rate": self.error_rate,
+                "timeout_rate": self.timeout_rate,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                **self._stats
+            }
         }
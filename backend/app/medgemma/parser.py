@@ -0,0 +1,279 @@
+"""
+MedGemma Response Parser
+Splits a PromptBuilder-format report into sections and extracts findings, measurements and confidence
+"""
+import re
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+# Canonical sections, in report order
+SECTIONS = ("technique", "findings", "measurements", "impression", "recommendations")
+
+# Comparison and focused reports use their own headers for some sections
+_SECTION_NAMES = {
+    "TECHNIQUE": "technique",
+    "FINDINGS": "findings",
+    "COMPARISON FINDINGS": "findings",
+    "INTERVAL CHANGES": "findings",
+    "NEW FINDINGS": "findings",
+    "RESOLVED FINDINGS": "findings",
+    "MORPHOLOGICAL CHARACTERISTICS": "findings",
+    "ADDITIONAL FEATURES": "findings",
+    "MEASUREMENTS": "measurements",
+    "IMPRESSION": "impression",
+    "DIFFERENTIAL DIAGNOSIS": "impression",
+    "RECOMMENDATIONS": "recommendations",
+}
+
+# "2. FINDINGS:", "**Impression:**", "## MEASUREMENTS:" (text after the colon is section content),
+# or the disclaimer footer, which ends the report
+_SECTION_HEADER = re.compile(
+    r"^(?:[ \t#*]*(?:\d+[.)][ \t]*)?[*]*(?P<name>"
+    + "|".join(sorted(_SECTION_NAMES, key=len, reverse=True))
+    + r")[*]*[ \t]*:[*]*[ \t]*|(?P<footer>[^\w\n]*IMPORTANT:))",
+    re.IGNORECASE | re.MULTILINE,
+)
+# "Lungs:" - a label that applies to the items below it
+_SUBHEADING = re.compile(r"^[ \t]*([A-Z][\w /&(),-]{0,60}):[ \t]*$", re.MULTILINE)
+_BULLET = re.compile(r"[ \t]*(?:[-*•]|\d+[.)])[ \t]+")
+_LABEL = re.compile(r"([^:]{1,80}):")
+
+# The patterns below run on lowercased text (see _lower) - much faster than IGNORECASE
+_FINDING_TYPE = re.compile(
+    r"\b(nodule|mass|lesion|fracture|opacity|opacities|consolidation|effusion|pneumothorax|"
+    r"lymphadenopathy|h(?:a)?emorrhage|(?:o)?edema|atelectasis|calcification|cyst|embolism|embolus|"
+    r"stenosis|aneurysm|infiltrate|granuloma|thickening|dilatation|cardiomegaly|herniation|"
+    r"obstruction|collection|abscess|thrombus|infarct)(?:e?s)?\b"
+)
+_NEGATION = re.compile(r"\b(?:no|not|without|negative for|free of|resolved|none)\b")
+
+_SEVERITY = re.compile(
+    r"(?<!no )(?<!not )\b(critical|urgent|emergent|severe|large|significant|marked|moderate|mild|small|minimal|tiny)\b"
+)
+_SEVERITY_LEVELS = {
+    "critical": "critical", "urgent": "critical", "emergent": "critical",
+    "severe": "significant", "large": "significant", "significant": "significant", "marked": "significant",
+    "moderate": "moderate",
+    "mild": "mild", "small": "mild", "minimal": "mild", "tiny": "mild",
+}
+_SEVERITY_RANKS = {"mild": 0, "moderate": 1, "significant": 2, "critical": 3}
+
+# "high confidence", "Confidence: low", "confidence level - moderate" - checked around each "confidence"
+_CONFIDENCE_BEFORE = re.compile(r"\b(high|moderate|low)[ \t]+$")
+_CONFIDENCE_AFTER = re.compile(r"(?:[ \t]+level)?[ \t]*[:-]?[ \t]*(high|moderate|low)\b")
+# Hedging that implies a level when none is stated (as PromptBuilder.extract_confidence_keywords)
+_HEDGE_LOW = re.compile(r"\b(?:possibly|may represent|uncertain|questionable|cannot exclude)\b")
+_HEDGE_HIGH = re.compile(r"\b(?:clearly|definitely|unequivocally|certainly)\b")
+CONFIDENCE_SCORES = {"high": 0.9, "moderate": 0.7, "low": 0.5}
+DEFAULT_CONFIDENCE = "moderate"
+
+# "6 mm", "6 x 5 mm", "1.2x0.8 cm", "45 HU", "30 mL"
+_MEASUREMENT = re.compile(
+    r"(?<![\w.])(\d+(?:\.\d+)?(?:[ \t]*[x×][ \t]*\d+(?:\.\d+)?)*)[ \t]*(mm|cm|HU|mL|ml|cc)\b"
+)
+_DIMENSION_SEPARATOR = re.compile(r"[ \t]*[x×][ \t]*")
+_MEASUREMENT_TYPES = {"mm": "size", "cm": "size", "HU": "density", "mL": "volume", "cc": "volume"}
+
+
+def parse_response(text: str) -> Dict:
+    """
+    Parse a MedGemma report
+
+    Every pattern runs once over the text (or one section of it) in the
+    regex engine; Python only handles the matches.
+
+    Returns:
+        sections: text of each of SECTIONS (None when absent)
+        findings: type, location, description, severity, confidence per abnormal item
+        measurements: type, value, unit, location (and dimensions when several)
+        confidence: overall {"level", "score"} - the highest level the report states
+        summary: the impression, or the start of the response without one
+    """
+    sections = _split_sections(text)
+
+    levels = set(_stated_confidence(_lower(text)))
+    confidence = next((level for level in ("high", "moderate", "low") if level in levels), DEFAULT_CONFIDENCE)
+
+    findings_text = sections["findings"] or ""
+    measurements = _parse_measurements(sections["measurements"] or "")
+    if not measurements:
+        # Sizes in the findings repeat the MEASUREMENTS section; use them only without one
+        measurements = _unique(_parse_measurements(findings_text))
+
+    return {
+        "sections": sections,
+        "findings": _parse_findings(findings_text),
+        "measurements": measurements,
+        "confidence": {"level": confidence, "score": CONFIDENCE_SCORES[confidence]},
+        "summary": sections["impression"] or text.strip()[:500],
+    }
+
+
+def _split_sections(text: str) -> Dict[str, Optional[str]]:
+    """Text of each canonical section; repeated or aliased headers are concatenated"""
+    parts: Dict[str, List[str]] = {}
+    headers = list(_SECTION_HEADER.finditer(text))
+
+    for index, header in enumerate(headers):
+        if header.group("footer"):
+            continue
+        name = header.group("name").upper()
+        section = _SECTION_NAMES[name]
+        end = headers[index + 1].start() if index + 1 < len(headers) else len(text)
+        body = text[header.end():end]
+        if name.lower() != section:
+            # Keep "NEW FINDINGS:" etc. so the merged section still reads as written
+            body = f"{name}:\n" + body.lstrip()
+        parts.setdefault(section, []).append(body.strip())
+
+    return {name: "\n\n".join(filter(None, parts.get(name, ()))) or None for name in SECTIONS}
+
+
+def _lower(text: str) -> str:
+    """Lowercased text with every position unchanged"""
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # A few characters (e.g. "\u0130") lowercase to two; leave those as they are
+        lowered = "".join(char if len(char.lower()) != 1 else char.lower() for char in text)
+    return lowered
+
+
+def _line_at(text: str, position: int) -> Tuple[int, int]:
+    """(start, end) of the line containing position"""
+    start = text.rfind("\n", 0, position) + 1
+    end = text.find("\n", position)
+    return start, len(text) if end == -1 else end
+
+
+def _item(text: str, start: int, end: int) -> Tuple[int, str]:
+    """Start and text of a line without its bullet"""
+    bullet = _BULLET.match(text, start, end)
+    if bullet:
+        start = bullet.end()
+    return start, text[start:end].strip()
+
+
+class _Subheadings:
+    """The "Lungs:" label in force at any position of a section"""
+
+    def __init__(self, text: str):
+        self.positions = []
+        self.labels = []
+        for match in _SUBHEADING.finditer(text):
+            label = match.group(1).strip()
+            self.positions.append(match.start())
+            # An aliased section header resets the label
+            self.labels.append(None if label.upper() in _SECTION_NAMES else label)
+
+    def at(self, position: int) -> Optional[str]:
+        index = bisect_right(self.positions, position) - 1
+        return self.labels[index] if index >= 0 else None
+
+
+def _parse_findings(text: str) -> List[Dict]:
+    """A finding per line whose first abnormality-naming sentence isn't negated"""
+    findings = []
+    subheadings = _Subheadings(text)
+    lowered = _lower(text)
+    line_start = line_end = done_line = skip_until = -1
+
+    for match in _FINDING_TYPE.finditer(lowered):
+        position = match.start()
+        if position < skip_until:
+            continue
+        if position > line_end:
+            line_start, line_end = _line_at(text, position)
+        if line_start == done_line:
+            continue
+
+        # Negation only counts within the same sentence - and then covers the rest of it
+        sentence_start = max(line_start, lowered.rfind(". ", line_start, position), lowered.rfind("; ", line_start, position))
+        if _NEGATION.search(lowered, sentence_start, position):
+            ends = [end for end in (lowered.find(". ", position, line_end), lowered.find("; ", position, line_end)) if end != -1]
+            skip_until = min(ends, default=line_end)
+            continue
+
+        done_line = line_start
+        item_start, item = _item(text, line_start, line_end)
+        item_lowered = lowered[item_start:line_end]
+        severities = [_SEVERITY_LEVELS[word] for word in _SEVERITY.findall(item_lowered)]
+        findings.append({
+            "type": match.group(1),
+            "location": subheadings.at(line_start) or "unspecified",
+            "description": item,
+            "severity": max(severities, key=_SEVERITY_RANKS.get, default=""),
+            "confidence": CONFIDENCE_SCORES[_item_confidence(item_lowered)],
+        })
+
+    return findings
+
+
+def _parse_measurements(text: str) -> List[Dict]:
+    """Every size/density/volume; located by the line's "label:" or the subheading"""
+    measurements = []
+    subheadings = None
+    line_end = -1
+    location = None
+
+    for match in _MEASUREMENT.finditer(text):
+        if match.start() > line_end:
+            line_start, line_end = _line_at(text, match.start())
+            item_start, _ = _item(text, line_start, line_end)
+            label = _LABEL.match(text, item_start, match.start())
+            if label:
+                location = label.group(1).strip()
+            else:
+                subheadings = subheadings or _Subheadings(text)
+                location = subheadings.at(line_start) or "unspecified"
+
+        dimensions = [float(value) for value in _DIMENSION_SEPARATOR.split(match.group(1))]
+        unit = "mL" if match.group(2).lower() == "ml" else match.group(2)
+        measurement = {
+            "type": _MEASUREMENT_TYPES[unit],
+            "value": max(dimensions),
+            "unit": unit,
+            "location": location,
+        }
+        if len(dimensions) > 1:
+            measurement["dimensions"] = dimensions
+        measurements.append(measurement)
+
+    return measurements
+
+
+def _unique(measurements: List[Dict]) -> List[Dict]:
+    """Drop repeats of a size at the same location (e.g. "6mm, unchanged from prior 6mm")"""
+    seen = set()
+    unique = []
+    for measurement in measurements:
+        key = (measurement["value"], measurement["unit"], measurement["location"])
+        if key not in seen:
+            seen.add(key)
+            unique.append(measurement)
+    return unique
+
+
+def _stated_confidence(lowered: str) -> List[str]:
+    """Confidence levels stated in lowercased text, in order"""
+    levels = []
+    position = lowered.find("confidence")
+    while position != -1:
+        end = position + len("confidence")
+        before = _CONFIDENCE_BEFORE.search(lowered, max(position - 16, 0), position)
+        after = _CONFIDENCE_AFTER.match(lowered, end) if before is None else None
+        if before or after:
+            levels.append((before or after).group(1))
+        position = lowered.find("confidence", end)
+    return levels
+
+
+def _item_confidence(item: str) -> str:
+    """Stated or implied confidence level of a lowercased finding"""
+    stated = _stated_confidence(item)
+    if stated:
+        return stated[0]
+    if _HEDGE_LOW.search(item):
+        return "low"
+    if _HEDGE_HIGH.search(item):
+        return "high"
+    return DEFAULT_CONFIDENCE
@@ -2,7 +2,15 @@
 MedGemma Prompt Templates for Radiology
 Structured prompts for medical imaging analysis
 """
-from typing import Dict, List, Optional
+from typing import Dict, List, NamedTuple, Optional
+
+from .stopping import StopCondition
+
+
+class GenerationProfile(NamedTuple):
+    """Token budget and stop condition for one prompt template"""
+    max_tokens: int
+    stop: StopCondition
 
 
 class PromptBuilder:
@@ -16,27 +24,10 @@ Do not make definitive diagnoses. Use phrases like "suggestive of", "consistent
 Express uncertainty when confidence is low.
 """
 
-    @classmethod
-    def build_primary_analysis_prompt(
-        cls,
-        modality: str,
-        body_part: str,
-        clinical_indication: str,
-        technical_params: Optional[Dict] = None,
-    ) -> str:
-        """Build prompt for primary imaging analysis"""
-
-        prompt = f"""{cls.SAFETY_DISCLAIMER}
-
-You are analyzing a {modality} scan of the {body_part}.
-
-CLINICAL INDICATION:
-{clinical_indication}
-
-TECHNICAL PARAMETERS:
-{cls._format_technical_params(technical_params) if technical_params else "Standard protocol"}
-
-TASK:
+    # Fixed instruction blocks. They come right after the disclaimer and before
+    # any case details, so every prompt of a template shares the same prefix
+    # and a local model can reuse its precomputed KV cache for it.
+    PRIMARY_INSTRUCTIONS = """TASK:
 Please provide a comprehensive analysis following this structure:
 
 1. TECHNIQUE:
@@ -76,32 +67,10 @@ IMPORTANT GUIDELINES:
 - Recommend radiologist review
 - Flag any critical or urgent findings clearly
 
-Please analyze the provided imaging study and respond in this structured format.
+STUDY DETAILS:
 """
-        return prompt
-
-    @classmethod
-    def build_comparison_analysis_prompt(
-        cls,
-        modality: str,
-        body_part: str,
-        clinical_indication: str,
-        prior_study_date: str,
-        prior_findings: str,
-    ) -> str:
-        """Build prompt for comparison with prior study"""
-
-        prompt = f"""{cls.SAFETY_DISCLAIMER}
-
-You are comparing a current {modality} scan of the {body_part} with a prior study from {prior_study_date}.
-
-CLINICAL INDICATION:
-{clinical_indication}
 
-PRIOR STUDY FINDINGS ({prior_study_date}):
-{prior_findings}
-
-TASK:
+    COMPARISON_INSTRUCTIONS = """TASK:
 Please provide a comprehensive comparison analysis following this structure:
 
 1. TECHNIQUE:
@@ -141,31 +110,11 @@ CRITICAL POINTS:
 - Use standard comparison terminology (stable, improved, worsened)
 - Do not make definitive diagnoses based on changes
 
-Please analyze and compare the imaging studies.
+STUDY DETAILS:
 """
-        return prompt
 
-    @classmethod
-    def build_focused_finding_prompt(
-        cls,
-        modality: str,
-        finding_type: str,
-        location: str,
-        additional_context: Optional[str] = None,
-    ) -> str:
-        """Build prompt for detailed analysis of specific finding"""
-
-        prompt = f"""{cls.SAFETY_DISCLAIMER}
-
-You are performing a focused analysis of a specific finding on a {modality} scan.
-
-FINDING TO ANALYZE:
-Type: {finding_type}
-Location: {location}
-{f"Additional Context: {additional_context}" if additional_context else ""}
-
-TASK:
-Please provide a detailed characterization of this finding:
+    FOCUSED_INSTRUCTIONS = """TASK:
+Please provide a detailed characterization of the finding described below:
 
 1. MORPHOLOGICAL CHARACTERISTICS:
    - Size (all dimensions)
@@ -190,6 +139,107 @@ Please provide a detailed characterization of this finding:
    - Follow-up timeline
    - Urgent action if critical
 
+STUDY DETAILS:
+"""
+
+    # Text that means the model has finished the report and started echoing
+    # the prompt - nothing after it is ever kept
+    ECHO_STOP_SEQUENCES = ("\nSTUDY DETAILS:", "\nIMPORTANT: This is an AI-powered", "\nTASK:")
+
+    # Budgets leave headroom over the longest well-formed report of each
+    # template; generation normally ends earlier, once RECOMMENDATIONS is done
+    GENERATION_PROFILES = {
+        "primary": GenerationProfile(1024, StopCondition(ECHO_STOP_SEQUENCES, final_section="RECOMMENDATIONS:")),
+        "comparison": GenerationProfile(1536, StopCondition(ECHO_STOP_SEQUENCES, final_section="RECOMMENDATIONS:")),
+        "focused": GenerationProfile(768, StopCondition(ECHO_STOP_SEQUENCES, final_section="RECOMMENDATIONS:")),
+        "measurement": GenerationProfile(512, StopCondition(ECHO_STOP_SEQUENCES)),
+    }
+
+    @classmethod
+    def generation_profile(cls, analysis_type: str) -> GenerationProfile:
+        """Token budget and stop condition for an analysis type (primary if unknown)"""
+        return cls.GENERATION_PROFILES.get(analysis_type, cls.GENERATION_PROFILES["primary"])
+
+    @classmethod
+    def static_prefixes(cls) -> List[str]:
+        """Fixed leading text shared by every prompt of each template"""
+        return [
+            f"{cls.SAFETY_DISCLAIMER}\n{instructions}\n"
+            for instructions in (
+                cls.PRIMARY_INSTRUCTIONS,
+                cls.COMPARISON_INSTRUCTIONS,
+                cls.FOCUSED_INSTRUCTIONS,
+            )
+        ]
+
+    @classmethod
+    def build_primary_analysis_prompt(
+        cls,
+        modality: str,
+        body_part: str,
+        clinical_indication: str,
+        technical_params: Optional[Dict] = None,
+    ) -> str:
+        """Build prompt for primary imaging analysis"""
+
+        prompt = f"""{cls.SAFETY_DISCLAIMER}
+{cls.PRIMARY_INSTRUCTIONS}
+You are analyzing a {modality} scan of the {body_part}.
+
+CLINICAL INDICATION:
+{clinical_indication}
+
+TECHNICAL PARAMETERS:
+{cls._format_technical_params(technical_params) if technical_params else "Standard protocol"}
+
+Please analyze the provided imaging study and respond in this structured format.
+"""
+        return prompt
+
+    @classmethod
+    def build_comparison_analysis_prompt(
+        cls,
+        modality: str,
+        body_part: str,
+        clinical_indication: str,
+        prior_study_date: str,
+        prior_findings: str,
+    ) -> str:
+        """Build prompt for comparison with prior study"""
+
+        prompt = f"""{cls.SAFETY_DISCLAIMER}
+{cls.COMPARISON_INSTRUCTIONS}
+You are comparing a current {modality} scan of the {body_part} with a prior study from {prior_study_date}.
+
+CLINICAL INDICATION:
+{clinical_indication}
+
+PRIOR STUDY FINDINGS ({prior_study_date}):
+{prior_findings}
+
+Please analyze and compare the imaging studies.
+"""
+        return prompt
+
+    @classmethod
+    def build_focused_finding_prompt(
+        cls,
+        modality: str,
+        finding_type: str,
+        location: str,
+        additional_context: Optional[str] = None,
+    ) -> str:
+        """Build prompt for detailed analysis of specific finding"""
+
+        prompt = f"""{cls.SAFETY_DISCLAIMER}
+{cls.FOCUSED_INSTRUCTIONS}
+You are performing a focused analysis of a specific finding on a {modality} scan.
+
+FINDING TO ANALYZE:
+Type: {finding_type}
+Location: {location}
+{f"Additional Context: {additional_context}" if additional_context else ""}
+
 Provide detailed, systematic analysis of this finding.
 """
         return prompt
@@ -227,6 +277,55 @@ Be precise and use standard medical units.
 """
         return prompt
 
+    # Prior findings are summarised to keep comparison prompts short
+    PRIOR_FINDINGS_LIMIT = 8
+    PRIOR_MEASUREMENTS_LIMIT = 8
+    PRIOR_TEXT_LIMIT = 300  # characters per impression / finding
+
+    @classmethod
+    def summarize_prior_findings(cls, structured_findings: Optional[Dict]) -> str:
+        """
+        Compact prior-study context from an analysis' structured findings
+
+        Keeps the impression plus the abnormal findings and measurements,
+        instead of the whole prior report.
+        """
+        structured = structured_findings or {}
+        impression = (structured.get("sections") or {}).get("impression") or structured.get("summary")
+        lines = []
+
+        if impression:
+            lines.append(f"Impression: {cls._clip(impression)}")
+
+        findings = structured.get("findings") or []
+        if findings:
+            lines.append("Findings:")
+            for finding in findings[:cls.PRIOR_FINDINGS_LIMIT]:
+                location = finding.get("location")
+                prefix = f"{location}: " if location and location != "unspecified" else ""
+                severity = f" ({finding['severity']})" if finding.get("severity") else ""
+                lines.append(f"- {prefix}{cls._clip(finding.get('description', ''))}{severity}")
+
+        measurements = structured.get("measurements") or []
+        if measurements:
+            lines.append("Measurements:")
+            for measurement in measurements[:cls.PRIOR_MEASUREMENTS_LIMIT]:
+                dimensions = measurement.get("dimensions") or [measurement.get("value")]
+                size = " x ".join(f"{value:g}" for value in dimensions if value is not None)
+                location = measurement.get("location")
+                prefix = f"{location}: " if location and location != "unspecified" else ""
+                lines.append(f"- {prefix}{size} {measurement.get('unit', '')}".rstrip())
+
+        return "\n".join(lines) or "No findings were recorded in the prior analysis."
+
+    @classmethod
+    def _clip(cls, text: str) -> str:
+        """Collapse whitespace and cut to PRIOR_TEXT_LIMIT characters"""
+        text = " ".join(text.split())
+        if len(text) <= cls.PRIOR_TEXT_LIMIT:
+            return text
+        return text[:cls.PRIOR_TEXT_LIMIT].rsplit(" ", 1)[0] + "..."
+
     @staticmethod
     def _format_technical_params(params: Dict) -> str:
         """Format technical parameters for prompt"""
@@ -0,0 +1,70 @@
+"""
+Generation Stop Conditions
+Ends a generation once the structured report is complete instead of running out the token budget
+"""
+from typing import Dict, Optional, Sequence, Tuple
+
+
+class StopCondition:
+    """
+    When a response is finished, short of the token budget
+
+    - stop_sequences: text that means the model has moved past the report
+      (e.g. it starts echoing the prompt); the response is cut before it
+    - final_section: header of the last report section; once it has some
+      content followed by section_end (a blank line), the report is done
+    """
+
+    def __init__(
+        self,
+        stop_sequences: Sequence[str] = (),
+        final_section: Optional[str] = None,
+        section_end: str = "\n\n",
+    ):
+        self.stop_sequences = tuple(stop_sequences)
+        self.final_section = final_section
+        self.section_end = section_end
+
+    def find(self, text: str) -> Optional[int]:
+        """Index the response should be cut at, or None if it isn't finished yet"""
+        cut = None
+        for sequence in self.stop_sequences:
+            index = text.find(sequence)
+            if index != -1 and (cut is None or index < cut):
+                cut = index
+
+        if self.final_section:
+            header = text.find(self.final_section)
+            if header != -1:
+                # Skip the whitespace after the header so an empty section doesn't count
+                start = header + len(self.final_section)
+                while start < len(text) and text[start].isspace():
+                    start += 1
+                end = text.find(self.section_end, start)
+                if end != -1 and (cut is None or end < cut):
+                    cut = end
+
+        return cut
+
+    def truncate(self, text: str) -> Tuple[str, bool]:
+        """(text up to the stop point, whether a stop point was found)"""
+        cut = self.find(text)
+        if cut is None:
+            return text, False
+        return text[:cut].rstrip(), True
+
+    @property
+    def holdback(self) -> int:
+        """Characters a stream must hold back, since they may begin a stop point"""
+        lengths = [len(sequence) for sequence in self.stop_sequences]
+        if self.final_section:
+            lengths.append(len(self.section_end))
+        return max(lengths, default=0)
+
+    def to_dict(self) -> Dict:
+        """Serialisable form, for cache keys and API payloads"""
+        return {
+            "stop_sequences": list(self.stop_sequences),
+            "final_section": self.final_section,
+            "section_end": self.section_end,
+        }
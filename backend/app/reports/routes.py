@@ -7,7 +7,8 @@ from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config.database import get_db
-from app.config.models import Report, Study, MedGemmaAnalysis, ReportStatus
+from app.config.models import Report, Study, MedGemmaAnalysis, Measurement, ReportStatus
+from app.medgemma import parse_response
 
 router = APIRouter(prefix="/api/reports", tags=["reports"])
 
@@ -33,12 +34,12 @@ async def generate_report(
     from sqlalchemy import select
     from sqlalchemy.orm import selectinload
 
+    # Measurements with their findings in one query, for the measurements table
     result = await db.execute(
         select(MedGemmaAnalysis)
         .where(MedGemmaAnalysis.id == request.analysis_id)
         .options(
-            selectinload(MedGemmaAnalysis.findings),
-            selectinload(MedGemmaAnalysis.measurements)
+            selectinload(MedGemmaAnalysis.measurements).joinedload(Measurement.finding)
         )
     )
     analysis = result.scalar_one_or_none()
@@ -47,8 +48,9 @@ async def generate_report(
         raise HTTPException(status_code=404, detail="Analysis not found")
 
     # Generate report sections from analysis
-    findings_narrative = _generate_findings_narrative(analysis)
-    impression = _generate_impression(analysis)
+    sections = _analysis_sections(analysis)
+    findings_narrative = _generate_findings_narrative(sections)
+    impression = _generate_impression(sections)
     measurements_table = _generate_measurements_table(analysis)
 
     # AI Disclaimer
@@ -66,10 +68,10 @@ async def generate_report(
         study_id=request.study_id,
         analysis_id=request.analysis_id,
         clinical_indication=study.clinical_indication or "Not specified",
-        technique=f"{study.modality.value} imaging of {study.study_description}",
+        technique=sections.get("technique") or f"{study.modality.value} imaging of {study.study_description}",
         findings_narrative=findings_narrative,
         impression=impression,
-        recommendations="Clinical correlation recommended. Radiologist review required.",
+        recommendations=sections.get("recommendations") or "Clinical correlation recommended. Radiologist review required.",
         structured_findings=analysis.structured_findings,
         measurements_table=measurements_table,
         ai_generated=True,
@@ -121,41 +123,23 @@ async def finalize_report(report_id: str, db: AsyncSession = Depends(get_db)):
     return report
 
 
-def _generate_findings_narrative(analysis: MedGemmaAnalysis) -> str:
-    """Generate narrative findings section"""
-    if analysis.raw_response:
-        # Extract findings section from raw response
-        response = analysis.raw_response
-
-        # Simple extraction (production would use better parsing)
-        if "FINDINGS:" in response:
-            findings_start = response.find("FINDINGS:")
-            findings_end = response.find("IMPRESSION:", findings_start)
-            if findings_end == -1:
-                findings_end = response.find("MEASUREMENTS:", findings_start)
-            if findings_end == -1:
-                findings_end = len(response)
+def _analysis_sections(analysis: MedGemmaAnalysis) -> dict:
+    """Report sections parsed when the analysis was stored"""
+    structured = analysis.structured_findings or {}
+    if "sections" in structured:
+        return structured["sections"]
+    # Analyses stored before section parsing was added
+    return parse_response(analysis.raw_response)["sections"] if analysis.raw_response else {}
 
-            return response[findings_start:findings_end].strip()
 
-    return "Please refer to AI analysis for detailed findings."
+def _generate_findings_narrative(sections: dict) -> str:
+    """Generate narrative findings section"""
+    return sections.get("findings") or "Please refer to AI analysis for detailed findings."
 
 
-def _generate_impression(analysis: MedGemmaAnalysis) -> str:
+def _generate_impression(sections: dict) -> str:
     """Generate impression section"""
-    if analysis.raw_response:
-        response = analysis.raw_response
-
-        # Extract impression section
-        if "IMPRESSION:" in response:
-            impression_start = response.find("IMPRESSION:")
-            impression_end = response.find("RECOMMENDATIONS:", impression_start)
-            if impression_end == -1:
-                impression_end = len(response)
-
-            return response[impression_start:impression_end].strip()
-
-    return "AI-generated analysis suggests further radiologist review."
+    return sections.get("impression") or "AI-generated analysis suggests further radiologist review."
 
 
 def _generate_measurements_table(analysis: MedGemmaAnalysis) -> dict:
@@ -1,3 +1,4 @@
-from .manager import StorageManager, get_storage_manager
+from .manager import StorageManager, get_storage_manager, iter_file
+from .cache import CachedStorage
 
-__all__ = ["StorageManager", "get_storage_manager"]
+__all__ = ["StorageManager", "get_storage_manager", "iter_file", "CachedStorage"]
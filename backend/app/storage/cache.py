@@ -0,0 +1,374 @@
+"""
+Read-through local disk cache for remote storage backends
+Keeps recently used S3/Azure objects on local disk with LRU/TTL eviction
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Dict, List, Optional
+
+import aiofiles
+
+from .manager import CHUNK_SIZE, ByteRange, StorageBackend, _range_to_offset_length, iter_file
+
+
+class CachedStorage(StorageBackend):
+    """
+    Local disk cache wrapping a remote StorageBackend
+
+    - Read-through: misses are streamed from the remote into the cache;
+      a ranged read that misses is served from the remote while the fill
+      runs in the background
+    - Single-flight: concurrent misses for the same object share one download
+    - Integrity: a SHA-256 is recorded at fill time and checked against the
+      written file once before the entry is used; full reads re-verify it
+    - Eviction: least recently used first, once max_bytes is exceeded;
+      entries older than ttl_seconds are treated as misses
+    - Optional write-through: saves populate the cache as they upload
+    """
+
+    def __init__(
+        self,
+        remote: StorageBackend,
+        cache_path: str,
+        max_bytes: int,
+        ttl_seconds: int = 0,
+        write_through: bool = False,
+    ):
+        self.remote = remote
+        self.cache_path = Path(cache_path)
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.write_through = write_through
+
+        # file_path -> {"key", "sha256", "size", "created_at", "verified"}, in LRU order
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._total_bytes = 0
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "range_passthrough": 0,
+            "evictions": 0,
+            "integrity_failures": 0,
+        }
+
+        self._load_index()
+
+    @staticmethod
+    def _key(file_path: str) -> str:
+        return hashlib.sha256(file_path.encode()).hexdigest()
+
+    def _data_file(self, key: str) -> Path:
+        return self.cache_path / key[:2] / key
+
+    def _meta_file(self, key: str) -> Path:
+        return self.cache_path / key[:2] / f"{key}.meta"
+
+    def _load_index(self):
+        """Rebuild the in-memory index from sidecar metadata on disk"""
+        loaded = []
+        for meta_file in self.cache_path.glob("*/*.meta"):
+            key = meta_file.name[:-len(".meta")]
+            data_file = self._data_file(key)
+            try:
+                with open(meta_file) as f:
+                    meta = json.load(f)
+                stat = data_file.stat()
+                if stat.st_size != meta["size"]:
+                    raise ValueError("size mismatch")
+            except (OSError, ValueError, KeyError):
+                meta_file.unlink(missing_ok=True)
+                data_file.unlink(missing_ok=True)
+                continue
+            loaded.append((stat.st_mtime, meta["path"], {**meta, "key": key}))
+
+        # Oldest first so the least recently written entries are evicted first
+        for _, file_path, entry in sorted(loaded, key=lambda item: item[0]):
+            self._entries[file_path] = entry
+            self._total_bytes += entry["size"]
+
+        self._evict_to_fit()
+
+    def _lookup(self, file_path: str) -> Optional[dict]:
+        """Return a live cache entry and mark it most recently used"""
+        entry = self._entries.get(file_path)
+        if entry is None:
+            return None
+        if self.ttl_seconds and time.time() - entry["created_at"] > self.ttl_seconds:
+            self._evict(file_path)
+            return None
+        self._entries.move_to_end(file_path)
+        return entry
+
+    def _evict(self, file_path: str):
+        """Drop an entry and its files"""
+        entry = self._entries.pop(file_path, None)
+        if entry is None:
+            return
+        self._total_bytes -= entry["size"]
+        self._data_file(entry["key"]).unlink(missing_ok=True)
+        self._meta_file(entry["key"]).unlink(missing_ok=True)
+        self._stats["evictions"] += 1
+
+    def _evict_to_fit(self, keep: Optional[str] = None):
+        """Evict least recently used entries until the cache fits max_bytes, keep last"""
+        order = [file_path for file_path in self._entries if file_path != keep]
+        if keep in self._entries:
+            order.append(keep)
+        for file_path in order:
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._evict(file_path)
+
+    async def _commit(self, file_path: str, key: str, tmp_file: Path, sha256: str, size: int) -> dict:
+        """
+        Verify a completed temp file, move it into place and register it
+
+        The returned entry may already be evicted if the object alone is
+        larger than max_bytes; readers then fall back to the remote.
+        """
+        if await asyncio.to_thread(_file_sha256, tmp_file) != sha256:
+            tmp_file.unlink(missing_ok=True)
+            self._stats["integrity_failures"] += 1
+            raise IOError(f"Cache fill of {file_path} does not match its checksum")
+
+        self._evict(file_path)
+        os.replace(tmp_file, self._data_file(key))
+
+        entry = {"path": file_path, "sha256": sha256, "size": size, "created_at": time.time()}
+        with open(self._meta_file(key), "w") as f:
+            json.dump(entry, f)
+
+        entry.update(key=key, verified=True)
+        self._entries[file_path] = entry
+        self._total_bytes += size
+        self._evict_to_fit(keep=file_path)
+        return entry
+
+    def _tmp_file(self, key: str) -> Path:
+        directory = self.cache_path / key[:2]
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / f".{key}.{uuid.uuid4().hex}.tmp"
+
+    async def _fill(self, file_path: str) -> dict:
+        """Download an object from the remote into the cache"""
+        key = self._key(file_path)
+        tmp_file = self._tmp_file(key)
+        digest = hashlib.sha256()
+        size = 0
+
+        try:
+            async with aiofiles.open(tmp_file, "wb") as f:
+                async for chunk in self.remote.open_read(file_path):
+                    await f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+        except BaseException:
+            tmp_file.unlink(missing_ok=True)
+            raise
+
+        return await self._commit(file_path, key, tmp_file, digest.hexdigest(), size)
+
+    def _start_fill(self, file_path: str) -> asyncio.Task:
+        """Start filling file_path, or join the fill already running"""
+        task = self._inflight.get(file_path)
+        if task is None:
+            self._stats["misses"] += 1
+            # Run the fill as its own task so a cancelled caller doesn't
+            # abort the download for everyone else waiting on it
+            task = asyncio.create_task(self._fill(file_path))
+            self._inflight[file_path] = task
+            task.add_done_callback(lambda _: self._inflight.pop(file_path, None))
+            # Background fills may have nobody awaiting them
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        else:
+            self._stats["coalesced"] += 1
+        return task
+
+    async def _ensure_cached(self, file_path: str) -> dict:
+        """Return the cache entry for file_path, filling it on a miss"""
+        entry = self._lookup(file_path)
+        if entry is not None:
+            self._stats["hits"] += 1
+            return entry
+
+        return await asyncio.shield(self._start_fill(file_path))
+
+    async def _verify(self, file_path: str, entry: dict) -> bool:
+        """Check an entry loaded from disk against its SHA-256 once; evicts it on mismatch"""
+        try:
+            sha256 = await asyncio.to_thread(_file_sha256, self._data_file(entry["key"]))
+        except FileNotFoundError:
+            self._evict(file_path)
+            return False
+
+        if sha256 != entry["sha256"]:
+            self._stats["integrity_failures"] += 1
+            self._evict(file_path)
+            return False
+
+        entry["verified"] = True
+        return True
+
+    async def save(self, file_path: str, content: BinaryIO) -> str:
+        """Save file to the remote (and the cache when write-through)"""
+        return await self.save_stream(file_path, iter_file(content))
+
+    async def save_stream(self, file_path: str, chunks: AsyncIterator[bytes]) -> str:
+        """Save chunk stream to the remote, teeing into the cache when write-through"""
+        self._evict(file_path)
+        if not self.write_through:
+            return await self.remote.save_stream(file_path, chunks)
+
+        key = self._key(file_path)
+        tmp_file = self._tmp_file(key)
+        digest = hashlib.sha256()
+        size = 0
+
+        try:
+            async with aiofiles.open(tmp_file, "wb") as f:
+                async def tee() -> AsyncIterator[bytes]:
+                    nonlocal size
+                    async for chunk in chunks:
+                        await f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+                        yield chunk
+
+                result = await self.remote.save_stream(file_path, tee())
+        except BaseException:
+            tmp_file.unlink(missing_ok=True)
+            raise
+
+        await self._commit(file_path, key, tmp_file, digest.hexdigest(), size)
+        return result
+
+    async def load(self, file_path: str) -> bytes:
+        """Load file through the cache"""
+        entry = await self._ensure_cached(file_path)
+        try:
+            async with aiofiles.open(self._data_file(entry["key"]), "rb") as f:
+                data = await f.read()
+        except FileNotFoundError:
+            self._evict(file_path)
+            return await self.remote.load(file_path)
+
+        if hashlib.sha256(data).hexdigest() != entry["sha256"]:
+            self._stats["integrity_failures"] += 1
+            self._evict(file_path)
+            return await self.remote.load(file_path)
+
+        entry["verified"] = True
+        return data
+
+    async def open_read(
+        self,
+        file_path: str,
+        byte_range: Optional[ByteRange] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        Stream file through the cache
+
+        Full reads are hashed as they stream; a mismatch evicts the entry and
+        raises, since the corrupt bytes have already been sent. Ranged reads
+        don't wait for a miss to be filled: they are served from the remote
+        while the fill runs in the background, and are only served from
+        entries whose checksum has been verified.
+        """
+        if byte_range is None:
+            entry = await self._ensure_cached(file_path)
+        else:
+            entry = self._lookup(file_path)
+            if entry is not None and (entry.get("verified") or await self._verify(file_path, entry)):
+                self._stats["hits"] += 1
+            else:
+                self._start_fill(file_path)
+                self._stats["range_passthrough"] += 1
+                async for chunk in self.remote.open_read(file_path, byte_range):
+                    yield chunk
+                return
+
+        offset, remaining = _range_to_offset_length(byte_range)
+        digest = hashlib.sha256() if byte_range is None else None
+
+        try:
+            f = await aiofiles.open(self._data_file(entry["key"]), "rb")
+        except FileNotFoundError:
+            # Evicted between lookup and open - serve straight from the remote
+            self._evict(file_path)
+            async for chunk in self.remote.open_read(file_path, byte_range):
+                yield chunk
+            return
+
+        try:
+            await f.seek(offset)
+            while remaining is None or remaining > 0:
+                size = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+                chunk = await f.read(size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+                yield chunk
+        finally:
+            await f.close()
+
+        if digest is not None:
+            if digest.hexdigest() != entry["sha256"]:
+                self._stats["integrity_failures"] += 1
+                self._evict(file_path)
+                raise IOError(f"Cache integrity check failed for {file_path}")
+            entry["verified"] = True
+
+    async def delete(self, file_path: str) -> bool:
+        """Delete file from the remote and the cache"""
+        self._evict(file_path)
+        return await self.remote.delete(file_path)
+
+    async def delete_many(self, file_paths: List[str], concurrency: int) -> List[dict]:
+        """Delete files from the remote (batched) and the cache"""
+        for file_path in file_paths:
+            self._evict(file_path)
+        return await self.remote.delete_many(file_paths, concurrency)
+
+    async def exists(self, file_path: str) -> bool:
+        """Check the cache first, then the remote"""
+        if self._lookup(file_path) is not None:
+            return True
+        return await self.remote.exists(file_path)
+
+    async def get_url(self, file_path: str, expires_in: int = 3600) -> str:
+        """Get remote URL for file"""
+        return await self.remote.get_url(file_path, expires_in)
+
+    def get_stats(self) -> Dict:
+        """Cache hit/miss counters and occupancy"""
+        return {
+            **self._stats,
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    async def close(self):
+        """Close the remote backend"""
+        await self.remote.close()
+
+
+def _file_sha256(path: Path) -> str:
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
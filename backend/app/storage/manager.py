@@ -2,15 +2,79 @@
 Storage Manager - Abstraction layer for file storage
 Supports local filesystem, S3, and Azure Blob Storage
 """
+import asyncio
+import base64
+import errno
 import os
 import shutil
+import uuid
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import BinaryIO, Optional
+from typing import Any, AsyncIterator, Awaitable, BinaryIO, Callable, List, Optional, Tuple, Union
 
 import aiofiles
 from app.config.settings import get_settings
 
+# Chunk size used when streaming file content
+CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# Inclusive (start, end) byte range; end=None means "to end of file"
+ByteRange = Tuple[int, Optional[int]]
+
+
+async def iter_file(content: BinaryIO, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Read a file object in chunks without blocking the event loop"""
+    while True:
+        chunk = await asyncio.to_thread(content.read, chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def _rechunk(chunks: AsyncIterator[bytes], size: int) -> AsyncIterator[bytes]:
+    """Regroup an async chunk stream into fixed-size blocks (last may be shorter)"""
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer.extend(chunk)
+        while len(buffer) >= size:
+            yield bytes(buffer[:size])
+            del buffer[:size]
+    if buffer:
+        yield bytes(buffer)
+
+
+async def run_bounded(
+    items: List[Any],
+    func: Callable[[Any], Awaitable[Any]],
+    concurrency: int,
+    key: Callable[[Any], str] = str,
+) -> List[dict]:
+    """
+    Run func over items with at most `concurrency` in flight
+
+    Returns one outcome per item, in input order:
+    {"path": ..., "status": "success", "result": ...} or
+    {"path": ..., "status": "error", "error": "..."}
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(item) -> dict:
+        async with semaphore:
+            try:
+                return {"path": key(item), "status": "success", "result": await func(item)}
+            except Exception as e:
+                return {"path": key(item), "status": "error", "error": str(e)}
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+
+def _range_to_offset_length(byte_range: Optional[ByteRange]) -> Tuple[int, Optional[int]]:
+    """Convert an inclusive byte range to (offset, length)"""
+    if byte_range is None:
+        return 0, None
+    start, end = byte_range
+    return start, (None if end is None else end - start + 1)
+
 
 class StorageBackend(ABC):
     """Abstract storage backend"""
@@ -20,11 +84,25 @@ class StorageBackend(ABC):
         """Save file and return storage path"""
         pass
 
+    @abstractmethod
+    async def save_stream(self, file_path: str, chunks: AsyncIterator[bytes]) -> str:
+        """Save file from an async chunk iterator and return storage path"""
+        pass
+
     @abstractmethod
     async def load(self, file_path: str) -> bytes:
         """Load file content"""
         pass
 
+    @abstractmethod
+    def open_read(
+        self,
+        file_path: str,
+        byte_range: Optional[ByteRange] = None,
+    ) -> AsyncIterator[bytes]:
+        """Stream file content in chunks, optionally limited to a byte range"""
+        pass
+
     @abstractmethod
     async def delete(self, file_path: str) -> bool:
         """Delete file"""
@@ -40,6 +118,27 @@ class StorageBackend(ABC):
         """Get accessible URL for file"""
         pass
 
+    async def ingest(self, file_path: str, source_path: str, keep_source: bool = False) -> str:
+        """Store a local file (e.g. a temp upload) and return storage path"""
+        with open(source_path, 'rb') as f:
+            return await self.save_stream(file_path, iter_file(f))
+
+    def local_path(self, file_path: str) -> Optional[str]:
+        """Filesystem path for direct (sendfile) serving, if the backend has one"""
+        return None
+
+    async def delete_many(self, file_paths: List[str], concurrency: int) -> List[dict]:
+        """Delete several files; backends with a native batch API override this"""
+        return await run_bounded(file_paths, self.delete, concurrency)
+
+    def get_stats(self) -> dict:
+        """Backend statistics (e.g. cache counters)"""
+        return {}
+
+    async def close(self):
+        """Release backend resources (clients, connections)"""
+        pass
+
 
 class LocalStorage(StorageBackend):
     """Local filesystem storage"""
@@ -50,11 +149,16 @@ class LocalStorage(StorageBackend):
 
     async def save(self, file_path: str, content: BinaryIO) -> str:
         """Save file to local filesystem"""
+        return await self.save_stream(file_path, iter_file(content))
+
+    async def save_stream(self, file_path: str, chunks: AsyncIterator[bytes]) -> str:
+        """Save chunk stream to local filesystem"""
         full_path = self.base_path / file_path
         full_path.parent.mkdir(parents=True, exist_ok=True)
 
         async with aiofiles.open(full_path, 'wb') as f:
-            await f.write(content.read())
+            async for chunk in chunks:
+                await f.write(chunk)
 
         return str(full_path)
 
@@ -65,6 +169,66 @@ class LocalStorage(StorageBackend):
         async with aiofiles.open(full_path, 'rb') as f:
             return await f.read()
 
+    async def open_read(
+        self,
+        file_path: str,
+        byte_range: Optional[ByteRange] = None,
+    ) -> AsyncIterator[bytes]:
+        """Stream file from local filesystem"""
+        full_path = self.base_path / file_path
+        offset, remaining = _range_to_offset_length(byte_range)
+
+        async with aiofiles.open(full_path, 'rb') as f:
+            await f.seek(offset)
+            while remaining is None or remaining > 0:
+                size = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+                chunk = await f.read(size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    async def ingest(self, file_path: str, source_path: str, keep_source: bool = False) -> str:
+        """
+        Move (or hardlink, with keep_source) a local file into storage
+
+        Both are single atomic metadata operations when source and base_path
+        share a filesystem; otherwise falls back to a kernel-side copy.
+        """
+        full_path = self.base_path / file_path
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+
+        try:
+            if keep_source:
+                # Link under a temp name so an existing target is replaced atomically
+                tmp_path = full_path.with_name(f".{full_path.name}.{uuid.uuid4().hex}.tmp")
+                os.link(source_path, tmp_path)
+                os.replace(tmp_path, full_path)
+            else:
+                os.replace(source_path, full_path)
+            return str(full_path)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+
+        # Different filesystem (or no hardlink support): copy then atomically rename
+        tmp_path = full_path.with_name(f".{full_path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            await asyncio.to_thread(shutil.copyfile, source_path, tmp_path)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        if not keep_source:
+            os.unlink(source_path)
+
+        return str(full_path)
+
+    def local_path(self, file_path: str) -> Optional[str]:
+        """Filesystem path of stored file"""
+        return str(self.base_path / file_path)
+
     async def delete(self, file_path: str) -> bool:
         """Delete file from local filesystem"""
         try:
@@ -87,6 +251,9 @@ class LocalStorage(StorageBackend):
 class S3Storage(StorageBackend):
     """AWS S3 storage"""
 
+    # Multipart part size for streamed uploads (S3 minimum is 5MB)
+    part_size = 8 * 1024 * 1024
+
     def __init__(self, bucket: str, region: str, access_key: str, secret_key: str):
         import boto3
 
@@ -100,30 +267,135 @@ class S3Storage(StorageBackend):
 
     async def save(self, file_path: str, content: BinaryIO) -> str:
         """Save file to S3"""
-        self.s3_client.put_object(
-            Bucket=self.bucket,
-            Key=file_path,
-            Body=content.read()
-        )
+        return await self.save_stream(file_path, iter_file(content, self.part_size))
+
+    async def save_stream(self, file_path: str, chunks: AsyncIterator[bytes]) -> str:
+        """Save chunk stream to S3 (multipart upload once it exceeds one part)"""
+        upload_id = None
+        completed_parts = []
+        pending = None
+
+        async def upload_part(data: bytes):
+            part_number = len(completed_parts) + 1
+            response = await asyncio.to_thread(
+                self.s3_client.upload_part,
+                Bucket=self.bucket,
+                Key=file_path,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=data
+            )
+            completed_parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+
+        try:
+            async for part in _rechunk(chunks, self.part_size):
+                if pending is not None:
+                    if upload_id is None:
+                        response = await asyncio.to_thread(
+                            self.s3_client.create_multipart_upload,
+                            Bucket=self.bucket,
+                            Key=file_path
+                        )
+                        upload_id = response["UploadId"]
+                    await upload_part(pending)
+                pending = part
+
+            if upload_id is None:
+                # Fits in a single part - plain PutObject
+                await asyncio.to_thread(
+                    self.s3_client.put_object,
+                    Bucket=self.bucket,
+                    Key=file_path,
+                    Body=pending or b""
+                )
+            else:
+                await upload_part(pending)
+                await asyncio.to_thread(
+                    self.s3_client.complete_multipart_upload,
+                    Bucket=self.bucket,
+                    Key=file_path,
+                    UploadId=upload_id,
+                    MultipartUpload={"Parts": completed_parts}
+                )
+        except BaseException:
+            if upload_id is not None:
+                await asyncio.to_thread(
+                    self.s3_client.abort_multipart_upload,
+                    Bucket=self.bucket,
+                    Key=file_path,
+                    UploadId=upload_id
+                )
+            raise
+
         return f"s3://{self.bucket}/{file_path}"
 
     async def load(self, file_path: str) -> bytes:
         """Load file from S3"""
-        response = self.s3_client.get_object(Bucket=self.bucket, Key=file_path)
-        return response['Body'].read()
+        def get_object() -> bytes:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=file_path)
+            return response['Body'].read()
+
+        return await asyncio.to_thread(get_object)
+
+    async def open_read(
+        self,
+        file_path: str,
+        byte_range: Optional[ByteRange] = None,
+    ) -> AsyncIterator[bytes]:
+        """Stream object from S3"""
+        params = {"Bucket": self.bucket, "Key": file_path}
+        if byte_range is not None:
+            start, end = byte_range
+            params["Range"] = f"bytes={start}-{'' if end is None else end}"
+
+        response = await asyncio.to_thread(self.s3_client.get_object, **params)
+        body = response['Body']
+        try:
+            while True:
+                chunk = await asyncio.to_thread(body.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
 
     async def delete(self, file_path: str) -> bool:
         """Delete file from S3"""
         try:
-            self.s3_client.delete_object(Bucket=self.bucket, Key=file_path)
+            await asyncio.to_thread(self.s3_client.delete_object, Bucket=self.bucket, Key=file_path)
             return True
         except Exception:
             return False
 
+    async def delete_many(self, file_paths: List[str], concurrency: int) -> List[dict]:
+        """Delete files from S3 with DeleteObjects (up to 1000 keys per request)"""
+        batches = [file_paths[i:i + 1000] for i in range(0, len(file_paths), 1000)]
+
+        async def delete_batch(keys: List[str]) -> List[dict]:
+            try:
+                response = await asyncio.to_thread(
+                    self.s3_client.delete_objects,
+                    Bucket=self.bucket,
+                    Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True}
+                )
+            except Exception as e:
+                return [{"path": key, "status": "error", "error": str(e)} for key in keys]
+
+            # Quiet mode only reports failures
+            errors = {err["Key"]: err.get("Message", err.get("Code", "")) for err in response.get("Errors", [])}
+            return [
+                {"path": key, "status": "error", "error": errors[key]} if key in errors
+                else {"path": key, "status": "success", "result": True}
+                for key in keys
+            ]
+
+        outcomes = await run_bounded(batches, delete_batch, concurrency, key=lambda keys: keys[0])
+        return [item for outcome in outcomes for item in outcome["result"]]
+
     async def exists(self, file_path: str) -> bool:
         """Check if file exists in S3"""
         try:
-            self.s3_client.head_object(Bucket=self.bucket, Key=file_path)
+            await asyncio.to_thread(self.s3_client.head_object, Bucket=self.bucket, Key=file_path)
             return True
         except Exception:
             return False
@@ -138,49 +410,156 @@ class S3Storage(StorageBackend):
 
 
 class AzureStorage(StorageBackend):
-    """Azure Blob Storage"""
+    """Azure Blob Storage (non-blocking, azure.storage.blob.aio)"""
 
-    def __init__(self, connection_string: str, container: str):
-        from azure.storage.blob import BlobServiceClient
+    def __init__(
+        self,
+        connection_string: str,
+        container: str,
+        block_size: int = 4 * 1024 * 1024,
+        max_concurrency: int = 8,
+    ):
+        from azure.storage.blob.aio import BlobServiceClient
 
         self.container = container
+        self.block_size = block_size
+        self.max_concurrency = max_concurrency
+
+        # One service/container client shared by all requests; the container
+        # is created lazily on first write instead of at construction time.
         self.blob_service = BlobServiceClient.from_connection_string(connection_string)
         self.container_client = self.blob_service.get_container_client(container)
+        self._container_ready = False
+        self._container_lock = asyncio.Lock()
 
-        # Create container if it doesn't exist
-        try:
-            self.container_client.create_container()
-        except Exception:
-            pass  # Container already exists
+    async def _ensure_container(self):
+        """Create the container on first use"""
+        if self._container_ready:
+            return
+
+        from azure.core.exceptions import ResourceExistsError
+
+        async with self._container_lock:
+            if self._container_ready:
+                return
+            try:
+                await self.container_client.create_container()
+            except ResourceExistsError:
+                pass  # Container already exists
+            self._container_ready = True
 
     async def save(self, file_path: str, content: BinaryIO) -> str:
         """Save file to Azure Blob"""
+        return await self.save_stream(file_path, iter_file(content, self.block_size))
+
+    async def save_stream(self, file_path: str, chunks: AsyncIterator[bytes]) -> str:
+        """Save chunk stream to Azure Blob"""
+        await self._ensure_container()
         blob_client = self.container_client.get_blob_client(file_path)
-        blob_client.upload_blob(content.read(), overwrite=True)
+
+        blocks = _rechunk(chunks, self.block_size)
+        first_block = await anext(blocks, b"")
+        if len(first_block) < self.block_size:
+            # Small file - single Put Blob request
+            await blob_client.upload_blob(first_block, overwrite=True)
+        else:
+            await self._upload_blocks(blob_client, first_block, blocks)
+
         return f"azure://{self.container}/{file_path}"
 
+    async def _upload_blocks(self, blob_client, first_block: bytes, blocks: AsyncIterator[bytes]):
+        """Stage blocks in parallel (at most max_concurrency in flight) and commit"""
+        from azure.storage.blob import BlobBlock
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        block_list = []
+        tasks = []
+
+        async def stage(block_id: str, data: bytes):
+            try:
+                await blob_client.stage_block(block_id, data)
+            finally:
+                semaphore.release()
+
+        try:
+            data = first_block
+            while data:
+                # Bound memory: wait for a free slot before staging the next block
+                await semaphore.acquire()
+                block_id = base64.b64encode(f"{len(block_list):08d}".encode()).decode()
+                block_list.append(BlobBlock(block_id=block_id))
+                tasks.append(asyncio.create_task(stage(block_id, data)))
+                data = await anext(blocks, b"")
+
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        await blob_client.commit_block_list(block_list)
+
+    async def open_read(
+        self,
+        file_path: str,
+        byte_range: Optional[ByteRange] = None,
+    ) -> AsyncIterator[bytes]:
+        """Stream blob content in chunks without buffering the whole blob"""
+        offset, length = _range_to_offset_length(byte_range)
+        blob_client = self.container_client.get_blob_client(file_path)
+        downloader = await blob_client.download_blob(
+            offset=offset,
+            length=length,
+            max_concurrency=self.max_concurrency,
+        )
+        async for chunk in downloader.chunks():
+            yield chunk
+
     async def load(self, file_path: str) -> bytes:
         """Load file from Azure Blob"""
-        blob_client = self.container_client.get_blob_client(file_path)
-        return blob_client.download_blob().readall()
+        buffer = bytearray()
+        async for chunk in self.open_read(file_path):
+            buffer.extend(chunk)
+        return bytes(buffer)
 
     async def delete(self, file_path: str) -> bool:
         """Delete file from Azure Blob"""
+        from azure.core.exceptions import ResourceNotFoundError
+
         try:
             blob_client = self.container_client.get_blob_client(file_path)
-            blob_client.delete_blob()
+            await blob_client.delete_blob()
             return True
-        except Exception:
+        except ResourceNotFoundError:
             return False
 
+    async def delete_many(self, file_paths: List[str], concurrency: int) -> List[dict]:
+        """Delete blobs with Blob Batch requests (up to 256 blobs per request)"""
+        batches = [file_paths[i:i + 256] for i in range(0, len(file_paths), 256)]
+
+        async def delete_batch(names: List[str]) -> List[dict]:
+            try:
+                responses = await self.container_client.delete_blobs(
+                    *names, raise_on_any_failure=False
+                )
+                statuses = [response.status_code async for response in responses]
+            except Exception as e:
+                return [{"path": name, "status": "error", "error": str(e)} for name in names]
+
+            return [
+                {"path": name, "status": "success", "result": code == 202}
+                if code in (202, 404)
+                else {"path": name, "status": "error", "error": f"HTTP {code}"}
+                for name, code in zip(names, statuses)
+            ]
+
+        outcomes = await run_bounded(batches, delete_batch, concurrency, key=lambda names: names[0])
+        return [item for outcome in outcomes for item in outcome["result"]]
+
     async def exists(self, file_path: str) -> bool:
         """Check if file exists in Azure Blob"""
-        try:
-            blob_client = self.container_client.get_blob_client(file_path)
-            blob_client.get_blob_properties()
-            return True
-        except Exception:
-            return False
+        blob_client = self.container_client.get_blob_client(file_path)
+        return await blob_client.exists()
 
     async def get_url(self, file_path: str, expires_in: int = 3600) -> str:
         """Get SAS URL for Azure Blob"""
@@ -198,6 +577,11 @@ class AzureStorage(StorageBackend):
 
         return f"{self.container_client.url}/{file_path}?{sas_token}"
 
+    async def close(self):
+        """Close shared Azure clients"""
+        await self.container_client.close()
+        await self.blob_service.close()
+
 
 class StorageManager:
     """Main storage manager that uses appropriate backend"""
@@ -218,19 +602,84 @@ class StorageManager:
         elif config["type"] == "azure":
             self.backend = AzureStorage(
                 connection_string=config["connection_string"],
-                container=config["container"]
+                container=config["container"],
+                block_size=config["block_size"],
+                max_concurrency=config["max_concurrency"]
             )
         else:
             raise ValueError(f"Unsupported storage type: {config['type']}")
 
+        # Max concurrent requests for batch operations
+        self.batch_concurrency = config["batch_concurrency"]
+
+        # Put a local disk cache in front of remote backends
+        cache_config = config.get("cache")
+        if cache_config and cache_config["enabled"]:
+            from .cache import CachedStorage
+
+            self.backend = CachedStorage(
+                remote=self.backend,
+                cache_path=cache_config["path"],
+                max_bytes=cache_config["max_bytes"],
+                ttl_seconds=cache_config["ttl_seconds"],
+                write_through=cache_config["write_through"]
+            )
+
     async def save_file(self, relative_path: str, content: BinaryIO) -> str:
         """Save file using configured backend"""
         return await self.backend.save(relative_path, content)
 
+    async def save_file_stream(self, relative_path: str, chunks: AsyncIterator[bytes]) -> str:
+        """Save chunk stream using configured backend"""
+        return await self.backend.save_stream(relative_path, chunks)
+
+    async def ingest_file(self, relative_path: str, source_path: str, keep_source: bool = False) -> str:
+        """Store a local file, moving/linking it when the backend allows"""
+        return await self.backend.ingest(relative_path, source_path, keep_source)
+
+    def get_local_path(self, file_path: str) -> Optional[str]:
+        """Filesystem path for direct serving, or None for remote backends"""
+        return self.backend.local_path(file_path)
+
     async def load_file(self, file_path: str) -> bytes:
         """Load file using configured backend"""
         return await self.backend.load(file_path)
 
+    async def save_many(self, items: List[Tuple[str, Union[str, BinaryIO]]]) -> List[dict]:
+        """
+        Save several files concurrently
+
+        Args:
+            items: (relative_path, source) pairs; a str source is a local file
+                path that is ingested (moved into storage), otherwise a file object
+
+        Returns:
+            Per-item outcomes (see run_bounded), result is the storage path
+        """
+        async def save_one(item) -> str:
+            relative_path, source = item
+            if isinstance(source, str):
+                return await self.backend.ingest(relative_path, source)
+            return await self.backend.save(relative_path, source)
+
+        return await run_bounded(items, save_one, self.batch_concurrency, key=lambda item: item[0])
+
+    async def load_many(self, file_paths: List[str]) -> List[dict]:
+        """Load several files concurrently; result is the file content"""
+        return await run_bounded(file_paths, self.backend.load, self.batch_concurrency)
+
+    async def delete_many(self, file_paths: List[str]) -> List[dict]:
+        """Delete several files, using the backend's batch API where available"""
+        return await self.backend.delete_many(file_paths, self.batch_concurrency)
+
+    def open_file(
+        self,
+        file_path: str,
+        byte_range: Optional[ByteRange] = None,
+    ) -> AsyncIterator[bytes]:
+        """Stream file content in chunks using configured backend"""
+        return self.backend.open_read(file_path, byte_range)
+
     async def delete_file(self, file_path: str) -> bool:
         """Delete file using configured backend"""
         return await self.backend.delete(file_path)
@@ -243,6 +692,14 @@ class StorageManager:
         """Get accessible URL for file"""
         return await self.backend.get_url(file_path, expires_in)
 
+    def get_stats(self) -> dict:
+        """Get backend statistics"""
+        return self.backend.get_stats()
+
+    async def close(self):
+        """Close backend resources"""
+        await self.backend.close()
+
 
 # Global storage manager instance
 _storage_manager: Optional[StorageManager] = None
@@ -3,8 +3,11 @@ Study Management and DICOM Upload API
 """
 import os
 import uuid
-from typing import List
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from typing import List, Optional
+
+import aiofiles
+from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config.database import get_db
@@ -12,6 +15,8 @@ from app.config.models import Study, Series, Image, Patient, StudyStatus
 from app.config.settings import get_settings
 from app.dicom.processor import DICOMProcessor
 from app.storage import get_storage_manager
+from app.storage.manager import CHUNK_SIZE
+from .service import StudyService
 
 router = APIRouter(prefix="/api/studies", tags=["studies"])
 settings = get_settings()
@@ -45,9 +50,9 @@ async def upload_dicom_study(
             temp_path = os.path.join(settings.temp_upload_dir, upload_id, file.filename)
             os.makedirs(os.path.dirname(temp_path), exist_ok=True)
 
-            with open(temp_path, "wb") as f:
-                content = await file.read()
-                f.write(content)
+            async with aiofiles.open(temp_path, "wb") as f:
+                while chunk := await file.read(CHUNK_SIZE):
+                    await f.write(chunk)
 
             temp_files.append(temp_path)
 
@@ -77,6 +82,9 @@ async def upload_dicom_study(
         db.add(study)
         await db.flush()
 
+        # (storage_path, temp file) pairs, stored together after parsing
+        transfers = []
+
         # Process each series
         for series_uid, series_files in series_map.items():
             # Get series metadata from first file
@@ -101,20 +109,19 @@ async def upload_dicom_study(
             for file_path in series_files:
                 dcm = processor.parse_dicom(file_path)
                 image_meta = processor.extract_image_metadata(dcm)
-
-                # Save DICOM file to storage
-                storage_path = f"studies/{study.id}/series/{series.id}/{os.path.basename(file_path)}"
-                with open(file_path, 'rb') as f:
-                    await storage.save_file(storage_path, f)
+                file_size = os.path.getsize(file_path)
 
                 # Generate thumbnail
                 thumbnail_path = f"thumbnails/{study.id}/{series.id}/{image_meta['sop_instance_uid']}.png"
-                thumbnail_full_path = os.path.join(settings.temp_upload_dir, thumbnail_path)
+                thumbnail_full_path = os.path.join(settings.temp_upload_dir, upload_id, thumbnail_path)
                 processor.generate_thumbnail(dcm, thumbnail_full_path)
 
+                # Queue DICOM file and thumbnail for storage
+                storage_path = f"studies/{study.id}/series/{series.id}/{os.path.basename(file_path)}"
+                transfers.append((storage_path, file_path))
+
                 if os.path.exists(thumbnail_full_path):
-                    with open(thumbnail_full_path, 'rb') as f:
-                        await storage.save_file(thumbnail_path, f)
+                    transfers.append((thumbnail_path, thumbnail_full_path))
 
                 # Create image record
                 image = Image(
@@ -132,10 +139,24 @@ async def upload_dicom_study(
                     window_width=image_meta["window_width"],
                     storage_path=storage_path,
                     thumbnail_path=thumbnail_path,
-                    file_size=os.path.getsize(file_path)
+                    file_size=file_size
                 )
                 db.add(image)
 
+        # Store all files with bounded concurrency (moved into place for local storage)
+        outcomes = await storage.save_many(transfers)
+        failed = [o for o in outcomes if o["status"] == "error"]
+        if failed:
+            stored = [o["path"] for o in outcomes if o["status"] == "success"]
+            await storage.delete_many(stored)
+            raise RuntimeError(
+                f"{len(failed)} of {len(outcomes)} files could not be stored "
+                f"(first error: {failed[0]['error']})"
+            )
+
+        # Link the study to its prior for comparison analyses
+        await StudyService.assign_prior_study(db, study)
+
         # Update study status
         study.status = StudyStatus.COMPLETED
         await db.commit()
@@ -145,6 +166,7 @@ async def upload_dicom_study(
             "study_instance_uid": study.study_instance_uid,
             "series_count": len(series_map),
             "total_images": sum(len(files) for files in series_map.values()),
+            "prior_study_id": study.prior_study_id,
             "status": "completed"
         }
 
@@ -161,6 +183,89 @@ async def upload_dicom_study(
             shutil.rmtree(temp_dir)
 
 
+@router.get("/images/{image_id}/file")
+async def get_image_file(
+    image_id: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Stream a stored DICOM instance
+    Supports single HTTP byte ranges so viewers can fetch partial frames
+    """
+    image = await db.get(Image, image_id)
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    storage = get_storage_manager()
+    local_path = storage.get_local_path(image.storage_path)
+    if local_path and not range_header:
+        # Let the server send the file directly instead of reading it in Python
+        return FileResponse(local_path, media_type="application/dicom")
+
+    headers = {"Accept-Ranges": "bytes"}
+    byte_range = _parse_range_header(range_header, image.file_size) if range_header else None
+
+    if byte_range is None:
+        status_code = 200
+        if image.file_size is not None:
+            headers["Content-Length"] = str(image.file_size)
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{image.file_size}"
+        headers["Content-Length"] = str(end - start + 1)
+
+    return StreamingResponse(
+        storage.open_file(image.storage_path, byte_range),
+        status_code=status_code,
+        media_type="application/dicom",
+        headers=headers
+    )
+
+
+@router.get("/images/{image_id}/thumbnail")
+async def get_image_thumbnail(image_id: str, db: AsyncSession = Depends(get_db)):
+    """Stream the PNG thumbnail for an image"""
+    image = await db.get(Image, image_id)
+    if not image or not image.thumbnail_path:
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+
+    storage = get_storage_manager()
+    local_path = storage.get_local_path(image.thumbnail_path)
+    if local_path:
+        return FileResponse(local_path, media_type="image/png")
+
+    return StreamingResponse(storage.open_file(image.thumbnail_path), media_type="image/png")
+
+
+def _parse_range_header(range_header: str, file_size: Optional[int]) -> tuple:
+    """Parse a single 'bytes=start-end' range into an inclusive (start, end) tuple"""
+    if file_size is None:
+        raise HTTPException(status_code=416, detail="Range not satisfiable")
+
+    try:
+        unit, _, spec = range_header.partition("=")
+        if unit.strip() != "bytes" or "," in spec:
+            raise ValueError
+        start_str, _, end_str = spec.strip().partition("-")
+        if start_str:
+            start = int(start_str)
+            end = int(end_str) if end_str else file_size - 1
+        else:
+            # Suffix range: last N bytes
+            start = max(file_size - int(end_str), 0)
+            end = file_size - 1
+    except ValueError:
+        raise HTTPException(status_code=416, detail="Range not satisfiable")
+
+    end = min(end, file_size - 1)
+    if start > end:
+        raise HTTPException(status_code=416, detail="Range not satisfiable")
+
+    return start, end
+
+
 @router.get("/{study_id}")
 async def get_study(study_id: str, db: AsyncSession = Depends(get_db)):
     """Get study details"""
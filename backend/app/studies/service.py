@@ -0,0 +1,83 @@
+"""
+Study service layer
+Links each study to the prior study it should be compared against
+"""
+from typing import List, Optional
+
+from sqlalchemy import case, exists, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.config.models import Series, Study
+
+
+class StudyService:
+    """Service for study relationships"""
+
+    @staticmethod
+    async def select_prior_study(db: AsyncSession, study: Study) -> Optional[str]:
+        """
+        Most relevant prior study for a study, in one query
+
+        Candidates are the patient's earlier studies of the same modality,
+        found through ix_studies_patient_modality_date. A candidate sharing
+        a body part with the study (Series.body_part_examined) ranks first.
+        Candidates of a different body part are skipped. When either study
+        has no body part recorded, only recency decides.
+        """
+        current = aliased(Series)
+        current_parts = (
+            select(func.upper(current.body_part_examined))
+            .where(current.study_id == study.id, func.coalesce(current.body_part_examined, "") != "")
+        )
+        shares_part = exists().where(
+            Series.study_id == Study.id,
+            func.upper(Series.body_part_examined).in_(current_parts)
+        )
+        has_part = exists().where(Series.study_id == Study.id, func.coalesce(Series.body_part_examined, "") != "")
+
+        result = await db.execute(
+            select(Study.id)
+            .where(
+                Study.patient_id == study.patient_id,
+                Study.modality == study.modality,
+                Study.study_date < study.study_date,
+                Study.id != study.id,
+                or_(shares_part, ~has_part, ~current_parts.exists()),
+            )
+            .order_by(case((shares_part, 0), else_=1), Study.study_date.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+    @staticmethod
+    async def assign_prior_study(db: AsyncSession, study: Study) -> List[str]:
+        """
+        Set study.prior_study_id, and re-point follow-ups this study now precedes
+
+        Studies are not always ingested in date order; when an older study
+        arrives, later studies whose prior predates it (or that have none)
+        are re-evaluated. Returns the ids of re-pointed follow-up studies.
+        """
+        # The selection reads the study's series, and sessions don't autoflush
+        await db.flush()
+        study.prior_study_id = await StudyService.select_prior_study(db, study)
+
+        prior = aliased(Study)
+        result = await db.execute(
+            select(Study)
+            .outerjoin(prior, prior.id == Study.prior_study_id)
+            .where(
+                Study.patient_id == study.patient_id,
+                Study.modality == study.modality,
+                Study.study_date > study.study_date,
+                or_(prior.id.is_(None), prior.study_date < study.study_date),
+            )
+        )
+        updated = []
+        for follow_up in result.scalars().all():
+            prior_study_id = await StudyService.select_prior_study(db, follow_up)
+            if prior_study_id != follow_up.prior_study_id:
+                follow_up.prior_study_id = prior_study_id
+                updated.append(follow_up.id)
+        return updated
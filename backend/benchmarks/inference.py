@@ -0,0 +1,396 @@
+"""
+MedGemma Inference Benchmark
+Replays PromptBuilder prompts through MedGemmaEngine at fixed concurrency levels
+
+    # Simulated engine (no GPU or weights needed)
+    python -m benchmarks.inference --engine mock --concurrency 1,4,16
+
+    # Local CPU run against a tiny causal LM checkpoint
+    python -m benchmarks.inference --engine local --model-path ./models/tiny --device cpu --quantization none
+
+    # APIMedGemma against the bundled stub server (started automatically)
+    python -m benchmarks.inference --engine api
+
+    # Compare with an earlier run
+    python -m benchmarks.inference --engine mock --output new.json --baseline old.json
+
+Per concurrency level it reports time to first token, p50/p95/p99 latency,
+throughput and peak memory, and writes everything as JSON.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from itertools import cycle, islice
+from typing import Dict, List, Optional
+
+# Benchmarks never touch the database-backed result cache, and settings need a secret key
+os.environ.setdefault("SECRET_KEY", "benchmark-only-secret-key-not-for-production")
+os.environ["MEDGEMMA_CACHE_ENABLED"] = "false"
+
+from app.medgemma import MedGemmaEngine, PromptBuilder  # noqa: E402
+
+
+def build_prompts() -> List[str]:
+    """A fixed, representative mix of primary, comparison and focused prompts"""
+    prompts = []
+    for modality, body_part, indication in [
+        ("CT", "chest", "Persistent cough, rule out malignancy"),
+        ("CT", "abdomen", "Right lower quadrant pain, suspected appendicitis"),
+        ("MRI", "brain", "New onset seizures"),
+        ("MRI", "lumbar spine", "Low back pain with left leg radiculopathy"),
+    ]:
+        prompts.append(PromptBuilder.build_primary_analysis_prompt(
+            modality=modality,
+            body_part=body_part,
+            clinical_indication=indication,
+            technical_params={"study_description": f"{modality} {body_part}", "series_count": 3},
+        ))
+        prompts.append(PromptBuilder.build_comparison_analysis_prompt(
+            modality=modality,
+            body_part=body_part,
+            clinical_indication=f"Follow-up: {indication}",
+            prior_study_date="2024-01-15",
+            prior_findings="No significant abnormalities noted in prior study.",
+        ))
+
+    prompts.append(PromptBuilder.build_focused_finding_prompt(
+        modality="CT",
+        finding_type="pulmonary nodule",
+        location="right upper lobe",
+        additional_context="6 mm solid nodule, former smoker",
+    ))
+    return prompts
+
+
+def load_prompts(path: str) -> List[str]:
+    """Prompts from a JSON-lines file with a "prompt" field per line (e.g. exported analyses)"""
+    with open(path) as f:
+        return [json.loads(line)["prompt"] for line in f if line.strip()]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def cuda_peak_mb(reset: bool = False) -> Optional[float]:
+    """Peak CUDA memory allocated since the last reset, if torch and a GPU are present"""
+    try:
+        import torch
+    except ImportError:
+        return None
+    if not torch.cuda.is_available():
+        return None
+    peak = torch.cuda.max_memory_allocated() / (1024 * 1024)
+    if reset:
+        torch.cuda.reset_peak_memory_stats()
+    return peak
+
+
+class TokenCounter:
+    """Counts generated tokens with the model tokenizer when there is one, else whitespace"""
+
+    def __init__(self, engine: MedGemmaEngine):
+        self.tokenizer = getattr(engine.engine, "tokenizer", None)
+        self.method = "tokenizer" if self.tokenizer is not None else "whitespace"
+
+    def __call__(self, text: str) -> int:
+        if self.tokenizer is not None:
+            return len(self.tokenizer(text, add_special_tokens=False).input_ids)
+        return len(text.split())
+
+
+async def run_request(engine: MedGemmaEngine, prompt: str, args, count_tokens: TokenCounter) -> Dict:
+    """One timed analysis; in analyze mode the first token arrives with the full response"""
+    started = time.perf_counter()
+
+    if args.mode == "stream":
+        result = None
+        async for event in engine.analyze_stream(prompt, args.max_tokens, args.temperature, use_cache=False):
+            if event["type"] == "result":
+                result = event
+        ttft = result.get("time_to_first_token") if result else None
+    else:
+        result = await engine.analyze(prompt, args.max_tokens, args.temperature, use_cache=False)
+        ttft = None
+
+    latency = time.perf_counter() - started
+    ok = result is not None and result["status"] == "success"
+    return {
+        "ok": ok,
+        "latency": latency,
+        "ttft": ttft if ttft is not None else latency,
+        "tokens": count_tokens(result["response"]) if ok else 0,
+        "error": None if ok else (result or {}).get("error", "no result"),
+    }
+
+
+async def run_level(engine: MedGemmaEngine, prompts: List[str], concurrency: int, args, count_tokens) -> Dict:
+    """Run args.requests requests with at most `concurrency` in flight"""
+    queue: asyncio.Queue = asyncio.Queue()
+    for prompt in islice(cycle(prompts), args.requests):
+        queue.put_nowait(prompt)
+
+    samples = []
+
+    async def worker():
+        while not queue.empty():
+            prompt = queue.get_nowait()
+            samples.append(await run_request(engine, prompt, args, count_tokens))
+
+    cuda_peak_mb(reset=True)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    succeeded = [s for s in samples if s["ok"]]
+    latencies = [s["latency"] for s in succeeded]
+    ttfts = [s["ttft"] for s in succeeded]
+    tokens = sum(s["tokens"] for s in succeeded)
+    errors = [s["error"] for s in samples if not s["ok"]]
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "wall_seconds": wall,
+        "requests_per_second": len(succeeded) / wall if wall else 0.0,
+        "tokens_per_second": tokens / wall if wall else 0.0,
+        "generated_tokens": tokens,
+        "latency_seconds": {
+            "mean": statistics.fmean(latencies) if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies) if latencies else None,
+        },
+        "ttft_seconds": {
+            "p50": percentile(ttfts, 50),
+            "p95": percentile(ttfts, 95),
+            "p99": percentile(ttfts, 99),
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_cuda_mb": cuda_peak_mb(),
+    }
+
+
+async def start_stub_server(args):
+    """Run benchmarks.stub_server in-process and return (server, task, endpoint)"""
+    import uvicorn
+    from app.medgemma.mock_engine import MockMedGemma
+    from .stub_server import create_stub_app
+
+    mock = MockMedGemma(
+        ttft=args.mock_ttft,
+        tokens_per_second=args.mock_tokens_per_second,
+        max_concurrency=args.mock_max_concurrency,
+    )
+    config = uvicorn.Config(create_stub_app(mock), host="127.0.0.1", port=args.stub_port, log_level="warning")
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    return server, task, f"http://127.0.0.1:{args.stub_port}/v1/inference"
+
+
+def build_engine(args, endpoint: Optional[str]) -> MedGemmaEngine:
+    """The benchmarked backend wrapped in MedGemmaEngine"""
+    if args.engine == "mock":
+        from app.medgemma.mock_engine import MockMedGemma
+        backend = MockMedGemma(
+            ttft=args.mock_ttft,
+            tokens_per_second=args.mock_tokens_per_second,
+            max_concurrency=args.mock_max_concurrency,
+            seed=0,
+        )
+    elif args.engine == "local":
+        from app.medgemma.engine import LocalMedGemma
+        backend = LocalMedGemma(
+            model_path=args.model_path,
+            device=args.device,
+            quantization=args.quantization,
+            max_batch_size=args.max_batch_size,
+            max_queue_size=0,
+            cpu_threads=args.cpu_threads,
+            cpu_interop_threads=args.cpu_interop_threads,
+            mmap_weights=not args.no_mmap,
+            draft_model_path=args.draft_model_path,
+            draft_num_tokens=args.draft_num_tokens,
+        )
+    else:
+        from app.medgemma.engine import APIMedGemma
+        backend = APIMedGemma(api_key=args.api_key, endpoint=endpoint, health_check_path="")
+    return MedGemmaEngine(engine=backend)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict, baseline: Dict):
+    """Print per-level deltas against a previous results file"""
+    previous = {level["concurrency"]: level for level in baseline["levels"]}
+    print(f"\nvs baseline {baseline['meta'].get('git_revision')} ({baseline['meta'].get('timestamp')}):")
+    for level in results["levels"]:
+        old = previous.get(level["concurrency"])
+        if old is None:
+            continue
+
+        def delta(new_value, old_value):
+            if not new_value or not old_value:
+                return "n/a"
+            return f"{(new_value - old_value) / old_value * 100:+.1f}%"
+
+        print(
+            f"  c={level['concurrency']:<4} "
+            f"p95 {delta(level['latency_seconds']['p95'], old['latency_seconds']['p95'])}  "
+            f"tok/s {delta(level['tokens_per_second'], old['tokens_per_second'])}  "
+            f"ttft p50 {delta(level['ttft_seconds']['p50'], old['ttft_seconds']['p50'])}"
+        )
+
+
+def print_level(level: Dict):
+    latency, ttft = level["latency_seconds"], level["ttft_seconds"]
+
+    def fmt(value):
+        return f"{value:.3f}" if value is not None else "-"
+
+    print(
+        f"c={level['concurrency']:<4} n={level['requests']:<5} err={level['errors']:<3} "
+        f"ttft p50={fmt(ttft['p50'])}s  "
+        f"p50={fmt(latency['p50'])}s p95={fmt(latency['p95'])}s p99={fmt(latency['p99'])}s  "
+        f"{level['tokens_per_second']:.1f} tok/s  {level['requests_per_second']:.2f} req/s  "
+        f"rss={level['peak_rss_mb']:.0f}MB"
+    )
+
+
+async def run(args) -> Dict:
+    prompts = load_prompts(args.prompts) if args.prompts else build_prompts()
+
+    server = stub_task = None
+    endpoint = args.endpoint
+    if args.engine == "api" and endpoint is None:
+        server, stub_task, endpoint = await start_stub_server(args)
+
+    engine = build_engine(args, endpoint)
+    try:
+        # Loading and warm-up are excluded from the measurements
+        load_started = time.perf_counter()
+        await engine.wait_until_ready()
+        load_seconds = time.perf_counter() - load_started
+        await engine.analyze(prompts[0], min(args.max_tokens, 16), args.temperature, use_cache=False)
+
+        count_tokens = TokenCounter(engine)
+        levels = []
+        for concurrency in args.concurrency:
+            level = await run_level(engine, prompts, concurrency, args, count_tokens)
+            print_level(level)
+            levels.append(level)
+
+        model_info = engine.engine.get_model_info()
+    finally:
+        await engine.close()
+        if server is not None:
+            server.should_exit = True
+            await stub_task
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "git_revision": git_revision(),
+            "label": args.label,
+            "engine": args.engine,
+            "mode": args.mode,
+            "max_tokens": args.max_tokens,
+            "temperature": args.temperature,
+            "requests_per_level": args.requests,
+            "prompt_count": len(prompts),
+            "token_counter": count_tokens.method,
+            "load_seconds": load_seconds,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "model_info": model_info,
+        },
+        "levels": levels,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", choices=["mock", "local", "api"], default="mock")
+    parser.add_argument("--concurrency", default="1,4,8", help="comma-separated levels")
+    parser.add_argument("--requests", type=int, default=32, help="requests per concurrency level")
+    parser.add_argument("--mode", choices=["analyze", "stream"], default="analyze",
+                        help="analyze() exercises batching; stream measures real time to first token")
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--temperature", type=float, default=0.3)
+    parser.add_argument("--prompts", help="JSON-lines file of prompts to replay instead of the built-in mix")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="previous results JSON to compare against")
+    parser.add_argument("--label", help="free-form note stored in the results, e.g. '8bit + batch 4'")
+
+    local = parser.add_argument_group("local engine")
+    local.add_argument("--model-path", default="./models/medgemma-1.5")
+    local.add_argument("--device", choices=["cuda", "cpu"], default="cpu")
+    local.add_argument("--quantization", choices=["4bit", "8bit", "none"], default="none")
+    local.add_argument("--max-batch-size", type=int, default=4)
+    local.add_argument("--cpu-threads", type=int, default=0, help="intra-op threads (0 = torch default)")
+    local.add_argument("--cpu-interop-threads", type=int, default=0, help="inter-op threads (0 = torch default)")
+    local.add_argument("--no-mmap", action="store_true", help="read weights into RAM instead of memory-mapping")
+    local.add_argument("--draft-model-path", help="draft model for speculative decoding")
+    local.add_argument("--draft-num-tokens", type=int, default=5)
+
+    api = parser.add_argument_group("api engine")
+    api.add_argument("--endpoint", help="benchmark a running endpoint instead of the built-in stub")
+    api.add_argument("--api-key", default="benchmark")
+    api.add_argument("--stub-port", type=int, default=9123)
+
+    mock = parser.add_argument_group("mock engine / stub server")
+    mock.add_argument("--mock-ttft", type=float, default=0.2)
+    mock.add_argument("--mock-tokens-per-second", type=float, default=100.0)
+    mock.add_argument("--mock-max-concurrency", type=int, default=4)
+
+    args = parser.parse_args(argv)
+    args.concurrency = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, default=str)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
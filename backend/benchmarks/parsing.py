@@ -0,0 +1,199 @@
+"""
+Response Parsing Benchmark
+Times parse_response on a corpus of large MedGemma reports against the per-consumer string scans it replaced
+
+    python -m benchmarks.parsing --responses 200 --size-kb 32
+    python -m benchmarks.parsing --corpus analyses.jsonl --output parsing.json
+
+The legacy path is what storing an analysis and generating its report used to
+cost: keyword scans, a measurement regex and a lowercased confidence scan on
+store, then a find() per report section.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+os.environ.setdefault("SECRET_KEY", "benchmark-only-secret-key-not-for-production")
+os.environ["MEDGEMMA_CACHE_ENABLED"] = "false"
+
+from app.medgemma.mock_engine import MockMedGemma  # noqa: E402
+from app.medgemma.parser import parse_response  # noqa: E402
+
+from .inference import git_revision, percentile  # noqa: E402
+
+REGIONS = ["Lungs", "Mediastinum", "Airways", "Pleura", "Chest Wall", "Upper Abdomen", "Bones", "Soft Tissues"]
+LOBES = ["right upper", "right middle", "right lower", "left upper", "left lower"]
+ABNORMAL = [
+    "A {size}mm solid nodule is noted in the {lobe} lobe. This likely represents a benign granuloma.",
+    "Small {lobe} lobe consolidation, possibly infectious. Moderate confidence.",
+    "Mild atelectasis at the {lobe} lobe base measuring {size} x {size2} mm.",
+    "Trace pleural effusion on the {side} side, approximately {volume} mL.",
+]
+NORMAL = [
+    "No focal consolidation, pleural effusion, or pneumothorax is identified.",
+    "The heart size is normal.",
+    "No mediastinal or hilar lymphadenopathy is present.",
+    "The visualized soft tissues are unremarkable.",
+]
+
+
+def build_corpus(count: int, size_kb: int, seed: int = 0) -> List[str]:
+    """Primary/comparison-shaped reports padded with findings to about size_kb each"""
+    rng = random.Random(seed)
+    mock = MockMedGemma.__new__(MockMedGemma)
+    templates = [mock._mock_primary_response(), mock._mock_comparison_response()]
+    corpus = []
+
+    for index in range(count):
+        base = templates[index % len(templates)]
+        lines = []
+        while sum(len(line) + 1 for line in lines) < size_kb * 1024:
+            lines.append(f"\n{rng.choice(REGIONS)}:")
+            for _ in range(rng.randint(3, 8)):
+                template = rng.choice(ABNORMAL if rng.random() < 0.3 else NORMAL)
+                lines.append("- " + template.format(
+                    size=rng.randint(3, 30),
+                    size2=rng.randint(2, 20),
+                    lobe=rng.choice(LOBES),
+                    side=rng.choice(["left", "right"]),
+                    volume=rng.randint(5, 200),
+                ))
+        # Pad the findings section, keep the rest of the report as written
+        marker = "\nMEASUREMENTS:" if "\nMEASUREMENTS:" in base else "\nIMPRESSION:"
+        head, tail = base.split(marker, 1)
+        corpus.append(head + "\n".join(lines) + "\n" + marker + tail)
+    return corpus
+
+
+def load_corpus(path: str) -> List[str]:
+    """Responses from a JSON-lines file with a "raw_response" or "response" field per line"""
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [row.get("raw_response") or row["response"] for row in rows]
+
+
+def legacy_parse(response: str) -> Dict:
+    """The parsing formerly spread over AnalysisService.store_results and the report builder"""
+    findings = []
+    if "nodule" in response.lower():
+        findings.append({"type": "nodule"})
+    if "fracture" in response.lower():
+        findings.append({"type": "fracture"})
+    measurements = [
+        {"value": float(value), "unit": unit}
+        for value, unit in re.findall(r'(\d+(?:\.\d+)?)\s*(mm|cm|HU)', response)
+    ]
+
+    confidence_text = response.lower()
+    if "high confidence" in confidence_text:
+        confidence = 0.9
+    elif "moderate confidence" in confidence_text:
+        confidence = 0.7
+    elif "low confidence" in confidence_text:
+        confidence = 0.5
+    else:
+        confidence = 0.7
+
+    narrative = impression = None
+    if "FINDINGS:" in response:
+        start = response.find("FINDINGS:")
+        end = response.find("IMPRESSION:", start)
+        if end == -1:
+            end = response.find("MEASUREMENTS:", start)
+        narrative = response[start:end if end != -1 else len(response)].strip()
+    if "IMPRESSION:" in response:
+        start = response.find("IMPRESSION:")
+        end = response.find("RECOMMENDATIONS:", start)
+        impression = response[start:end if end != -1 else len(response)].strip()
+
+    return {
+        "findings": findings,
+        "measurements": measurements,
+        "confidence": confidence,
+        "narrative": narrative,
+        "impression": impression,
+    }
+
+
+def run_parser(name: str, parse: Callable[[str], Dict], corpus: List[str], rounds: int) -> Dict:
+    """Parse the whole corpus rounds times; latency is per response"""
+    latencies = []
+    parse(corpus[0])  # warm-up (regex compilation, imports)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for response in corpus:
+            t0 = time.perf_counter()
+            parse(response)
+            latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    total_bytes = sum(len(response.encode()) for response in corpus) * rounds
+    return {
+        "parser": name,
+        "responses": len(latencies),
+        "seconds": elapsed,
+        "responses_per_second": len(latencies) / elapsed,
+        "mb_per_second": total_bytes / elapsed / 1e6,
+        "latency_ms": {
+            "mean": statistics.mean(latencies) * 1000,
+            "p50": percentile(latencies, 50) * 1000,
+            "p95": percentile(latencies, 95) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+        },
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--responses", type=int, default=100, help="generated corpus size")
+    parser.add_argument("--size-kb", type=int, default=32, help="approximate size of each generated response")
+    parser.add_argument("--corpus", help="JSON-lines file of stored responses to parse instead")
+    parser.add_argument("--rounds", type=int, default=5, help="passes over the corpus per parser")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--label", help="free-form note stored in the results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    corpus = load_corpus(args.corpus) if args.corpus else build_corpus(args.responses, args.size_kb, args.seed)
+
+    results = []
+    for name, parse in (("legacy", legacy_parse), ("parse_response", parse_response)):
+        result = run_parser(name, parse, corpus, args.rounds)
+        latency = result["latency_ms"]
+        print(
+            f"{name:<15} {result['responses_per_second']:>9.1f} resp/s  {result['mb_per_second']:>7.1f} MB/s  "
+            f"p50={latency['p50']:.3f}ms p95={latency['p95']:.3f}ms"
+        )
+        results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "git_revision": git_revision(),
+                    "label": args.label,
+                    "corpus": args.corpus or "generated",
+                    "responses": len(corpus),
+                    "mean_response_kb": statistics.mean(len(response) for response in corpus) / 1024,
+                    "rounds": args.rounds,
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                },
+                "parsers": results,
+            }, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Stub MedGemma API Server
+Serves MockMedGemma output over HTTP so APIMedGemma can be benchmarked without a real endpoint
+
+    python -m benchmarks.stub_server --port 9000 --ttft 0.3 --tokens-per-second 60
+"""
+import argparse
+import json
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from app.medgemma.mock_engine import MockMedGemma
+from app.medgemma.stopping import StopCondition
+
+
+def create_stub_app(mock: MockMedGemma) -> FastAPI:
+    """Inference endpoint (JSON or SSE, like the production API) plus /health"""
+    app = FastAPI(title="MedGemma API stub")
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.post("/v1/inference")
+    async def inference(request: Request):
+        body = await request.json()
+        prompt = body.get("prompt", "")
+        max_tokens = body.get("max_tokens", 2048)
+        temperature = body.get("temperature", 0.3)
+        stop = StopCondition(body["stop"]) if body.get("stop") else None
+
+        if body.get("stream"):
+            async def events():
+                async for token in mock.generate_stream(prompt, max_tokens, temperature, stop):
+                    yield f"data: {json.dumps({'token': token})}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        return {"response": await mock.generate(prompt, max_tokens, temperature, stop)}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--tokens-per-second", type=float, default=60.0)
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    mock = MockMedGemma(
+        ttft=args.ttft,
+        tokens_per_second=args.tokens_per_second,
+        max_concurrency=args.max_concurrency,
+        error_rate=args.error_rate,
+    )
+    uvicorn.run(create_stub_app(mock), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
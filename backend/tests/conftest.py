@@ -0,0 +1,56 @@
+"""
+Test fixtures
+The app is pointed at a throwaway SQLite database before it is imported
+"""
+import os
+import tempfile
+
+_db_dir = tempfile.mkdtemp(prefix="radiantai-test-")
+os.environ["MODE"] = "offline"
+os.environ["DEBUG"] = "false"
+os.environ["SQLITE_DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ.setdefault("SECRET_KEY", "test-secret-key-not-for-production-use")
+
+import pytest  # noqa: E402
+import pytest_asyncio  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.analysis import context  # noqa: E402
+from app.config.database import Base, engine, init_db  # noqa: E402
+
+
+class QueryCounter:
+    """Counts statements sent to the database, via before_cursor_execute"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def reset(self):
+        self.statements = []
+
+
+@pytest_asyncio.fixture
+async def database():
+    """Fresh tables, and an empty prior context cache, for each test"""
+    context._prior_context_cache = None
+    await init_db()
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest.fixture
+def queries():
+    """QueryCounter attached to the test engine for the duration of a test"""
+    counter = QueryCounter()
+    event.listen(engine.sync_engine, "before_cursor_execute", counter)
+    yield counter
+    event.remove(engine.sync_engine, "before_cursor_execute", counter)
+
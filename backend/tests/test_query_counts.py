@@ -0,0 +1,169 @@
+"""
+Query counts of the analysis and report endpoints
+Guards against N+1 loading creeping back in: counts must not grow with batch size or findings
+"""
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+
+from app.analysis import context, routes
+from app.analysis.context import AnalysisContextLoader
+from app.config.database import AsyncSessionLocal
+from app.config.models import (
+    AnalysisStatus,
+    Finding,
+    Measurement,
+    MedGemmaAnalysis,
+    Modality,
+    Patient,
+    Series,
+    Study,
+)
+from app.medgemma.parser import parse_response
+from app.reports import routes as reports
+
+pytestmark = pytest.mark.asyncio
+
+PRIOR_RESPONSE = "FINDINGS:\n1. 6 mm nodule, right upper lobe.\n\nIMPRESSION:\n1. Pulmonary nodule.\n"
+
+FOLLOW_UPS = 25
+
+
+@pytest_asyncio.fixture
+async def seeded(database):
+    """A prior CT with a completed analysis and measurements, and follow-up CTs pointing at it"""
+    async with AsyncSessionLocal() as db:
+        patient = Patient(patient_id="P1", first_name="Test", last_name="Patient", date_of_birth=datetime(1970, 1, 1))
+        db.add(patient)
+        await db.flush()
+
+        prior = Study(
+            study_instance_uid="1.2.3.1",
+            patient_id=patient.id,
+            study_date=datetime(2024, 1, 1),
+            modality=Modality.CT,
+            study_description="CT chest",
+        )
+        db.add(prior)
+        await db.flush()
+        follow_ups = [
+            Study(
+                study_instance_uid=f"1.2.3.{index + 2}",
+                patient_id=patient.id,
+                study_date=datetime(2024, 7, 1),
+                modality=Modality.CT,
+                study_description="CT chest",
+                prior_study_id=prior.id,
+            )
+            for index in range(FOLLOW_UPS)
+        ]
+        db.add_all(follow_ups)
+        await db.flush()
+        for study in [prior] + follow_ups:
+            for number in (1, 2):
+                db.add(Series(
+                    series_instance_uid=f"{study.study_instance_uid}.{number}",
+                    study_id=study.id,
+                    series_number=number,
+                    body_part_examined="CHEST",
+                ))
+
+        analysis = MedGemmaAnalysis(
+            study_id=prior.id,
+            analysis_type="primary",
+            prompt="prompt",
+            raw_response=PRIOR_RESPONSE,
+            status=AnalysisStatus.COMPLETED,
+            completed_at=datetime(2024, 1, 2),
+            structured_findings=parse_response(PRIOR_RESPONSE),
+        )
+        db.add(analysis)
+        await db.flush()
+        finding = Finding(analysis_id=analysis.id, finding_type="nodule", description="6 mm nodule, right upper lobe")
+        db.add(finding)
+        await db.flush()
+        for value in (6, 5, 4):
+            db.add(Measurement(
+                analysis_id=analysis.id, finding_id=finding.id, measurement_type="size", value=value, unit="mm"
+            ))
+        await db.commit()
+
+        return {
+            "prior": prior.id,
+            "follow_ups": [study.id for study in follow_ups],
+            "analysis": analysis.id,
+        }
+
+
+async def _build_prompt(analysis_type: str, study_id: str, prior_study_id: str) -> str:
+    async with AsyncSessionLocal() as db:
+        request = routes.AnalysisRequest(
+            study_id=study_id,
+            clinical_indication="Cough",
+            analysis_type=analysis_type,
+            prior_study_id=prior_study_id,
+        )
+        return await routes._build_prompt(request, db)
+
+
+async def test_primary_prompt_is_one_query(seeded, queries):
+    await _build_prompt("primary", seeded["follow_ups"][0], seeded["prior"])
+
+    assert queries.count == 1
+
+
+async def test_comparison_prompt_is_two_queries(seeded, queries):
+    # The first comparison also reads the prior's structured findings to summarise
+    prompt = await _build_prompt("comparison", seeded["follow_ups"][0], seeded["prior"])
+    assert queries.count == 3
+    assert "Pulmonary nodule" in prompt
+
+    # Later ones get the summary from the prior context cache
+    queries.reset()
+    prompt = await _build_prompt("comparison", seeded["follow_ups"][1], seeded["prior"])
+    assert queries.count == 2
+    assert "Pulmonary nodule" in prompt
+
+
+@pytest.mark.parametrize("size", [1, FOLLOW_UPS])
+async def test_batch_context_is_two_queries_whatever_the_batch_size(seeded, queries, size):
+    pairs = [(study_id, seeded["prior"]) for study_id in seeded["follow_ups"][:size]]
+    async with AsyncSessionLocal() as db:
+        await AnalysisContextLoader.load_many(db, pairs[:1])  # warm the prior context cache
+
+        queries.reset()
+        contexts = await AnalysisContextLoader.load_many(db, pairs)
+
+    assert queries.count == 2
+    assert [c.prior_analysis.id for c in contexts] == [seeded["analysis"]] * size
+
+
+@pytest.mark.parametrize("analysis_type, expected", [("primary", 6), ("comparison", 9)])
+async def test_batch_endpoint_query_count_does_not_grow_with_batch_size(seeded, queries, analysis_type, expected):
+    # primary: contexts 1, in-flight lookup 1, inserts 3 (batch, jobs, analyses), batch update 1
+    # comparison adds: prior study lookup 1, prior analyses 1, prior findings 1 (cold cache)
+    follow_ups = seeded["follow_ups"]
+    for batch in (follow_ups[:1], follow_ups[1:]):
+        request = routes.BatchAnalysisRequest(items=[
+            routes.BatchAnalysisItem(study_id=study_id, clinical_indication="Cough", analysis_type=analysis_type)
+            for study_id in batch
+        ])
+        context._prior_context_cache = None
+        queries.reset()
+        async with AsyncSessionLocal() as db:
+            response = await routes.enqueue_analysis_batch(request, db)
+
+        assert response.queued == len(batch)
+        assert queries.count == expected
+
+
+async def test_report_generation_query_count(seeded, queries):
+    # study, analysis, its measurements with their findings, INSERT report, refresh report
+    async with AsyncSessionLocal() as db:
+        report = await reports.generate_report(
+            reports.ReportRequest(study_id=seeded["prior"], analysis_id=seeded["analysis"]), db
+        )
+
+    assert queries.count == 5
+    assert report.measurements_table["total_count"] == 3